@@ -1,5 +1,6 @@
 from strucscan.core.jobmanager import JobManager
 
+import os
 import sys
 import yaml
 
@@ -19,18 +20,88 @@ def main():
             print("")
             print("Usage:")
             print("strucscan [input.yaml]")
+            print("strucscan --migrate-tree [width]")
+            print("strucscan --daemon")
+            print("strucscan --submit [input.yaml]")
+            print("strucscan --status [scan]")
+            print("strucscan --cancel [scan]")
+            print("strucscan --shutdown")
             print("")
             print("input.yaml is input file for strucscan in yaml format.")
             print("For examples, see https://github.com/ICAMS/strucscan/tree/main/examples")
             print("")
+            print("--migrate-tree moves all job directories of the data tree into hash prefix directories")
+            print("of 'width' characters (default: DATA_TREE_SHARDING in ~/.strucscan). Use width 0 to flatten the tree.")
+            print("")
+            print("--daemon starts a daemon that monitors many scans in a single loop. It listens on the Unix socket")
+            print("DAEMON_SOCKET in ~/.strucscan (default: ~/.strucscan.sock). --submit hands an input file to the daemon,")
+            print("--status lists the scans of the daemon or the jobs of one scan, --cancel stops a scan and cancels its")
+            print("queued and running jobs, --shutdown stops the daemon.")
+            print("")
             print("If you have an idea for a new feature, a question or found a bug,")
             print("you can submit it through the issue page of the repository:")
             print("https://github.com/ICAMS/strucscan/issues")
+        elif arg == "--migrate-tree":
+            from strucscan.core.datatree import migrate_data_tree
+            width = None
+            if len(cmdarg) > 2:
+                width = int(cmdarg[2])
+            nmoved = migrate_data_tree(width=width, verbose=True)
+            print("Moved {} job directories.".format(nmoved))
+        elif arg == "--daemon":
+            from strucscan.core.daemon import Daemon
+            Daemon().serve()
+        elif arg in ["--submit", "--status", "--cancel", "--shutdown"]:
+            call_daemon(arg, cmdarg[2:])
         else:
             input_dict = read_input(arg)
             JobManager(input_dict)
 
 
+def call_daemon(arg, args):
+    """
+    - sends a request to the strucscan daemon and prints its response
+
+    :param arg: (str) '--submit', '--status', '--cancel' or '--shutdown'
+    :param args: (str list) further command line arguments, i.e. input file or id of scan
+    :return: 0
+    """
+    from strucscan.core.daemon import send_request
+    if arg == "--submit":
+        inputfile = os.path.abspath(args[0])
+        request = {"command": "submit", "input": read_input(inputfile), "name": inputfile}
+    elif arg == "--status":
+        request = {"command": "status", "scan": args[0] if args else None}
+    elif arg == "--cancel":
+        request = {"command": "cancel", "scan": args[0]}
+    else:
+        request = {"command": "shutdown"}
+    try:
+        response = send_request(request)
+    except OSError as err:
+        print("No strucscan daemon is running ({}). Start it with: strucscan --daemon".format(err))
+        sys.exit(1)
+    if not response["ok"]:
+        print("Error:", response["error"])
+        sys.exit(1)
+    if arg == "--submit":
+        print("Submitted scan", response["scan"])
+    elif arg == "--cancel":
+        print("Cancelled {} jobs.".format(response["cancelled"]))
+    elif arg == "--status":
+        scans = response["scans"] if "scans" in response else [response["scan"]]
+        print("{:>5} {:10} {:>6}  {:50} {}".format("scan", "state", "jobs", "statuses", "name"))
+        for scan in scans:
+            statuses = ", ".join("{}: {}".format(status, count) for status, count in sorted(scan["statuses"].items()))
+            print("{:>5} {:10} {:>6}  {:50} {}".format(scan["scan"], scan["state"], scan["njobs"], statuses,
+                                                      scan["name"]))
+        if "jobs" in response:
+            print("")
+            for job in response["jobs"]:
+                print("{:60} {:10} {}".format(job["jobpath"], job["status"], job["job_id"] or ""))
+    return
+
+
 def read_input(inputfile):
     def str_presenter(dumper, data):
          if len(data.splitlines()) > 1:  # check for multiline string
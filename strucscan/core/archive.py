@@ -0,0 +1,257 @@
+from io import BufferedReader, RawIOBase, TextIOWrapper, SEEK_CUR, SEEK_END, SEEK_SET
+import tempfile
+import tarfile
+import shutil
+import gzip
+import json
+import os
+
+from ase import io
+
+ARCHIVE_SUFFIX = ".tar"
+INDEX_SUFFIX = ".tar.idx"
+COMPRESS_MIN_SIZE = 4096     # files smaller than this are stored uncompressed
+
+
+def get_archive_path(jobpath):
+    """
+    :param jobpath: (str) absolute path to job directory
+    :return: (str) absolute path to archive of job directory
+    """
+    return jobpath + ARCHIVE_SUFFIX
+
+
+def get_index_path(jobpath):
+    """
+    :param jobpath: (str) absolute path to job directory
+    :return: (str) absolute path to member index of archive
+    """
+    return jobpath + INDEX_SUFFIX
+
+
+def is_archived(jobpath):
+    """
+    :param jobpath: (str) absolute path to job directory
+    :return: (bool) True if the job directory has been packed into an archive
+    """
+    return (not os.path.isdir(jobpath)) and os.path.exists(get_index_path(jobpath))
+
+
+def archive_jobdir(jobpath, remove=True):
+    """
+    - packs job directory into a single uncompressed tar archive 'jobpath.tar'
+    - files that are not compressed yet and larger than COMPRESS_MIN_SIZE are gzipped before packing,
+    files like OUTCAR.gz are stored as they are, symbolic links are skipped
+    - files are streamed into the archive. Files to be gzipped are compressed into a temporary file next to the
+    archive first, since the size of a member has to be known before its data is written
+    - writes a member index 'jobpath.tar.idx' that maps every file name to the offset and size of its data
+    in the archive, so single files can be read without scanning the archive
+
+    :param jobpath: (str) absolute path to job directory
+    :param remove: (bool) remove job directory after archiving
+    :return: (str) absolute path to archive
+    """
+    jobpath = jobpath.rstrip("/")
+    archive_path = get_archive_path(jobpath)
+    tmp_archive_path = archive_path + ".tmp"
+    index = {"members": {}}
+    with tarfile.open(tmp_archive_path, "w", format=tarfile.PAX_FORMAT) as tar:
+        for root, dirs, files in os.walk(jobpath):
+            dirs.sort()
+            for fname in sorted(files):
+                path = os.path.join(root, fname)
+                if os.path.islink(path):
+                    # e.g. input files linked into image sub-directories
+                    continue
+                name = os.path.relpath(path, jobpath)
+                size = os.path.getsize(path)
+                compressed = (not fname.endswith(".gz")) and (fname + ".gz" not in files) and \
+                             (size >= COMPRESS_MIN_SIZE)
+                tarinfo = tarfile.TarInfo(name=name + ".gz" if compressed else name)
+                tarinfo.mtime = int(os.path.getmtime(path))
+                with open(path, "rb") as f:
+                    if compressed:
+                        with tempfile.TemporaryFile(dir=os.path.dirname(archive_path)) as tmp:
+                            with gzip.GzipFile(filename="", mode="wb", fileobj=tmp, mtime=tarinfo.mtime) as gz:
+                                shutil.copyfileobj(f, gz)
+                            tarinfo.size = tmp.tell()
+                            tmp.seek(0)
+                            tar.addfile(tarinfo, tmp)
+                    else:
+                        tarinfo.size = size
+                        tar.addfile(tarinfo, f)
+                # the data block of the member ends at the current offset of the archive
+                nblocks = (tarinfo.size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE
+                index["members"][name] = [tar.offset - nblocks * tarfile.BLOCKSIZE, tarinfo.size, compressed]
+
+    os.replace(tmp_archive_path, archive_path)
+    tmp_index_path = get_index_path(jobpath) + ".tmp"
+    with open(tmp_index_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_index_path, get_index_path(jobpath))
+    if remove:
+        shutil.rmtree(jobpath)
+    return archive_path
+
+
+def read_index(jobpath):
+    """
+    :param jobpath: (str) absolute path to job directory
+    :return: (dict) dictionary in form of {name: [offset, size, compressed]}
+    """
+    with open(get_index_path(jobpath), "r") as f:
+        return json.load(f)["members"]
+
+
+def listdir(jobpath):
+    """
+    - lists files of job directory, or of its archive if the job directory has been archived
+
+    :param jobpath: (str) absolute path to job directory
+    :return: (str list) list of file names
+    """
+    if os.path.isdir(jobpath):
+        return os.listdir(jobpath)
+    if is_archived(jobpath):
+        return [name for name in read_index(jobpath) if "/" not in name]
+    raise FileNotFoundError("{} not found.".format(jobpath))
+
+
+class MemberReader(RawIOBase):
+    def __init__(self, archive_path, offset, size):
+        """
+        - reads the data block of a single member of an archive, starting at its offset in the archive
+        and ending after its size, without reading the rest of the archive
+
+        :param archive_path: (str) absolute path to archive
+        :param offset: (int) offset of data block in archive, see read_index
+        :param size: (int) size of data block in bytes
+        """
+        self.fileobj = open(archive_path, "rb")
+        self.offset = offset
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(min(len(b), self.size - self.position), 0)
+        if n == 0:
+            return 0
+        self.fileobj.seek(self.offset + self.position)
+        n = self.fileobj.readinto(memoryview(b)[:n])
+        self.position += n
+        return n
+
+    def seek(self, position, whence=SEEK_SET):
+        if whence == SEEK_CUR:
+            position += self.position
+        elif whence == SEEK_END:
+            position += self.size
+        self.position = max(position, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.fileobj.close()
+        super().close()
+
+
+class GzipMember(gzip.GzipFile):
+    def __init__(self, fileobj):
+        """
+        - decompresses a member of an archive while it is read, see open_member
+
+        :param fileobj: (file object) binary stream of compressed data, closed together with this stream
+        """
+        super().__init__(filename="", mode="rb", fileobj=fileobj)
+        self.member = fileobj
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.member.close()
+
+
+def open_member(jobpath, name, decompress_gz=False):
+    """
+    - opens a single file of an archived job directory as a binary stream that reads only the data block
+    of the member and decompresses it while it is read
+
+    :param jobpath: (str) absolute path to job directory that has been archived
+    :param name: (str) name of file in job directory
+    :param decompress_gz: (bool) also decompress files that have been gzipped in the job directory, e.g. OUTCAR.gz
+    :return: binary file object
+    """
+    index = read_index(jobpath)
+    if name not in index:
+        raise FileNotFoundError("{} not found in {}.".format(name, get_archive_path(jobpath)))
+    offset, size, compressed = index[name]
+    stream = BufferedReader(MemberReader(get_archive_path(jobpath), offset, size))
+    if compressed:
+        stream = GzipMember(stream)
+    if decompress_gz and name.endswith(".gz"):
+        stream = GzipMember(stream)
+    return stream
+
+
+def read_member(jobpath, name):
+    """
+    - see open_member
+
+    :param jobpath: (str) absolute path to job directory that has been archived
+    :param name: (str) name of file in job directory
+    :return: (bytes) content of file as it was in the job directory
+    """
+    with open_member(jobpath, name) as f:
+        return f.read()
+
+
+def open_file(path, binary=False):
+    """
+    - opens file from job directory or, if the job directory has been archived, from its archive
+    - gzipped files are decompressed
+    - files in archives are streamed, see open_member, e.g. to copy large restart files with shutil.copyfileobj
+
+    :param path: (str) absolute path to file in job directory
+    :param binary: (bool) return binary instead of text stream
+    :return: file object
+    """
+    if os.path.exists(path):
+        if path.endswith(".gz"):
+            return gzip.open(path, "rb" if binary else "rt")
+        return open(path, "rb" if binary else "r")
+    jobpath, name = os.path.split(path)
+    while not is_archived(jobpath):
+        # file in a sub-directory of job directory
+        jobpath, subdir = os.path.split(jobpath)
+        if (jobpath == "") or (jobpath == "/"):
+            raise FileNotFoundError("{} not found.".format(path))
+        name = subdir + "/" + name
+    stream = open_member(jobpath, name, decompress_gz=True)
+    if binary:
+        return stream
+    return TextIOWrapper(stream)
+
+
+def read_structure(path, format, index=None):
+    """
+    - wrapper around ase.io.read that also reads from archived job directories
+
+    :param path: (str) absolute path to structure file
+    :param format: (str) ase.io file format
+    :param index: (int, slice or str) passed to ase.io.read
+    :return: (ASE atoms object)
+    """
+    if os.path.exists(path):
+        return io.read(path, format=format, index=index)
+    with open_file(path) as f:
+        return io.read(f, format=format, index=index)
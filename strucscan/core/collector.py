@@ -3,8 +3,9 @@ import traceback
 import sys
 import os
 
-from strucscan.core import datatree
-from strucscan.utils import DEBUG, SEPERATOR
+from strucscan.core import datatree, statusmanager, archive, resultstore, planner
+from strucscan.utils import DEBUG, SEPERATOR, ARCHIVE_JOBS, get_calc
+from strucscan import instrumentation
 
 
 def get_jobname(absolute_path):
@@ -12,9 +13,7 @@ def get_jobname(absolute_path):
     :param absolute_path: (str) absolute path to job directory
     :return: (str) jobname, e.g. 'static__fcc__Al'
     """
-    calculator, composition, property, prototype, stochio = datatree.parse_absolute_path(absolute_path)
-    job_name = property + SEPERATOR + prototype + SEPERATOR + stochio
-    return job_name
+    return datatree.get_jobname(os.path.basename(absolute_path.rstrip("/")))
 
 
 def get_result_dict(calc, property, absolute_path):
@@ -43,3 +42,65 @@ def get_result_dict(calc, property, absolute_path):
             pprint(traceback.format_tb(exc_tb))
             print(exception)
     return result_dict
+
+
+def collect_composition(calc, data_tree_path, calculator, composition, job_list=None):
+    """
+    - collects results of all finished jobs of one composition that are not stored in the output dict yet
+    - every result is appended to the results journal of the composition as soon as it has been collected,
+    so an interruption does not require parsing it again. The journal is compacted into the output dict
+    by strucscan.core.resultstore.compact
+
+    :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object with scheduler
+    :param data_tree_path: (str) absolute path to data tree
+    :param calculator: (str) name of engine directory in data tree
+    :param composition: (str) name of composition directory
+    :param job_list: (list) list of all JobObjects. Jobs with errors that are part of job_list are restarted
+    :return: (str, dict) tuple of absolute path to output dict and dictionary in form of {jobname: result_dict}
+    of the newly collected results
+    """
+    if job_list is None:
+        job_list = []
+    fname = resultstore.get_output_dict_path(data_tree_path, calculator, composition, SEPERATOR)
+    names = resultstore.get_collected_names(fname)
+    composition_path = "{}/{}/{}".format(data_tree_path, calculator, composition)
+    results = {}
+    for property_prototype_stochio, path in datatree.iter_jobdirs(composition_path):
+        jobname = datatree.get_jobname(property_prototype_stochio)
+        if jobname in names:
+            continue
+        property = datatree.parse_dirname(property_prototype_stochio)[0]
+        _, status, job_id = statusmanager.determine_status__job_id(calc, path, job_list)
+        if status == statusmanager.FINISHED:
+            if DEBUG():
+                collecting_directory = "/".join([s for s in path.split("/")[len(data_tree_path.split("/")):]])
+                print(">> collecting", collecting_directory, "...")
+            with instrumentation.timer("collector.get_result_dict"):
+                result_dict = get_result_dict(calc, property, path)
+            if result_dict != {}:
+                results[jobname] = result_dict
+                with instrumentation.timer("resultstore.append_result"):
+                    resultstore.append_result(fname, jobname, result_dict)
+                with instrumentation.timer("planner.record_job"):
+                    planner.record_job(calc, path)
+                if ARCHIVE_JOBS() and not archive.is_archived(path):
+                    with instrumentation.timer("archive.archive_jobdir"):
+                        archive.archive_jobdir(path)
+    return fname, results
+
+
+def collect_composition_task(engine_name, input_dict, data_tree_path, calculator, composition):
+    """
+    - entry point of collect_composition for worker processes
+    - creates its own calculator object, since calculator objects are not shared between processes
+
+    :param engine_name: (str) name of engine, e.g. 'VASP'
+    :param input_dict: (dict) input dictionary
+    :param data_tree_path: (str) absolute path to data tree
+    :param calculator: (str) name of engine directory in data tree
+    :param composition: (str) name of composition directory
+    :return: (str, dict) see collect_composition
+    """
+    calc = get_calc(engine_name, input_dict)
+    calc.set_scheduler()
+    return collect_composition(calc, data_tree_path, calculator, composition)
@@ -0,0 +1,273 @@
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from strucscan.core import statusmanager
+from strucscan.core.jobmanager import JobManager
+from strucscan import instrumentation
+from strucscan.utils import SLEEP_TIME, DAEMON_SOCKET
+
+ACTIVE = "active"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+
+
+class Scan:
+    def __init__(self, scan_id, name, jobmanager):
+        """
+        - scan of one input file that is monitored by the daemon
+
+        :param scan_id: (str) id of scan
+        :param name: (str) name of scan, e.g. path of input file
+        :param jobmanager: (strucscan.core.jobmanager.JobManager object) JobManager that has initialized the jobs
+        of the scan but does not run its own monitoring loop
+        """
+        self.scan_id = scan_id
+        self.name = name
+        self.jobmanager = jobmanager
+        self.state = ACTIVE
+        self.submitted = time.time()
+
+    def get_summary(self):
+        """
+        :return: (dict) id, name, state, submission time, number of jobs and number of jobs per status of scan
+        """
+        return {"scan": self.scan_id,
+                "name": self.name,
+                "state": self.state,
+                "submitted": self.submitted,
+                "njobs": len(self.jobmanager.job_list),
+                "statuses": self.jobmanager.count_statuses()}
+
+    def get_jobs(self):
+        """
+        :return: (dict list) path, status and id of every job of scan
+        """
+        jobs = []
+        for jobobject in self.jobmanager.job_list:
+            status_index, status, job_id = jobobject.get_status_index_job_id()
+            jobs.append({"jobpath": jobobject.get_jobpath(),
+                         "status": status,
+                         "job_id": None if job_id in [None, "None"] else str(job_id)})
+        return jobs
+
+
+class Daemon:
+    def __init__(self, socket_path=None, sleep_time=None):
+        """
+        - long-lived process that monitors the scans of many input files with a single loop
+        - all scans share one scheduler object per machine, so one queue snapshot is polled per cycle for all of them,
+        see strucscan.scheduler.GeneralScheduler.get_cached_queue_snapshot, and the data tree is collected once
+        per cycle instead of once per scan
+        - new scans, status queries and cancellations are sent as JSON lines over a Unix socket, which is
+        accessible to the owner only, see strucscan.core.daemon.send_request. Requests are handled between
+        the monitoring cycles by the thread that runs the loop
+
+        :param socket_path: (str) path of Unix socket. If None, DAEMON_SOCKET in ~/.strucscan is used
+        :param sleep_time: (float) seconds between monitoring cycles. If None, SLEEP_TIME in ~/.strucscan is used
+        """
+        self.socket_path = socket_path if socket_path is not None else DAEMON_SOCKET()
+        self.sleep_time = float(sleep_time if sleep_time is not None else SLEEP_TIME())
+        self.scans = {}         # {scan_id: Scan}
+        self.schedulers = {}    # {machinename: GeneralScheduler}, shared by the JobManagers of all scans
+        self.requests = queue.Queue()
+        self.counter = 0
+        self.running = False
+        self.metrics = instrumentation.METRICS
+
+    def submit(self, input_dict, name=""):
+        """
+        - initializes the jobs of a new scan. Its jobs are monitored from the next cycle on
+
+        :param input_dict: (dict) input dictionary, see strucscan.resources.inputyaml
+        :param name: (str) name of scan, e.g. path of input file
+        :return: (str) id of scan
+        """
+        input_dict = dict(input_dict)
+        input_dict["monitor"] = True
+        try:
+            jobmanager = JobManager(input_dict, run=False, schedulers=self.schedulers)
+        except SystemExit:
+            # JobManager exits on missing mandatory keys
+            raise ValueError("Invalid input, see output of daemon.")
+        self.counter += 1
+        scan_id = str(self.counter)
+        self.scans[scan_id] = Scan(scan_id, name, jobmanager)
+        return scan_id
+
+    def get_scan(self, scan_id):
+        """
+        :param scan_id: (str) id of scan
+        :return: (strucscan.core.daemon.Scan object)
+        """
+        if str(scan_id) not in self.scans:
+            raise KeyError("Unknown scan {}.".format(scan_id))
+        return self.scans[str(scan_id)]
+
+    def cancel(self, scan_id):
+        """
+        - stops monitoring a scan and cancels its queued and running jobs. Jobs that are part of another active scan
+        are left to that scan
+
+        :param scan_id: (str) id of scan
+        :return: (int) number of jobs cancelled in the scheduler
+        """
+        scan = self.get_scan(scan_id)
+        if scan.state != ACTIVE:
+            return 0
+        scan.state = CANCELLED
+        shared = set([jobobject.get_jobpath() for other in self.scans.values() if other.state == ACTIVE
+                      for jobobject in other.jobmanager.job_list])
+        scheduler = scan.jobmanager.calc.get_scheduler()
+        ncancelled = 0
+        for jobobject in scan.jobmanager.job_list:
+            status_index, status, job_id = jobobject.get_status_index_job_id()
+            if (status in [statusmanager.QUEUED, statusmanager.RUNNING]) and (job_id not in [None, "None"]) and \
+                    (jobobject.get_jobpath() not in shared):
+                try:
+                    if scheduler.cancel(job_id):
+                        ncancelled += 1
+                except NotImplementedError:
+                    # e.g. noqueue: processes are not tracked
+                    break
+        return ncancelled
+
+    def cycle(self):
+        """
+        - one monitoring cycle of all active scans, followed by a single collection of the data tree
+
+        :return: 0
+        """
+        active = [scan for scan in self.scans.values() if scan.state == ACTIVE]
+        if not active:
+            return
+        finished = False
+        for scan in active:
+            if scan.jobmanager.monitor_cycle():
+                scan.state = FINISHED
+                finished = True
+        collecting = [scan for scan in active if scan.jobmanager.input_dict["collect"]]
+        if collecting:
+            job_list = [jobobject for scan in active for jobobject in scan.jobmanager.job_list]
+            # journals of finished scans are compacted right away
+            collecting[0].jobmanager.collect(final=finished, job_list=job_list)
+        statuses = {}
+        for scan in active:
+            for status, count in scan.jobmanager.count_statuses().items():
+                statuses[status] = statuses.get(status, 0) + count
+        self.metrics.end_cycle(njobs=sum(statuses.values()), statuses=statuses)
+        return
+
+    def handle(self, request):
+        """
+        :param request: (dict) request, e.g. {'command': 'submit', 'input': input_dict, 'name': 'input.yaml'},
+        {'command': 'status'}, {'command': 'status', 'scan': '1'}, {'command': 'cancel', 'scan': '1'}
+        or {'command': 'shutdown'}
+        :return: (dict) response with 'ok' (bool) and the result of the request or an 'error' message
+        """
+        command = request.get("command")
+        try:
+            if command == "submit":
+                scan_id = self.submit(request["input"], name=request.get("name", ""))
+                return {"ok": True, "scan": scan_id}
+            elif command == "status":
+                if request.get("scan") is None:
+                    return {"ok": True, "scans": [scan.get_summary() for scan in self.scans.values()]}
+                scan = self.get_scan(request["scan"])
+                return {"ok": True, "scan": scan.get_summary(), "jobs": scan.get_jobs()}
+            elif command == "cancel":
+                return {"ok": True, "cancelled": self.cancel(request["scan"])}
+            elif command == "shutdown":
+                self.running = False
+                return {"ok": True}
+            return {"ok": False, "error": "Unknown command {}.".format(command)}
+        except (KeyError, ValueError, TypeError, OSError) as err:
+            return {"ok": False, "error": str(err.args[0]) if err.args else repr(err)}
+
+    def call(self, request):
+        """
+        - hands a request to the thread that runs the loop and waits for the response
+
+        :param request: (dict) see Daemon.handle
+        :return: (dict) response, see Daemon.handle
+        """
+        reply = queue.Queue(maxsize=1)
+        self.requests.put((request, reply))
+        return reply.get()
+
+    def serve(self):
+        """
+        - listens on the Unix socket and runs the monitoring loop until a shutdown request is received
+
+        :return: 0
+        """
+        if os.path.exists(self.socket_path):
+            try:
+                send_request({"command": "status"}, socket_path=self.socket_path)
+            except OSError:
+                # left over by a daemon that has not been shut down
+                os.remove(self.socket_path)
+            else:
+                raise RuntimeError("A daemon is already listening on {}.".format(self.socket_path))
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, RequestHandler)
+        os.chmod(self.socket_path, 0o600)
+        server.daemon_threads = True
+        server.strucscan_daemon = self
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.running = True
+        next_cycle = time.time()
+        try:
+            while self.running:
+                try:
+                    request, reply = self.requests.get(timeout=max(0., next_cycle - time.time()))
+                except queue.Empty:
+                    self.cycle()
+                    next_cycle = time.time() + self.sleep_time
+                    continue
+                reply.put(self.handle(request))
+        finally:
+            server.shutdown()
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        return
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        """
+        - reads one JSON request per line and writes one JSON response per line
+        """
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+            except ValueError:
+                response = {"ok": False, "error": "Request is not valid JSON."}
+            else:
+                response = self.server.strucscan_daemon.call(request)
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+def send_request(request, socket_path=None):
+    """
+    :param request: (dict) request, see strucscan.core.daemon.Daemon.handle
+    :param socket_path: (str) path of Unix socket of daemon. If None, DAEMON_SOCKET in ~/.strucscan is used
+    :return: (dict) response, see strucscan.core.daemon.Daemon.handle
+    """
+    if socket_path is None:
+        socket_path = DAEMON_SOCKET()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + "\n").encode())
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("No response from daemon on {}.".format(socket_path))
+    return json.loads(line.decode())
@@ -1,11 +1,139 @@
 from strucscan.utils import *
 from strucscan.resources.properties import *
 
+from strucscan.core import archive
+
+from functools import lru_cache
+import hashlib
+import shutil
+
+HEXDIGITS = set("0123456789abcdef")
+
+
+def get_shard(dirname, width=None):
+    """
+    :param dirname: (str) name of job directory, e.g. 'static__fcc__Al'
+    :param width: (int) number of hexadecimal characters of shard. If None, DATA_TREE_SHARDING in ~/.strucscan is used
+    :return: (str) name of shard directory, e.g. '3f'. Empty string for flat data trees
+    """
+    if width is None:
+        width = DATA_TREE_SHARDING()
+    if width == 0:
+        return ""
+    return hashlib.md5(dirname.encode()).hexdigest()[:width]
+
+
+def shard_dirname(dirname, width=None):
+    """
+    :param dirname: (str) name of job directory, e.g. 'static__fcc__Al'
+    :param width: (int) number of hexadecimal characters of shard. If None, DATA_TREE_SHARDING in ~/.strucscan is used
+    :return: (str) path of job directory relative to composition directory, e.g. '3f/static__fcc__Al'
+    """
+    shard = get_shard(dirname, width=width)
+    if shard == "":
+        return dirname
+    return shard + "/" + dirname
+
+
+def is_shard(name):
+    """
+    - shard directories are lower case hexadecimal strings, while compositions start with an upper case
+    letter and job directories contain SEPERATOR
+
+    :param name: (str) name of directory
+    :return: (bool) True if name is a shard directory
+    """
+    return (name != "") and (SEPERATOR not in name) and (set(name) <= HEXDIGITS)
+
+
+def get_composition_path(jobpath):
+    """
+    :param jobpath: (str) absolute path to job directory in flat or sharded data tree
+    :return: (str) absolute path to composition directory
+    """
+    parent = os.path.dirname(jobpath)
+    if is_shard(os.path.basename(parent)):
+        parent = os.path.dirname(parent)
+    return parent
+
+
+def iter_jobdirs(composition_path):
+    """
+    - yields all job directories of a composition in flat and sharded data trees
+    - archived job directories are yielded with the path the job directory had before archiving
+
+    :param composition_path: (str) absolute path to composition directory
+    :return: (generator) of (str, str) tuples of job directory name and absolute path to job directory
+    """
+    def iter_level(path, descend):
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if SEPERATOR in entry.name:
+                    if entry.is_dir():
+                        yield entry.name, entry.path
+                    elif entry.name.endswith(archive.INDEX_SUFFIX):
+                        name = entry.name[:-len(archive.INDEX_SUFFIX)]
+                        if not os.path.isdir(path + "/" + name):
+                            yield name, path + "/" + name
+                elif descend and is_shard(entry.name) and entry.is_dir():
+                    for item in iter_level(entry.path, False):
+                        yield item
+
+    for item in iter_level(composition_path, True):
+        yield item
+
+
+def migrate_data_tree(data_tree_path=None, width=None, verbose=False):
+    """
+    - moves all job directories of the data tree into the layout given by 'width'
+    - use width=0 to flatten a sharded data tree
+    - strucscan should not be running and no jobs of the data tree should be queued while migrating
+
+    :param data_tree_path: (str) absolute path to data tree. If None, PROJECT_PATH in ~/.strucscan is used
+    :param width: (int) number of hexadecimal characters of shard. If None, DATA_TREE_SHARDING in ~/.strucscan is used
+    :param verbose: (bool) print every moved directory
+    :return: (int) number of moved job directories
+    """
+    if data_tree_path is None:
+        data_tree_path = PROJECT_PATH()
+    if width is None:
+        width = DATA_TREE_SHARDING()
+    nmoved = 0
+    for calculator in os.listdir(data_tree_path):
+        calculator_path = data_tree_path + "/" + calculator
+        if not os.path.isdir(calculator_path):
+            continue
+        for composition in os.listdir(calculator_path):
+            composition_path = calculator_path + "/" + composition
+            if not os.path.isdir(composition_path):
+                continue
+            for dirname, path in list(iter_jobdirs(composition_path)):
+                target = composition_path + "/" + shard_dirname(dirname, width=width)
+                if path != target:
+                    if os.path.exists(target):
+                        raise FileExistsError("Cannot move {} to {}: target exists.".format(path, target))
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    if os.path.isdir(path):
+                        shutil.move(path, target)
+                    else:
+                        for suffix in [archive.ARCHIVE_SUFFIX, archive.INDEX_SUFFIX]:
+                            shutil.move(path + suffix, target + suffix)
+                    nmoved += 1
+                    if verbose:
+                        print("moved", path, "->", target)
+            for name in os.listdir(composition_path):
+                if is_shard(name) and os.path.isdir(composition_path + "/" + name):
+                    if os.listdir(composition_path + "/" + name) == []:
+                        os.rmdir(composition_path + "/" + name)
+    return nmoved
+
 
 def get_relative_jobpath(species, property, jobobject, structpath=None):
     """
     - generates directory layers below 'engine signature': DATA_TREE_PATH/ENGINE_SIGNATURE/RELATIVE_JOBPATH
     - example: DATA_TREE_PATH/ENGINE_SIGNATURE/AlNi/atomic__fcc__Ni'
+    - if DATA_TREE_SHARDING is set in ~/.strucscan, a hash prefix layer is inserted below the composition,
+    e.g. DATA_TREE_PATH/ENGINE_SIGNATURE/AlNi/3f/atomic__fcc__Ni'
 
     :param species: (str) space separated species, e.g. 'Al Ni'
     :param property: (str) name of property
@@ -19,29 +147,55 @@ def get_relative_jobpath(species, property, jobobject, structpath=None):
         prototype = structpath.split("/")[-1].split(".")[0]
     else:
         prototype = SEPERATOR.join([s for s in jobobject.jobpath.split(SEPERATOR)[1:-1]])
-    jobpath = "{composition}/{property}{SEPERATOR}{prototype}{SEPERATOR}{stochio}". \
-        format(composition=composition,
-               property=property,
+    dirname = "{property}{SEPERATOR}{prototype}{SEPERATOR}{stochio}". \
+        format(property=property,
                SEPERATOR=SEPERATOR,
                prototype=prototype,
                stochio=stochio
                )
+    jobpath = composition + "/" + shard_dirname(dirname)
 
     return jobpath
 
 
-def parse_absolute_path(absolute_path):
+@lru_cache(maxsize=None)
+def parse_dirname(dirname):
     """
-    :param absolute_path: (str) absolute path to job directory
-    :return: (str tuple) separated path to job directory
+    - does not read ~/.strucscan; results are cached, since names of job directories are parsed in every cycle
+
+    :param dirname: (str) name of job directory, e.g. 'static__fcc__Al'
+    :return: (str tuple) property, prototype and stochiometry, e.g. ('static', 'fcc', 'Al')
     """
-    splitted_path = absolute_path.split("/")[len(PROJECT_PATH().split("/")):]
-    calculator_and_settings = splitted_path[0]
-    composition = splitted_path[1]
-    property_prototype_stochio = splitted_path[2].split(SEPERATOR)
+    property_prototype_stochio = dirname.split(SEPERATOR)
     property = property_prototype_stochio[0]
     prototype = "_".join([p for p in property_prototype_stochio[1:-1]])
     stochio = property_prototype_stochio[-1].split(".")[0]
+    return property, prototype, stochio
+
+
+@lru_cache(maxsize=None)
+def get_jobname(dirname):
+    """
+    :param dirname: (str) name of job directory, e.g. 'static__fcc__Al'
+    :return: (str) name of job in output dict, e.g. 'static__fcc__Al'
+    """
+    property, prototype, stochio = parse_dirname(dirname)
+    return property + SEPERATOR + prototype + SEPERATOR + stochio
+
+
+def parse_absolute_path(absolute_path):
+    """
+    - does not read ~/.strucscan: engine and composition directories are determined from the parents
+    of the job directory
+
+    :param absolute_path: (str) absolute path to job directory in flat or sharded data tree
+    :return: (str tuple) separated path to job directory
+    """
+    absolute_path = absolute_path.rstrip("/")
+    composition_path = get_composition_path(absolute_path)
+    calculator_path, composition = os.path.split(composition_path)
+    calculator_and_settings = os.path.basename(calculator_path)
+    property, prototype, stochio = parse_dirname(os.path.basename(absolute_path))
 
     return calculator_and_settings, composition, property, prototype, stochio
 
@@ -57,19 +211,19 @@ def get_basis_ref_structpath_and_conditional_jobpath(calc, jobpath):
     split = jobpath.split("/")
     structname = "_".join([s for s in split[-1].split(SEPERATOR)[1:-1] if s != ""])
     stochio = split[-1].split(SEPERATOR)[-1]
-    path = "/".join([s for s in split[:-1]])
+    path = get_composition_path(jobpath)
     dirname = "{option}{seperator}{structname}{seperator}{stochio}".format(
         option=option,
         seperator=SEPERATOR,
         structname=structname,
         stochio=stochio
     )
-    basis_ref_structpath = path + "/" + dirname + "/" + calc.final_struct_fname
+    basis_ref_structpath = path + "/" + shard_dirname(dirname) + "/" + calc.final_struct_fname
 
     if len(property_split) > 1:
         if properties_conifg_dict[property_split[0]] in ADVANCED_TASKS:
             task = properties_conifg_dict[property_split[0]]
             if task != option:
                 dirname = task + "_" + dirname
-    conditional_files = path + "/" + dirname
+    conditional_files = path + "/" + shard_dirname(dirname)
     return basis_ref_structpath, conditional_files
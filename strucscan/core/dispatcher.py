@@ -0,0 +1,269 @@
+from ase.formula import Formula
+import threading
+import os
+
+from strucscan.core import datatree, ledger, planner, statusmanager
+from strucscan.scheduler import NoQueue
+
+# number of cycles a submitted job that has not yet written any marker file is counted as in flight
+SUBMIT_GRACE_CYCLES = 1
+
+
+def get_submission_limits(machine_configuration_dict):
+    """
+    - reads the limits of submitted jobs from the config.yaml of the machine, e.g.
+
+        max submitted jobs: 100         # all queues, e.g. MaxSubmitJobs of the site
+        queues:
+          parallel12:
+            ncores: 12
+            max submitted jobs: 20
+
+    :param machine_configuration_dict: (dict) machine configuration dictionary
+    :return: (int, dict) tuple of maximum number of jobs in all queues (None if unlimited) and dictionary
+    in form of {queuename: maximum number of jobs in queue}
+    """
+    max_jobs = machine_configuration_dict.get("max submitted jobs")
+    if max_jobs is not None:
+        max_jobs = int(max_jobs)
+    max_jobs_per_queue = {}
+    for queuename, queue in (machine_configuration_dict.get("queues") or {}).items():
+        if (queue is not None) and ("max submitted jobs" in queue):
+            max_jobs_per_queue[queuename] = int(queue["max submitted jobs"])
+    return max_jobs, max_jobs_per_queue
+
+
+def parse_priority_weights(weights):
+    """
+    :param weights: (str) space-separated weights of properties, prototypes or compositions,
+    e.g. 'eos_total=2 fcc=0.5 Al3Ni=4'
+    :return: (dict) dictionary in form of {name: weight}
+    """
+    priority_weights = {}
+    for item in str(weights).split():
+        name, _, weight = item.partition("=")
+        try:
+            priority_weights[name] = float(weight)
+        except ValueError:
+            raise ValueError("Could not read priority weight '{}'. Use e.g. 'eos_total=2'.".format(item))
+    return priority_weights
+
+
+class Dispatcher:
+    def __init__(self, calc, default_queuename, max_jobs=None, max_jobs_per_queue=None, weights=None):
+        """
+        - orders creation and submission of jobs whose prerequisites are finished by priority and keeps
+        the number of jobs in flight (queued or running) within the limits of the machine
+        - priority of a job is its user weight times the estimated cost of the longest chain of jobs
+        that starts with it (critical path), so long chains of dependent jobs are started first
+        - jobs of compositions that already have many jobs in flight are deferred (fair share),
+        so a single large composition cannot occupy all submission slots
+
+        :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object with scheduler
+        :param default_queuename: (str) queue of jobs of which the queue is not known, e.g. jobs of a previous run
+        :param max_jobs: (int) maximum number of jobs in flight in all queues. None if unlimited
+        :param max_jobs_per_queue: (dict) dictionary in form of {queuename: maximum number of jobs in flight}
+        :param weights: (dict) dictionary in form of {property, prototype or composition: weight}
+        """
+        self.calc = calc
+        self.default_queuename = default_queuename
+        self.max_jobs = max_jobs
+        self.max_jobs_per_queue = max_jobs_per_queue if max_jobs_per_queue is not None else {}
+        self.weights = weights if weights is not None else {}
+        self.ready = {}               # {jobpath: jobobject}, jobs ready to be created in this cycle
+        self.submitted = {}           # {jobpath: (queuename, cycle of submission)}
+        self.cycle = 0
+        self.lock = threading.Lock()
+
+    def add_ready(self, jobobject):
+        """
+        - called by strucscan.core.jobmaker.JobMaker.update, possibly from several threads
+
+        :param jobobject: (strucscan.core.jobobject.JobObject object) job whose prerequisites are finished
+        :return: 0
+        """
+        with self.lock:
+            self.ready[jobobject.get_jobpath()] = jobobject
+        return
+
+    def get_weight(self, jobobject):
+        """
+        :param jobobject: (strucscan.core.jobobject.JobObject object)
+        :return: (float) product of the user weights of property, prototype and composition of job
+        """
+        property, prototype, stochio = datatree.parse_dirname(os.path.basename(jobobject.get_jobpath()))
+        weight = 1.
+        for name in set([property, prototype, stochio, jobobject.get_stochio()]):
+            weight *= self.weights.get(name, 1.)
+        return weight
+
+    def estimate_cost(self, jobobject, model=None):
+        """
+        :param jobobject: (strucscan.core.jobobject.JobObject object)
+        :param model: (strucscan.core.planner.CostModel object) cost model fitted to finished jobs. If None,
+        the cost is estimated by the number of atoms times the number of structures
+        :return: (float) estimated cost of job in arbitrary units
+        """
+        atoms = jobobject.get_basis_ref_atoms()
+        nimages = 1
+        if isinstance(atoms, list):
+            nimages = len(atoms)
+            atoms = atoms[0] if atoms else None
+        elif "eos" in jobobject.property:
+            from strucscan.properties import eos
+            nimages = eos.num_of_point
+        if atoms is not None:
+            features = {"natoms": len(atoms)}
+        else:
+            try:
+                features = {"natoms": sum(Formula(jobobject.get_stochio()).count().values())}
+            except ValueError:
+                features = {"natoms": 1}
+        if model is None:
+            return float(features["natoms"] * nimages)
+        if atoms is not None:
+            features.update(self.calc.get_cost_features(atoms))
+        return model.predict_walltime(features, 1, nimages=nimages)
+
+    def get_critical_paths(self, job_list):
+        """
+        :param job_list: (list) list of all JobObjects
+        :return: (dict) dictionary in form of {jobpath: estimated cost of the longest chain of unfinished jobs
+        that starts with the job}
+        """
+        dependents = {}
+        for jobobject in job_list:
+            if jobobject.conditional_files != "":
+                dependents.setdefault(jobobject.conditional_files, []).append(jobobject.get_jobpath())
+        model = None
+        if job_list:
+            model = planner.get_cost_model(planner.get_history_path(job_list[0].get_jobpath()))
+        costs = {jobobject.get_jobpath(): self.estimate_cost(jobobject, model=model) for jobobject in job_list
+                 if jobobject.get_status_index() == 0}
+
+        critical_paths = {}
+
+        def get_critical_path(jobpath, visited):
+            if jobpath in critical_paths:
+                return critical_paths[jobpath]
+            visited.add(jobpath)
+            length = max([get_critical_path(dependent, visited) for dependent in dependents.get(jobpath, [])
+                          if dependent not in visited] + [0.])
+            critical_paths[jobpath] = costs.get(jobpath, 0.) + length
+            return critical_paths[jobpath]
+
+        for jobobject in job_list:
+            get_critical_path(jobobject.get_jobpath(), set())
+        return critical_paths
+
+    def count_jobs_in_flight(self, job_list):
+        """
+        - queued and running jobs, and jobs that have been submitted in the last cycle but have not started yet
+        - jobs of which the image sub-jobs are submitted separately count once per unfinished image
+
+        :param job_list: (list) list of all JobObjects
+        :return: (int, dict, dict) tuple of number of jobs in flight, dictionary in form of
+        {queuename: number of jobs in flight} and dictionary in form of {composition: number of jobs in flight}
+        """
+        total = 0
+        per_queue = {}
+        per_composition = {}
+        for jobobject in job_list:
+            jobpath = jobobject.get_jobpath()
+            status = jobobject.get_status()
+            queuename, cycle = self.submitted.get(jobpath, (self.default_queuename, None))
+            if status in [statusmanager.QUEUED, statusmanager.RUNNING]:
+                njobs = 1
+                if self.calc.split_images and os.path.isdir(jobpath):
+                    nimages, finished = ledger.read_ledger(jobpath)
+                    if nimages is not None:
+                        njobs = max(len(ledger.get_image_paths(jobpath, os.listdir(jobpath), nimages, finished)), 1)
+            elif (status == statusmanager.NOT_EXISTING) and (cycle is not None) and \
+                    (self.cycle - cycle <= SUBMIT_GRACE_CYCLES):
+                njobs = 1
+            else:
+                continue
+            composition = os.path.basename(datatree.get_composition_path(jobpath))
+            total += njobs
+            per_queue[queuename] = per_queue.get(queuename, 0) + njobs
+            per_composition[composition] = per_composition.get(composition, 0) + njobs
+        if not isinstance(self.calc.get_scheduler(), NoQueue):
+            # jobs of other strucscan instances or of other workflows of the user count towards the site limit
+            try:
+                total = max(total, len(self.calc.get_scheduler().get_queue_ids() or []))
+            except Exception:
+                pass
+        return total, per_queue, per_composition
+
+    def select(self, job_list, get_queuename):
+        """
+        - chooses the ready jobs that are created and submitted in this cycle, in order of
+        priority / (1 + number of jobs in flight of the composition of the job)
+
+        :param job_list: (list) list of all JobObjects
+        :param get_queuename: (function) returns the queue a jobobject would be submitted to
+        :return: (jobobject list) jobs to create and submit, in order of submission
+        """
+        self.cycle += 1
+        with self.lock:
+            ready = self.ready
+            self.ready = {}
+        jobobjects = {jobobject.get_jobpath(): jobobject for jobobject in job_list}
+        candidates = [jobobjects[jobpath] for jobpath in ready
+                      if (jobpath in jobobjects) and (jobobjects[jobpath].get_status() == statusmanager.NOT_EXISTING)
+                      and not ((jobpath in self.submitted) and
+                               (self.cycle - self.submitted[jobpath][1] <= SUBMIT_GRACE_CYCLES))]
+        if candidates == []:
+            return []
+
+        total, per_queue, per_composition = self.count_jobs_in_flight(job_list)
+        critical_paths = self.get_critical_paths(job_list)
+        priorities = {}
+        for jobobject in candidates:
+            jobpath = jobobject.get_jobpath()
+            priorities[jobpath] = self.get_weight(jobobject) * critical_paths.get(jobpath, 0.)
+        queuenames = {jobobject.get_jobpath(): get_queuename(jobobject) for jobobject in candidates}
+
+        selected = []
+        while candidates:
+            if (self.max_jobs is not None) and (total >= self.max_jobs):
+                break
+            candidates = [jobobject for jobobject in candidates
+                          if per_queue.get(queuenames[jobobject.get_jobpath()], 0) <
+                          self.max_jobs_per_queue.get(queuenames[jobobject.get_jobpath()], float("inf"))]
+            if candidates == []:
+                break
+
+            def get_share(jobobject):
+                composition = os.path.basename(datatree.get_composition_path(jobobject.get_jobpath()))
+                return priorities[jobobject.get_jobpath()] / (1. + per_composition.get(composition, 0)), \
+                       jobobject.get_jobpath()
+
+            jobobject = max(candidates, key=get_share)
+            candidates.remove(jobobject)
+            jobpath = jobobject.get_jobpath()
+            queuename = queuenames[jobpath]
+            composition = os.path.basename(datatree.get_composition_path(jobpath))
+            total += 1
+            per_queue[queuename] = per_queue.get(queuename, 0) + 1
+            per_composition[composition] = per_composition.get(composition, 0) + 1
+            self.submitted[jobpath] = (queuename, self.cycle)
+            selected.append(jobobject)
+        return selected
+
+
+def get_dispatcher(calc, input_dict):
+    """
+    :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object with scheduler
+    :param input_dict: (dict) input dictionary
+    :return: (strucscan.core.dispatcher.Dispatcher object). None if jobs are not submitted or neither
+    limits of submitted jobs (config.yaml of the machine) nor 'priority weights' (input.yaml) are given
+    """
+    if not input_dict["submit"]:
+        return None
+    max_jobs, max_jobs_per_queue = get_submission_limits(calc.machine_configuration_dict)
+    weights = parse_priority_weights(input_dict.get("priority weights", ""))
+    if (max_jobs is None) and (max_jobs_per_queue == {}) and (weights == {}):
+        return None
+    return Dispatcher(calc, input_dict["queuename"], max_jobs=max_jobs, max_jobs_per_queue=max_jobs_per_queue,
+                      weights=weights)
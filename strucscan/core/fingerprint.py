@@ -0,0 +1,82 @@
+from fractions import Fraction
+import hashlib
+import os
+
+from ase.neighborlist import neighbor_list
+import numpy as np
+
+from strucscan.utils import read_structure_from_file, scale_by_atvolume
+
+# width of distance bins in Angstrom
+DISTANCE_TOLERANCE = 1e-3
+# neighbours are considered up to this multiple of the mean interatomic distance (V/N)^(1/3)
+CUTOFF = 2.5
+
+
+def get_fingerprint(atoms, tolerance=DISTANCE_TOLERANCE, cutoff=CUTOFF):
+    """
+    - hash of a decorated structure that does not depend on the choice of the cell, the order of atoms,
+    or the labels of the prototype file: equal for e.g. a primitive cell and a supercell of it,
+    or an L1_2 prototype decorated with a single species and fcc
+    - composed of the fraction of each chemical symbol, the mean interatomic distance (V/N)^(1/3) and,
+    for each pair of chemical symbols, the histogram of interatomic distances up to the cutoff normalized by the
+    number of atoms. Distances are found with ase.neighborlist.neighbor_list and binned with NumPy
+
+    :param atoms: (ASE atoms object) periodic atoms object with decorated chemical symbols
+    :param tolerance: (float) width of distance bins in Angstrom
+    :param cutoff: (float) cutoff radius relative to the mean interatomic distance
+    :return: (str) hexadecimal hash
+    """
+    natoms = len(atoms)
+    symbols = np.array(atoms.get_chemical_symbols())
+    unique_symbols, counts = np.unique(symbols, return_counts=True)
+    parts = ["{}:{}".format(symbol, Fraction(int(count), natoms)) for symbol, count in zip(unique_symbols, counts)]
+
+    length = (atoms.get_volume() / natoms) ** (1. / 3.)
+    parts.append("L:{:d}".format(int(np.rint(length / tolerance))))
+    i, j, distances = neighbor_list("ijd", atoms, cutoff * length)
+    bins = np.rint(distances / tolerance).astype(np.int64)
+    # pairs of chemical symbols in canonical order
+    index = {symbol: ind for ind, symbol in enumerate(unique_symbols)}
+    codes = np.array([index[symbol] for symbol in symbols])
+    first = np.minimum(codes[i], codes[j])
+    second = np.maximum(codes[i], codes[j])
+    pairs, histogram = np.unique(np.stack([first, second, bins]), axis=1, return_counts=True)
+    for (a, b, distance_bin), count in zip(pairs.T.tolist(), histogram.tolist()):
+        parts.append("{}-{}:{:d}:{}".format(unique_symbols[a], unique_symbols[b], distance_bin,
+                                            Fraction(count, natoms)))
+    return hashlib.sha1(" ".join(parts).encode()).hexdigest()
+
+
+def deduplicate_structpaths(structpaths, species, _format, initial_atvolume="default", engine=None):
+    """
+    - pre-initialization stage of the JobManager: prototypes that are identical after decoration with species
+    and scaling to the initial atomic volume are calculated only once
+    - fingerprints are indexed by hash, see get_fingerprint. The first structure path of each fingerprint
+    is kept, the other ones are aliased to it
+
+    :param structpaths: (str list) absolute paths to structure files
+    :param species: (str) chemical species, e.g. 'Ni Al'
+    :param _format: (str) ase.io file format or 'prototype' format
+    :param initial_atvolume: (str) initial atomic volume given by user, see strucscan.utils.scale_by_atvolume
+    :param engine: (str) name of engine, used to look up learned atomic volumes
+    :return: (str list, dict) unique structure paths to initialize and dictionary in form of
+    {duplicate: structure path} of skipped structure paths
+    """
+    index = {}      # {fingerprint: structpath}
+    unique = []
+    aliases = {}
+    for structpath in structpaths:
+        if structpath in unique:
+            # same prototype given twice, the jobs are identical anyway
+            continue
+        atoms = read_structure_from_file(structpath, species, _format)
+        prototype = os.path.basename(structpath).split(".")[0]
+        atoms = scale_by_atvolume(atoms, initial_atvolume, prototype=prototype, engine=engine)
+        key = get_fingerprint(atoms)
+        if key in index:
+            aliases[structpath] = index[key]
+        else:
+            index[key] = structpath
+            unique.append(structpath)
+    return unique, aliases
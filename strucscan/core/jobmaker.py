@@ -1,12 +1,11 @@
-from strucscan.core import statusmanager
-from strucscan.core.datatree import get_basis_ref_structpath_and_conditional_jobpath
+from strucscan.core import statusmanager, archive, ledger, planner, submission
+from strucscan.core.datatree import get_basis_ref_structpath_and_conditional_jobpath, parse_dirname
 from strucscan.core.jobobject import JobObject
-from strucscan.utils import STRUCT_FILE_FORMAT, SEPERATOR, scale_by_atvolume, read_structure_from_file
+from strucscan.utils import STRUCT_FILE_FORMAT, SEPERATOR, RESOURCE_PLANNER, scale_by_atvolume, read_structure_from_file
 from strucscan.error import errormanager
+from strucscan import instrumentation
 from strucscan.resources.properties import *
 
-from ase import io
-
 import os
 import copy
 
@@ -27,6 +26,7 @@ class JobMaker:
         self.input_dict = input_dict
         self.inner_job_list = []
         self.VERBOSE = self.input_dict["verbose"]
+        self.dispatcher = None
 
     def initialize_jobs(self, structpath, properties):
         """
@@ -68,7 +68,7 @@ class JobMaker:
                 atoms = None
                 if statusmanager.determine_status__job_id(
                         self.calc, conditional_files, self.job_list)[1] == "finished":
-                    atoms = io.read(basis_ref_structpath, format=self.calc.struct_file_format)
+                    atoms = archive.read_structure(basis_ref_structpath, format=self.calc.struct_file_format)
 
                 jobobject = JobObject(species, property,
                                       jobpath=jobpath,
@@ -98,7 +98,7 @@ class JobMaker:
                 atoms = None
                 if statusmanager.determine_status__job_id(
                         self.calc, _conditional_files, self.job_list)[1] == "finished":
-                    atoms = io.read(basis_ref_structpath, format=self.calc.struct_file_format)
+                    atoms = archive.read_structure(basis_ref_structpath, format=self.calc.struct_file_format)
                 if (_conditional_files == conditional_files):
                     _conditional_files = ""
                     basis_ref_structpath = ""
@@ -130,8 +130,12 @@ class JobMaker:
             if (jobobject.conditional_files == "") or (statusmanager.determine_status__job_id(
                     self.calc, jobobject.conditional_files, self.job_list)[1] == "finished"):
                 if jobobject.basis_ref_atoms is None:
-                    jobobject.basis_ref_atoms = io.read(jobobject.structpath, format=self.calc.struct_file_format)
-                self.create_job_files(jobobject)
+                    jobobject.basis_ref_atoms = archive.read_structure(jobobject.structpath, format=self.calc.struct_file_format)
+                if self.dispatcher is not None:
+                    # created and submitted in order of priority by JobMaker.dispatch
+                    self.dispatcher.add_ready(jobobject)
+                else:
+                    self.create_job_files(jobobject)
         elif status == statusmanager.QUEUED:
             pass
         elif status == statusmanager.RUNNING:
@@ -148,14 +152,43 @@ class JobMaker:
         _jobobject.set_nrestarts(nrestarts)
         return _jobobject
 
-    def adpat_queue_to_smallest_queue_if_neccessary(self, atoms):
+    def dispatch(self, job_list):
         """
-        - adapts initial machine configuration dictionary to 'smallest' queue
+        - creates and submits the jobs that the dispatcher has chosen in this cycle,
+        see strucscan.core.dispatcher.Dispatcher.select
+
+        :param job_list: (list) list of all JobObjects
+        :return: 0
+        """
+        if self.dispatcher is None:
+            return
+        get_queuename = lambda jobobject: self.adpat_queue_to_smallest_queue_if_neccessary(
+            jobobject.basis_ref_atoms, jobpath=jobobject.get_jobpath())["queuename"]
+        for jobobject in self.dispatcher.select(job_list, get_queuename):
+            self.create_job_files(jobobject)
+            status_index, status, job_id = statusmanager.determine_status__job_id(
+                self.calc, jobobject.get_jobpath(), job_list)
+            jobobject.set_status_index_job_id(status_index, status, job_id)
+        return
+
+    def adpat_queue_to_smallest_queue_if_neccessary(self, atoms, jobpath=None):
+        """
+        - if RESOURCE_PLANNER is set in ~/.strucscan, queue, number of cores and number of nodes are chosen
+        from the runtimes of finished jobs, see strucscan.core.planner.plan_resources
+        - otherwise, or as long as there are not enough finished jobs, adapts initial machine configuration
+        dictionary to 'smallest' queue
         - this ensures that not a multi-core queue is used for a 'small' structure
 
         :param atoms: (ASE atoms object) ASE atoms object
+        :param jobpath: (str) absolute path to job directory
         :return: (dict)
         """
+        objective = RESOURCE_PLANNER()
+        if objective and (jobpath is not None):
+            with instrumentation.timer("planner.plan_resources"):
+                machine_info = planner.plan_resources(self.calc, atoms, jobpath, objective=objective)
+            if machine_info is not None:
+                return machine_info
         machine_info = {"queuename": self.input_dict["queuename"],
                          "ncores": self.input_dict["ncores"],
                          "nnodes": self.input_dict["nnodes"]
@@ -183,10 +216,14 @@ class JobMaker:
         """
         atoms = jobobject.basis_ref_atoms
         jobpath = jobobject.get_jobpath()
-        machine_info = self.adpat_queue_to_smallest_queue_if_neccessary(atoms)
-        machine_script_fname = self.calc.make_inputfiles(machine_info, jobobject)
+        machine_info = self.adpat_queue_to_smallest_queue_if_neccessary(atoms, jobpath=jobpath)
+        with instrumentation.timer("engine.make_inputfiles"):
+            machine_script_fname = self.calc.make_inputfiles(machine_info, jobobject)
+        instrumentation.count("jobmaker.created_jobs")
         if self.input_dict["submit"] and machine_script_fname:
-            self.submit_job(jobpath, machine_script_fname)
+            record = self.submit_job(jobpath, machine_script_fname)
+            if record is not None:
+                jobobject.set_submission(record)
         return
 
     def create_job_files(self, jobobject):
@@ -207,7 +244,9 @@ class JobMaker:
         else:
             atoms = jobobject.basis_ref_atoms
             if jobobject.scale_atoms:
-                atoms = scale_by_atvolume(atoms, self.input_dict["initial atvolume"])
+                prototype = parse_dirname(os.path.basename(jobobject.get_jobpath()))[1]
+                atoms = scale_by_atvolume(atoms, self.input_dict["initial atvolume"],
+                                          prototype=prototype, engine=self.calc.get_name().upper())
             jobobject.basis_ref_atoms = atoms
             self.make_files(jobobject)
         return
@@ -216,21 +255,33 @@ class JobMaker:
         """
         - wrapper around strucscan.engine.generalengine.GeneralEngine.submit_job
         - checks job status before submission
+        - jobs with multiple structures that have been split into image sub-jobs ('split images' in input.yaml)
+        are submitted as one job per unfinished image
 
         :param jobpath: (str) absolute path to job directory
         :param machinefilename: (str) filename of submission script / machine script
-        :return: 0
+        :return: (dict) record of the (first) submission, see strucscan.core.submission.write_submission.
+        None if nothing has been submitted or the scheduler returned no job id
         """
+        record = None
         _, jobstatus, job_id = statusmanager.determine_status__job_id(self.calc, jobpath, self.job_list)
         if (jobstatus == statusmanager.NOT_EXISTING) or (jobstatus == statusmanager.ERROR):
-            os.chdir(jobpath)
-            job_id = self.calc.submit_job(machinefilename)
-            if self.VERBOSE:
-                if job_id is not None:
-                    print("Submitted:", jobpath.split("/")[-1], " (" + job_id + ")")
-                else:
-                    print("Submitted:", jobpath.split("/")[-1])
-        return
+            paths = [jobpath]
+            nimages, finished = ledger.read_ledger(jobpath)
+            if nimages is not None:
+                paths = ledger.get_image_paths(jobpath, os.listdir(jobpath), nimages, finished) or paths
+            for path in paths:
+                job_id = self.calc.submit_job(machinefilename, path)
+                instrumentation.count("jobmaker.submitted_jobs")
+                if (record is None) and (job_id is not None):
+                    record = submission.read_submission(path)
+                if self.VERBOSE:
+                    name = "/".join(path.split("/")[len(jobpath.split("/")) - 1:])
+                    if job_id is not None:
+                        print("Submitted:", name, " (" + job_id + ")")
+                    else:
+                        print("Submitted:", name)
+        return record
 
     def get_advanced_prototypes(self, jobobject):
         property = jobobject.property
@@ -1,20 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
-import json
 import copy
 import time
 import sys
 
-from ase.io.jsonio import encode, decode
-
-from strucscan.core import statusmanager, collector
+from strucscan.core import statusmanager, collector, resultstore, dispatcher, fingerprint
+from strucscan.core.reporter import StatusReporter
 from strucscan.core.jobmaker import JobMaker
+from strucscan import instrumentation, structio
+from strucscan.scheduler import LocalPool
 from strucscan.utils import *
 from strucscan.resources.inputyaml import *
 from strucscan.resources.properties import *
 
 
 class JobManager:
-    def __init__(self, input_dict):
+    def __init__(self, input_dict, run=True, schedulers=None):
         """
         - when strucscan is called, it creates the JobManager object first
         - the JobManager object creates the JobMaker and communicates with it
@@ -26,6 +27,10 @@ class JobManager:
         5. if alls jobs are finished, the JobManager ends the process
 
         :param input_dict: (dict) input dictionary. Please follow to the examples in strucscan.resources.inputyaml
+        :param run: (bool) if False, the job list is initialized but not monitored. The monitoring cycles are left to the
+        caller, e.g. strucscan.core.daemon.Daemon, see JobManager.monitor_cycle
+        :param schedulers: (dict) dictionary in form of {machinename: strucscan.scheduler.GeneralScheduler object}
+        of schedulers shared with other JobManagers. The scheduler of this JobManager is added if its machine is missing
         """
         self.input_dict = input_dict
         if "queuename" not in self.input_dict:
@@ -38,9 +43,9 @@ class JobManager:
         self.engine_name = self.input_dict["engine"].split()[0].upper()
         self.jobwatch_filename = "jobwatch" + SEPERATOR + datetime.now().strftime("%m-%d-%Y_%H-%M") + ".dat"
         self.jobwatch = {}
-        self.cl_out = {}
-        self.cl_out_lines = {}
         self.DATA_TREE_PATH = PROJECT_PATH()
+        self.metrics = instrumentation.METRICS
+        self.metrics.configure()
         for string1, string2 in [("Data tree path:", self.DATA_TREE_PATH),
                                  ("Structure repository:", STRUCTURES_PATH()),
                                  ("Resource repository:", RESOURCE_PATH())]:
@@ -75,10 +80,18 @@ class JobManager:
         if DEBUG():
             self.input_dict["verbose"] = True
         self.VERBOSE = self.input_dict["verbose"]
+        # in debug mode the full job table is printed every cycle instead of the transitions
+        self.reporter = StatusReporter(self.DATA_TREE_PATH, verbose=self.VERBOSE and not DEBUG())
 
         self.job_list = []
         self.calc = get_calc(self.engine_name, self.input_dict)
-        self.calc.set_scheduler()
+        if (schedulers is not None) and (self.calc.machinename in schedulers):
+            self.calc.scheduler = schedulers[self.calc.machinename]
+        else:
+            self.calc.set_scheduler()
+            if schedulers is not None:
+                schedulers[self.calc.machinename] = self.calc.get_scheduler()
+        self.collect_calcs = {}
 
         self.assembled_properties = []
         if (self.input_dict["properties"] is None) or (self.input_dict["prototypes"] is None):
@@ -121,9 +134,11 @@ class JobManager:
         if self.input_dict["monitor"]:
             self.input_dict["submit"] = True
         self.jobmaker = JobMaker(self.job_list, self.calc, self.input_dict)
+        self.jobmaker.dispatcher = dispatcher.get_dispatcher(self.calc, self.input_dict)
 
         # collect all structure paths
         self.structpaths = []
+        self.prototype_aliases = {}
         for prototype in self.prototypes:
             if prototype[0] == "<":
                 for root1, dirs1, files1 in os.walk(STRUCTURES_PATH):
@@ -162,82 +177,101 @@ class JobManager:
             print("-"*114)
             print("{:>3}: {:60}  {:60}".format("#", "jobpath", "prototype path"))
             print("-"*114)
+            ndirs_project = len(self.DATA_TREE_PATH.split("/"))
+            ndirs_structures = len(STRUCTURES_PATH().split("/"))
             for i, jobobject in enumerate(self.job_list):
                 print("{:>3}: {:60}  {:60}". \
                       format(str(i),
-                             "/".join([s for s in jobobject.get_jobpath().split("/")[len(PROJECT_PATH().split("/")):]]),
-                             "/".join([s for s in jobobject.structpath.split("/")[len(STRUCTURES_PATH().split("/")):]])
+                             "/".join([s for s in jobobject.get_jobpath().split("/")[ndirs_project:]]),
+                             "/".join([s for s in jobobject.structpath.split("/")[ndirs_structures:]])
                              )
                       )
             print("")
             if DEBUG():
-                print("{:>3}: {:60}  {:8}  {:8}".format("#", "jobpath", "JobID", "Status"))
-                print("-" * 114)
-                for i, jobobject in enumerate(self.job_list):
-                    path = "/".join([s for s in jobobject.get_jobpath().split("/")[len(
-                        PROJECT_PATH().split("/")):]])
-                    print("{i:>3}: {path:60}  {job_id:8}  {status:8}". \
-                          format(i=str(i),
-                                 path=path,
-                                 job_id=str(jobobject.get_job_id()),
-                                 status=jobobject.get_status()
-                                 )
-                          )
-            else:
-                if self.command_line_output():
-                    print(
-                        "{:>3}: {:60} {:8} {:8} {:20} {:20}".format(
-                            "#", "jobpath", "id", "status", "start", "end"))
-                    print("-" * 114)
-                    for job, line in self.cl_out_lines.items():
-                        print(line)
+                self.print_job_table()
+        self.reporter.update(self.job_list)
 
+        if run:
+            self.run()
+        return
+
+    def run(self):
+        """
+        - monitors all jobs until they are finished, if 'monitor' is set in the input
+        - jobs of a local pool are started by this process, see strucscan.scheduler.LocalPool. Without monitoring,
+        it waits until all jobs of the pool have exited, so that no queued job is dropped at exit
+
+        :return: 0
+        """
         if (self.job_list != []) and self.input_dict["monitor"]:
             if self.VERBOSE:
                 print("")
                 print(">> Entering loop:")
             finished = False
             while not finished:
-                self.update_job_list()
-                if np.array([jobobject.get_status_index() for jobobject in self.job_list]).all() == 1:
-                    finished = True
-                if self.VERBOSE:
-                    if DEBUG():
-                        print("{:>3}: {:60}  {:8}  {:8}".format("#", "jobpath", "JobID", "Status"))
-                        print("-"*114)
-                        for i, jobobject in enumerate(self.job_list):
-                            path = "/".join([s for s in jobobject.get_jobpath().split("/")[len(
-                                PROJECT_PATH().split("/")):]])
-                            print("{i:>3}: {path:60}  {job_id:8}  {status:8}". \
-                                    format(i=str(i),
-                                           path=path,
-                                           job_id=str(jobobject.get_job_id()),
-                                           status=jobobject.get_status()
-                                           )
-                                  )
-                    else:
-                        if self.command_line_output():
-                            print("{:>3}: {:60} {:8} {:8} {:20} {:20}".format("#", "jobpath", "id", "status", "start", "end"))
-                            print("-"*114)
-                            for job, line in self.cl_out_lines.items():
-                                print(line)
+                finished = self.monitor_cycle()
                 if self.input_dict["collect"]:
                     self.collect()
+                self.metrics.end_cycle(njobs=len(self.job_list), statuses=self.count_statuses())
                 time.sleep(SLEEP_TIME())
+        scheduler = self.calc.get_scheduler()
+        if isinstance(scheduler, LocalPool) and (not scheduler.wait(timeout=0.)):
+            if self.VERBOSE:
+                print("")
+                print(">> Waiting for the jobs of the local pool:")
+            scheduler.wait()
         if self.input_dict["collect"]:
-            self.collect()
+            self.collect(final=True)
+        if self.metrics.enabled:
+            fname = self.metrics.write_summary()
+            if self.VERBOSE:
+                print("Metrics written to:", self.metrics.fname)
+                print("Metrics summary written to:", fname)
         if self.VERBOSE:
             print("Finished.")
         return
 
+    def monitor_cycle(self):
+        """
+        - updates the status of all jobs once and reports the jobs whose status has changed,
+        see strucscan.core.reporter.StatusReporter. In debug mode, the full job table is printed
+
+        :return: (bool) True if all jobs are finished
+        """
+        self.update_job_list()
+        finished = False
+        if np.array([jobobject.get_status_index() for jobobject in self.job_list]).all() == 1:
+            finished = True
+        if self.VERBOSE and DEBUG():
+            self.print_job_table()
+        self.reporter.update(self.job_list)
+        return finished
+
     def initialize_job_list(self):
         """
         - calls JobMaker to initialize the job_list
+        - cfg and prototype structure files are loaded into the structure cache in one batch first,
+        see strucscan.structio.load_cfgs
+        - if 'deduplicate prototypes' is set in the input, prototypes that are identical after decoration
+        are initialized only once, see strucscan.core.fingerprint.deduplicate_structpaths
 
         :return: 0
         """
         if self.VERBOSE:
             print(">> Initializing:")
+        if STRUCT_FILE_FORMAT() in ["cfg", "prototype"]:
+            with instrumentation.timer("structio.load_cfgs"):
+                structio.load_cfgs(self.structpaths)
+        if self.input_dict["deduplicate prototypes"] == True:
+            species = " ".join([s.split("_")[0] for s in self.input_dict["species"].split()])
+            with instrumentation.timer("fingerprint.deduplicate_structpaths"):
+                self.structpaths, self.prototype_aliases = fingerprint.deduplicate_structpaths(
+                    self.structpaths, species, STRUCT_FILE_FORMAT(),
+                    initial_atvolume=self.input_dict["initial atvolume"], engine=self.calc.get_name().upper())
+            if self.VERBOSE:
+                for duplicate, structpath in self.prototype_aliases.items():
+                    print("Skipped prototype {}: identical to {} after decoration.".format(
+                        os.path.basename(duplicate), os.path.basename(structpath)))
         if (self.structpaths != []):
             for structpath in self.structpaths:
                 jobobjects = self.jobmaker.initialize_jobs(structpath, self.assembled_properties)
@@ -252,114 +286,139 @@ class JobManager:
         self.job_list = unique_jobobject
         return
 
+    @instrumentation.timed("JobManager.update_job_list")
     def update_job_list(self):
         """
         - calls JobMaker to update job_list
+        - if NTHREADS > 1 in ~/.strucscan, the jobs are updated by a pool of threads. This overlaps
+        the latency of status probes and file creation on network file systems. Jobs that wait for a
+        prerequisite job which finishes in the same cycle are created in the next cycle.
+        - if limits of submitted jobs or priority weights are given, jobs that are ready are created and
+        submitted afterwards in order of priority, see strucscan.core.dispatcher
 
         :return: 0
         """
-        for i, jobobject in enumerate(self.job_list):
-            if DEBUG():
-                print("")
-                print("Update jobobject #", i)
-                print("jobpath:", jobobject.jobpath)
-                print("structpath:", jobobject.structpath)
-                print("basis_ref_atoms:", jobobject.basis_ref_atoms)
-                print("conditonal files in:", jobobject.conditional_files)
-            jobobject = self.jobmaker.update(jobobject)
+        nthreads = NTHREADS()
+        if nthreads > 1:
+            with ThreadPoolExecutor(max_workers=nthreads) as executor:
+                jobobjects = list(executor.map(self.update_jobobject, range(len(self.job_list)), list(self.job_list)))
+        else:
+            jobobjects = [self.update_jobobject(i, jobobject) for i, jobobject in enumerate(list(self.job_list))]
+        for i, jobobject in enumerate(jobobjects):
             self.job_list[i] = jobobject
+        with instrumentation.timer("JobMaker.dispatch"):
+            self.jobmaker.dispatch(self.job_list)
         return
 
-    def command_line_output(self):
-        update = False
-        for ind, jobobject in enumerate(self.job_list):
-            jobpath = "/".join([s for s in jobobject.get_jobpath().split("/")[len(PROJECT_PATH().split("/")):]])
-            status_index, status, job_id = jobobject.get_status_index_job_id()
-            if jobpath not in self.cl_out:
-                self.cl_out[jobpath] = {"start": "", "end": ""}
-                self.cl_out_lines[jobpath] = ""
-            if (status == "running") and (self.cl_out[jobpath]["start"] == ""):
-                self.cl_out[jobpath]["start"] = datetime.now().strftime("%m/%d/%Y %H:%M")
-            if (status_index == 1) and (self.cl_out[jobpath]["end"] == ""):
-                self.cl_out[jobpath]["end"] = datetime.now().strftime("%m/%d/%Y %H:%M")
-            line = "{:>3d} {:60} {:8} {:8} {:20} {:20}".format(ind, jobpath, str(job_id), status, self.cl_out[jobpath]["start"], self.cl_out[jobpath]["end"])
-            if line == self.cl_out_lines[jobpath]:
-                pass
-            else:
-                self.cl_out_lines[jobpath] = line
-                update = True
-        return update
+    def update_jobobject(self, i, jobobject):
+        """
+        - calls JobMaker to update a single JobObject
 
-    def collect(self):
+        :param i: (int) index of jobobject in job_list
+        :param jobobject: (strucscan.core.jobobject.JobObject object) object that contains information about job
+        :return: (strucscan.core.jobobject.JobObject object) updated JobObject
+        """
+        if DEBUG():
+            print("")
+            print("Update jobobject #", i)
+            print("jobpath:", jobobject.jobpath)
+            print("structpath:", jobobject.structpath)
+            print("basis_ref_atoms:", jobobject.basis_ref_atoms)
+            print("conditonal files in:", jobobject.conditional_files)
+        return self.jobmaker.update(jobobject)
+
+    def print_job_table(self):
+        """
+        - prints path, id and status of every job
+
+        :return: 0
+        """
+        ndirs_project = len(self.DATA_TREE_PATH.split("/"))
+        print("{:>3}: {:60}  {:8}  {:8}".format("#", "jobpath", "JobID", "Status"))
+        print("-"*114)
+        for i, jobobject in enumerate(self.job_list):
+            path = "/".join([s for s in jobobject.get_jobpath().split("/")[ndirs_project:]])
+            print("{i:>3}: {path:60}  {job_id:8}  {status:8}". \
+                  format(i=str(i),
+                         path=path,
+                         job_id=str(jobobject.get_job_id()),
+                         status=jobobject.get_status()
+                         )
+                  )
+        return
+
+    def count_statuses(self):
+        """
+        - counted by the status reporter when the statuses were last reported
+
+        :return: (dict) number of jobs per status, e.g. {'queued': 3, 'finished': 10}
+        """
+        return dict(self.reporter.statuses)
+
+    @instrumentation.timed("JobManager.collect")
+    def collect(self, final=False, job_list=None):
         """
         - navigates through the whole data tree from top to bottom
         - collects data from each directory in data tree
         - collects data from a directory only if the data not already have been stored in the output dict written to disk
+        - if ARCHIVE_JOBS is set in ~/.strucscan, each job directory is packed into an archive after its data
+        has been collected
+        - if NPROCS_COLLECT > 1 in ~/.strucscan, compositions are collected by a pool of processes.
+        Workers do not restart failed jobs, this is left to the monitoring loop
+        - results are appended to a journal per composition under a file lock, so several strucscan instances
+        can collect into the same data tree. A journal is compacted into its output dict when it contains
+        JOURNAL_COMPACT_SIZE results (see ~/.strucscan) and at the end of the run
 
+        :param final: (bool) compact all journals into the output dicts
+        :param job_list: (list) JobObjects whose errors are restarted during collection. If None, the job_list of
+        this JobManager is used
         :return: 0
         """
+        if job_list is None:
+            job_list = self.job_list
+        tasks = []
         if os.path.exists(self.DATA_TREE_PATH):
             for calculator in os.listdir(self.DATA_TREE_PATH):
-                _calc = self.calc
+                calculator_path = self.DATA_TREE_PATH + "/" + calculator
+                if not os.path.isdir(calculator_path):
+                    # e.g. metrics files
+                    continue
                 if self.calc.get_name().upper() in calculator:
-                    pass
+                    engine_name = self.engine_name
                 else:
                     # if data created by an engine different from self.calc is checked:
                     # create engine object and set current scheduler to it
                     # so statusmanager can determine job status
                     engine_name = calculator.split("_")[0].upper()
                     try:
-                        _calc = get_calc(engine_name, self.input_dict)
+                        if engine_name not in self.collect_calcs:
+                            _calc = get_calc(engine_name, self.input_dict)
+                            _calc.set_scheduler()
+                            self.collect_calcs[engine_name] = _calc
                     except KeyError:
-                        _calc = None
-                if _calc is not None:
-                    if _calc.get_scheduler() is None:
-                        try:
-                            _calc.set_schedular()
-                        except AttributeError:
-                            pass
-                    if _calc.get_scheduler() is not None:
-                        if os.path.isdir(self.DATA_TREE_PATH + "/" + calculator):
-                            for composition in [dir for dir in os.listdir(self.DATA_TREE_PATH + "/" + calculator)]:
-                                if os.path.isdir(self.DATA_TREE_PATH + "/" + calculator + "/" + composition):
-
-                                    fname = "{DATA_TREE_PATH}/{calculator}/{calculator}{SEPERATOR}{composition}{SEPERATOR}output_dict.json". \
-                                        format(DATA_TREE_PATH=self.DATA_TREE_PATH,
-                                               calculator=calculator,
-                                               SEPERATOR=SEPERATOR,
-                                               composition=composition)
-                                    output_dict = {}
-                                    try:
-                                        with open(fname) as stream:
-                                            output_dict = json.load(stream)
-                                            stream.close()
-                                        names = list(output_dict.keys())
-                                    except FileNotFoundError:
-                                        names = []
-                                    composition_path = "{}/{}/{}".format(self.DATA_TREE_PATH, calculator, composition)
-                                    for property_prototype_stochio in [dir for dir in os.listdir(composition_path) if os.path.isdir(composition_path + "/" + dir)]:
-                                        path = "{DATA_TREE_PATH}/{calculator}/{composition}/{property_prototype_stochio}". \
-                                        format(DATA_TREE_PATH=self.DATA_TREE_PATH,
-                                               calculator=calculator,
-                                               composition=composition,
-                                               property_prototype_stochio=property_prototype_stochio)
-
-                                        property = property_prototype_stochio.split(SEPERATOR)[0]
-                                        jobname = collector.get_jobname(path)
-                                        if jobname in names:
-                                            pass
-                                        else:
-                                            _, status, job_id = statusmanager.determine_status__job_id(_calc, path, self.job_list)
-                                            if status == statusmanager.FINISHED:
-                                                if DEBUG():
-                                                    collecting_directory = "/".join([s for s in path.split("/")[len(self.DATA_TREE_PATH.split("/")):]])
-                                                    print(">> collecting", collecting_directory, "...")
-                                                result_dict = collector.get_result_dict(_calc, property, path)
-                                                if result_dict != {}:
-                                                    output_dict[jobname] = result_dict
-                                    json_dumps = encode(output_dict)
-                                    with open(fname, "w") as f:
-                                        f.write(json_dumps)
+                        continue
+                for composition in os.listdir(calculator_path):
+                    if os.path.isdir(calculator_path + "/" + composition):
+                        tasks.append((engine_name, calculator, composition))
+
+        nprocs = NPROCS_COLLECT()
+        if (nprocs > 1) and (len(tasks) > 1):
+            with ProcessPoolExecutor(max_workers=min(nprocs, len(tasks))) as executor:
+                futures = [executor.submit(collector.collect_composition_task, engine_name, self.input_dict,
+                                           self.DATA_TREE_PATH, calculator, composition)
+                           for engine_name, calculator, composition in tasks]
+                outputs = [future.result() for future in futures]
+        else:
+            outputs = []
+            for engine_name, calculator, composition in tasks:
+                _calc = self.calc if engine_name == self.engine_name else self.collect_calcs[engine_name]
+                outputs.append(collector.collect_composition(_calc, self.DATA_TREE_PATH, calculator, composition,
+                                                             job_list=job_list))
+
+        min_entries = 1 if final else JOURNAL_COMPACT_SIZE()
+        for fname, results in outputs:
+            with instrumentation.timer("resultstore.compact"):
+                resultstore.compact(fname, min_entries=min_entries)
         return
 
     def assemble_property(self, name, option):
@@ -7,7 +7,7 @@ class JobObject():
     def __init__(self, species, property,
                  jobpath="", basis_ref_atoms=None, basis_ref_structpath="", stochio="",
                  status_index=1, status="finished", job_id=None, nrestarts=0,
-                 scale_atoms=True, conditional_files=""):
+                 scale_atoms=True, conditional_files="", submission=None):
         """
         - contains most important information about a job
         - each job is assigned one JobObject
@@ -26,6 +26,8 @@ class JobObject():
         :param nrestarts: (int) number of restarts. The job will declared as (1, 'error') if nrestarts > 3
         :param requires_condition: (bool) True if any prerequisite calculation is required
         :param condition_finished: (bool) True if required prerequisite calculation is finished
+        :param submission: (dict) record of the last submission by this strucscan instance,
+                           see strucscan.core.submission.write_submission
         """
         self.species = species
         self.property = property
@@ -39,6 +41,7 @@ class JobObject():
         self.nrestarts = nrestarts
         self.scale_atoms = scale_atoms
         self.conditional_files = conditional_files
+        self.submission = submission
 
         if self.job_id is None:
             self.job_id = "None"
@@ -137,3 +140,18 @@ class JobObject():
         :param nrestarts: (int) number of restarts. The job will declared as (1, 'error') if nrestarts > 3
         """
         self.nrestarts = nrestarts
+
+    def get_submission(self):
+        """
+        :return: (dict) record of the last submission, see strucscan.core.submission.write_submission.
+                        None if the job has not been submitted by this strucscan instance
+        """
+        return self.submission
+
+    def set_submission(self, submission):
+        """
+        :param submission: (dict) record of the last submission, see strucscan.core.submission.write_submission
+        :return: 0
+        """
+        self.submission = submission
+        return
@@ -0,0 +1,135 @@
+import re
+import os
+
+LEDGER_FNAME = "images.dat"
+IMAGE_DIR_PREFIX = "image-"
+
+
+def write_ledger(jobpath, nimages):
+    """
+    - creates the image ledger of a job with multiple structures, e.g. E-V curves, transformation paths, ...
+    - the machine script appends one line 'image: i' to the ledger as soon as image i has been finished
+
+    :param jobpath: (str) absolute path to job directory
+    :param nimages: (int) number of images of job
+    :return: 0
+    """
+    with open(jobpath + "/" + LEDGER_FNAME, "w") as f:
+        f.write("nimages: {:d}\n".format(nimages))
+    return
+
+
+def read_ledger(jobpath):
+    """
+    :param jobpath: (str) absolute path to job directory
+    :return: (int, set) tuple of number of images (None if the job has no ledger) and set of indices of finished images
+    """
+    nimages = None
+    finished = set()
+    try:
+        with open(jobpath + "/" + LEDGER_FNAME, "r") as f:
+            for line in f:
+                try:
+                    key, value = line.split(":")
+                    if key == "nimages":
+                        nimages = int(value)
+                    elif key == "image":
+                        finished.add(int(value))
+                except ValueError:
+                    # incomplete line
+                    continue
+    except FileNotFoundError:
+        pass
+    return nimages, finished
+
+
+def get_missing_images(nimages, finished):
+    """
+    :param nimages: (int) number of images of job
+    :param finished: (set) set of indices of finished images
+    :return: (int list) sorted indices of images that have not been finished
+    """
+    return [index for index in range(nimages) if index not in finished]
+
+
+def get_image_indices(files, pattern):
+    """
+    - determines images from file names, e.g. for job directories without ledger
+
+    :param files: (str list or strucscan.core.statusmanager.JobDirState object) all files in job directory
+    :param pattern: (str) regular expression of file name with a group for the index, e.g. r'OUTCAR-(\\d+)\\.gz'
+    :return: (set) set of indices of images
+    """
+    regex = re.compile(pattern)
+    indices = set()
+    for file in files:
+        match = regex.fullmatch(file)
+        if match:
+            indices.add(int(match.group(1)))
+    return indices
+
+
+def get_ledger_line(index, test="true", ledger=LEDGER_FNAME):
+    """
+    :param index: (int) index of image
+    :param test: (str) shell condition that is true if image has been finished successfully
+    :param ledger: (str) path to ledger relative to the working directory of the machine script
+    :return: (str) line of machine script that marks image as finished
+    """
+    return "{test} && echo \"image: {index:d}\" >> {ledger}\n".format(test=test, index=index, ledger=ledger)
+
+
+def get_image_dirname(index):
+    """
+    :param index: (int) index of image
+    :return: (str) name of sub-directory of image, e.g. 'image-3'
+    """
+    return "{}{:d}".format(IMAGE_DIR_PREFIX, index)
+
+
+def get_image_paths(jobpath, files, nimages, finished):
+    """
+    :param jobpath: (str) absolute path to job directory
+    :param files: (str list or strucscan.core.statusmanager.JobDirState object) all files in job directory
+    :param nimages: (int) number of images of job
+    :param finished: (set) set of indices of finished images
+    :return: (str list) absolute paths to sub-directories of images that have not been finished
+    """
+    return [jobpath + "/" + get_image_dirname(index) for index in get_missing_images(nimages, finished)
+            if get_image_dirname(index) in files]
+
+
+def get_completion_lines(nimages, footer, ledger="../" + LEDGER_FNAME):
+    """
+    - wraps footer of machine script of an image sub-job, so that only the sub-job that finishes
+    the last image of the job writes 'end.dat' to the job directory
+
+    :param nimages: (int) number of images of job
+    :param footer: (str list) footer of machine script, i.e. lines starting with 'STOP=`date`'
+    :param ledger: (str) path to ledger relative to the image sub-directory
+    :return: (str list) lines of machine script
+    """
+    lines = ["if [ $(grep \"^image:\" {} | sort -u | wc -l) -ge {:d} ]; then\n".format(ledger, nimages)]
+    for line in footer:
+        lines.append(line.replace(">> end.dat", ">> ../end.dat").rstrip() + "\n")
+    lines.append("fi\n")
+    return lines
+
+
+def make_image_dir(jobpath, index, files):
+    """
+    - creates sub-directory of image in which a single image can run independently of the other images
+    - input files are linked, not copied
+
+    :param jobpath: (str) absolute path to job directory
+    :param index: (int) index of image
+    :param files: (str list) names of input files in job directory that are required by the image
+    :return: (str) absolute path to sub-directory of image
+    """
+    image_path = jobpath + "/" + get_image_dirname(index)
+    os.makedirs(image_path, exist_ok=True)
+    for file in files:
+        link = image_path + "/" + file
+        if not os.path.lexists(link):
+            os.symlink("../" + file, link)
+    return image_path
@@ -0,0 +1,252 @@
+from ase.formula import Formula
+import numpy as np
+import json
+import os
+
+from strucscan.core import datatree, ledger, resultstore
+from strucscan.utils import SEPERATOR
+
+HISTORY_SUFFIX = "runtimes.jsonl"
+MIN_SAMPLES = 4               # minimum number of finished jobs before the cost model is used
+RIDGE = 1e-3                  # regularization of the fit of the cost model
+FEATURES = ["natoms", "nkpoints", "encut"]
+TIE_TOLERANCE = 1e-6          # relative difference of core-hours below which candidates are taken as equal
+
+# cost models by history file, see get_cost_model
+_cost_models = {}
+
+
+def get_history_path(jobpath):
+    """
+    :param jobpath: (str) absolute path to job directory
+    :return: (str) absolute path to runtime history of the engine directory of job,
+    e.g. '.../VASP_5_4__500_kdens_0_150_SP_PBE/VASP_5_4__500_kdens_0_150_SP_PBE__runtimes.jsonl'
+    """
+    calculator_path = os.path.dirname(datatree.get_composition_path(jobpath.rstrip("/")))
+    return "{}/{}{}{}".format(calculator_path, os.path.basename(calculator_path), SEPERATOR, HISTORY_SUFFIX)
+
+
+def get_walltime(jobpath):
+    """
+    :param jobpath: (str) absolute path to job directory
+    :return: (float) seconds between writing 'start.dat' and 'end.dat'. None if unknown
+    """
+    try:
+        walltime = os.path.getmtime(jobpath + "/end.dat") - os.path.getmtime(jobpath + "/start.dat")
+    except OSError:
+        return None
+    if walltime <= 0:
+        return None
+    return walltime
+
+
+def get_ncores(calc, jobpath):
+    """
+    :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object with scheduler
+    :param jobpath: (str) absolute path to job directory
+    :return: (int) number of total cores in machine script of job. None if there is no machine script
+    """
+    scheduler = calc.get_scheduler()
+    for fname in sorted(os.listdir(jobpath)):
+        if fname.endswith("." + scheduler.suffix):
+            with open(jobpath + "/" + fname, "r") as f:
+                return int(scheduler.get_total_number_of_cores(f.readlines()))
+    return None
+
+
+def record_job(calc, jobpath):
+    """
+    - appends runtime, number of cores and cost features of a finished job to the runtime history of its engine
+    - has to be called before the job directory is archived
+
+    :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object with scheduler
+    :param jobpath: (str) absolute path to job directory
+    :return: (dict) entry of runtime history. None if runtime or number of cores are unknown
+    """
+    if not os.path.isdir(jobpath):
+        return None
+    walltime = get_walltime(jobpath)
+    ncores = get_ncores(calc, jobpath)
+    if (walltime is None) or (ncores is None):
+        return None
+    dirname = os.path.basename(jobpath.rstrip("/"))
+    property, prototype, stochio = datatree.parse_dirname(dirname)
+    try:
+        natoms = sum(Formula(stochio).count().values())
+    except ValueError:
+        return None
+    nimages = ledger.read_ledger(jobpath)[0] or 1
+    entry = {"jobname": dirname,
+             "natoms": natoms,
+             "nimages": nimages,
+             "ncores": ncores,
+             "walltime": walltime}
+    entry.update(calc.read_cost_features(jobpath))
+    history_path = get_history_path(jobpath)
+    with resultstore.locked(history_path):
+        with open(history_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def read_history(history_path):
+    """
+    :param history_path: (str) absolute path to runtime history
+    :return: (dict list) entries of runtime history
+    """
+    entries = []
+    try:
+        with open(history_path, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class CostModel:
+    def __init__(self, coefficients):
+        """
+        - log-linear model of the core-seconds of a single image:
+        log(ncores * walltime / nimages) = c_0 + c_1 log(natoms) + c_2 log(nkpoints) + c_3 log(encut) + c_4 log(ncores)
+        - c_4 describes the loss of parallel efficiency with increasing number of cores. It is fitted only if
+        the runtime history contains jobs with at least two different numbers of cores, otherwise perfect scaling
+        is assumed (c_4 = 0), i.e. the core-seconds do not depend on the number of cores
+
+        :param coefficients: (numpy array) coefficients c_0 ... c_4
+        """
+        self.coefficients = coefficients
+
+    @staticmethod
+    def get_row(features, ncores):
+        """
+        :param features: (dict) cost features, missing features are ignored
+        :param ncores: (int) number of total cores
+        :return: (numpy array) row of design matrix
+        """
+        row = [1.]
+        for feature in FEATURES:
+            value = features.get(feature)
+            row.append(np.log(float(value)) if value else 0.)
+        row.append(np.log(float(ncores)))
+        return np.array(row)
+
+    @classmethod
+    def fit(cls, entries):
+        """
+        :param entries: (dict list) entries of runtime history
+        :return: (strucscan.core.planner.CostModel object). None if there are less than MIN_SAMPLES entries
+        """
+        rows = []
+        targets = []
+        for entry in entries:
+            try:
+                row = cls.get_row(entry, entry["ncores"])
+                target = np.log(entry["ncores"] * entry["walltime"] / entry.get("nimages", 1))
+            except (KeyError, TypeError, ValueError, ZeroDivisionError):
+                continue
+            rows.append(row)
+            targets.append(target)
+        if len(rows) < MIN_SAMPLES:
+            return None
+        a = np.array(rows)
+        fit_ncores = len(np.unique(a[:, -1])) > 1
+        if not fit_ncores:
+            # log(ncores) is a multiple of the intercept, e.g. if all jobs ran with the ncores of the input
+            a = a[:, :-1]
+        a = np.vstack([a, np.sqrt(RIDGE) * np.eye(a.shape[1])])
+        b = np.concatenate([np.array(targets), np.zeros(a.shape[1])])
+        coefficients = np.linalg.lstsq(a, b, rcond=None)[0]
+        if not fit_ncores:
+            coefficients = np.append(coefficients, 0.)
+        return cls(coefficients)
+
+    def predict_walltime(self, features, ncores, nimages=1):
+        """
+        :param features: (dict) cost features of job, e.g. {'natoms': 4, 'nkpoints': 1000, 'encut': 500}
+        :param ncores: (int) number of total cores
+        :param nimages: (int) number of images of job
+        :return: (float) predicted walltime in seconds
+        """
+        core_seconds = np.exp(np.dot(self.coefficients, self.get_row(features, ncores)))
+        return float(core_seconds * nimages / ncores)
+
+
+def get_cost_model(history_path):
+    """
+    - the cost model is fitted again only if the runtime history has changed since the last call
+
+    :param history_path: (str) absolute path to runtime history
+    :return: (strucscan.core.planner.CostModel object). None if there are not enough finished jobs
+    """
+    try:
+        size = os.path.getsize(history_path)
+    except OSError:
+        return None
+    if (history_path not in _cost_models) or (_cost_models[history_path][0] != size):
+        _cost_models[history_path] = (size, CostModel.fit(read_history(history_path)))
+    return _cost_models[history_path][1]
+
+
+def plan_resources(calc, atoms, jobpath, objective="core-hours"):
+    """
+    - chooses queue, number of cores per node and number of nodes of a job from the queues in 'queues'
+    of the config.yaml of the machine, e.g.
+
+        queues:
+          parallel12:
+            ncores: 12          # cores per node
+            max nodes: 4
+            max walltime: 48    # hours
+
+    - candidates whose predicted walltime exceeds 'max walltime' of their queue are discarded
+    - objective 'core-hours' chooses the fewest total cores among candidates of equal core-hours. If the model
+    predicts equal core-hours for all candidates, e.g. if the runtime history has a single number of cores and
+    perfect scaling is assumed, no candidate is chosen, so the job keeps the queue of the input or the smallest
+    queue for small structures, see strucscan.core.jobmaker.JobMaker.adpat_queue_to_smallest_queue_if_neccessary
+
+    :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object
+    :param atoms: (ASE atoms object or list of ASE atoms objects) structure(s) of job
+    :param jobpath: (str) absolute path to job directory
+    :param objective: (str) 'core-hours' to minimize ncores * walltime, 'turnaround' to minimize walltime
+    :return: (dict) dictionary of form {"queuename": str, "ncores": int, "nnodes": int}.
+    None if no queues are configured, the cost model has not enough data or cannot tell the candidates apart
+    """
+    queues = calc.machine_configuration_dict.get("queues")
+    if not queues:
+        return None
+    model = get_cost_model(get_history_path(jobpath))
+    if model is None:
+        return None
+    nimages = 1
+    if isinstance(atoms, list):
+        nimages = len(atoms)
+        atoms = atoms[0]
+    features = {"natoms": len(atoms)}
+    features.update(calc.get_cost_features(atoms))
+
+    candidates = []     # (core-hours, walltime, total cores, machine info)
+    for queuename, queue in queues.items():
+        if (queue is None) or ("ncores" not in queue):
+            continue
+        ncores = int(queue["ncores"])
+        for nnodes in range(1, int(queue.get("max nodes", 1)) + 1):
+            ntotalcores = ncores * nnodes
+            walltime = model.predict_walltime(features, ntotalcores, nimages=nimages)
+            if ("max walltime" in queue) and (walltime > float(queue["max walltime"]) * 3600.):
+                continue
+            candidates.append((walltime * ntotalcores / 3600., walltime, ntotalcores,
+                               {"queuename": queuename, "ncores": ncores, "nnodes": nnodes}))
+    if candidates == []:
+        return None
+    if objective == "turnaround":
+        return min(candidates, key=lambda candidate: (candidate[1], candidate[0]))[3]
+    minimum = min(candidate[0] for candidate in candidates)
+    ties = [candidate for candidate in candidates if candidate[0] - minimum <= TIE_TOLERANCE * minimum]
+    if (len(candidates) > 1) and (len(ties) == len(candidates)):
+        # the model cannot tell the candidates apart
+        return None
+    return min(ties, key=lambda candidate: (candidate[2], candidate[1]))[3]
@@ -0,0 +1,182 @@
+from datetime import datetime
+import json
+import os
+import sys
+import time
+
+from strucscan.core import datatree
+from strucscan.utils import STATUS_FILE, SEPERATOR
+
+
+class StatusReporter:
+    def __init__(self, project_path, fname=None, verbose=True, stream=None):
+        """
+        - reports the status of the jobs of a JobManager as a stream of transitions instead of reprinting a table
+        of all jobs every cycle
+        - the last status and job id of every job is kept, so each cycle only compares one tuple per job and
+        formats output for the jobs whose status or id has changed
+        - aggregate counters per status, per property and per composition are updated with every transition
+        - if a status file is configured, every transition and the counters after every changed cycle are appended
+        as JSON lines, e.g.
+        {"event": "transition", "time": 1700000000.0, "jobpath": "DUMMY/Al/static__fcc__Al", "property": "static",
+        "composition": "Al", "from": "queued", "to": "running", "job_id": "123"}
+
+        :param project_path: (str) absolute path to data tree. Job paths are reported relative to it
+        :param fname: (str or bool) path to JSON-lines status file. True for default file name in data tree,
+        False for no file. If None, STATUS_FILE in ~/.strucscan is used
+        :param verbose: (bool) print transitions and counters
+        :param stream: (file object) stream the transitions and counters are printed to. If None, sys.stdout is used
+        """
+        self.project_path = project_path.rstrip("/")
+        self.verbose = verbose
+        self.stream = stream
+        self.states = {}        # {jobpath: (status, job_id)}
+        self.labels = {}        # {jobpath: (relative jobpath, property, composition)}
+        self.statuses = {}      # {status: number of jobs}
+        self.properties = {}    # {property: {status: number of jobs}}
+        self.compositions = {}  # {composition: {status: number of jobs}}
+
+        if fname is None:
+            fname = STATUS_FILE()
+        if (fname is False) or (fname is None) or (str(fname).lower() in ["false", "off", ""]):
+            self.fname = None
+        else:
+            if fname is True or (str(fname).lower() in ["true", "on"]):
+                fname = "{}/status{}{}.jsonl".format(self.project_path, SEPERATOR,
+                                                     datetime.now().strftime("%m-%d-%Y_%H-%M"))
+            directory = os.path.dirname(os.path.abspath(fname))
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self.fname = os.path.abspath(fname)
+
+    def get_label(self, jobobject):
+        """
+        - determined once per job
+
+        :param jobobject: (strucscan.core.jobobject.JobObject object) object that contains information about job
+        :return: (str, str, str) path to job directory relative to data tree, property and composition of job
+        """
+        jobpath = jobobject.get_jobpath()
+        if jobpath.startswith(self.project_path + "/"):
+            relative_path = jobpath[len(self.project_path) + 1:]
+        else:
+            relative_path = jobpath
+        composition = os.path.basename(datatree.get_composition_path(jobpath))
+        return relative_path, str(jobobject.property), composition
+
+    def count(self, jobpath, status, increment):
+        """
+        :param jobpath: (str) absolute path to job directory
+        :param status: (str) status of job, see strucscan.core.statusmanager
+        :param increment: (int) 1 if job enters status, -1 if job leaves status
+        :return: 0
+        """
+        relative_path, property, composition = self.labels[jobpath]
+        for counters in [self.statuses,
+                         self.properties.setdefault(property, {}),
+                         self.compositions.setdefault(composition, {})]:
+            counters[status] = counters.get(status, 0) + increment
+            if counters[status] == 0:
+                del counters[status]
+        return
+
+    def update(self, job_list):
+        """
+        - compares the current status and id of every job with the last reported ones
+        - jobs seen for the first time are reported as transitions from None
+
+        :param job_list: (list) JobObjects
+        :return: (dict list) transition events of this cycle, see StatusReporter
+        """
+        now = time.time()
+        events = []
+        for jobobject in job_list:
+            jobpath = jobobject.get_jobpath()
+            status_index, status, job_id = jobobject.get_status_index_job_id()
+            state = (status, None if job_id in [None, "None"] else str(job_id))
+            previous = self.states.get(jobpath)
+            if previous == state:
+                continue
+            if previous is None:
+                self.labels[jobpath] = self.get_label(jobobject)
+            else:
+                self.count(jobpath, previous[0], -1)
+            self.count(jobpath, status, 1)
+            self.states[jobpath] = state
+            relative_path, property, composition = self.labels[jobpath]
+            events.append({"event": "transition",
+                           "time": now,
+                           "jobpath": relative_path,
+                           "property": property,
+                           "composition": composition,
+                           "from": None if previous is None else previous[0],
+                           "to": status,
+                           "job_id": state[1]})
+        if events:
+            if self.fname is not None:
+                self.write(events + [dict(self.get_counters(), event="counters", time=now)])
+            if self.verbose:
+                self.print_events(events)
+        return events
+
+    def get_counters(self):
+        """
+        :return: (dict) number of jobs per status, per property and status and per composition and status
+        in form of {'statuses': {status: int}, 'properties': {property: {status: int}},
+        'compositions': {composition: {status: int}}}
+        """
+        return {"statuses": dict(self.statuses),
+                "properties": {key: dict(value) for key, value in self.properties.items()},
+                "compositions": {key: dict(value) for key, value in self.compositions.items()}}
+
+    def write(self, records):
+        """
+        :param records: (dict list) events appended to status file as JSON lines
+        :return: 0
+        """
+        with open(self.fname, "a") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+        return
+
+    def print_events(self, events):
+        """
+        - prints changed jobs one line each, jobs seen for the first time are only counted
+        - prints the counters per status and per property, and the counters of the compositions with transitions
+
+        :param events: (dict list) transition events of this cycle
+        :return: 0
+        """
+        stream = self.stream if self.stream is not None else sys.stdout
+        timestamp = datetime.fromtimestamp(events[0]["time"]).strftime("%m/%d/%Y %H:%M:%S")
+        lines = []
+        nnew = 0
+        compositions = []
+        for event in events:
+            if event["composition"] not in compositions:
+                compositions.append(event["composition"])
+            if event["from"] is None:
+                nnew += 1
+                continue
+            lines.append("{} {:60} {:>14} -> {:14} {}".format(timestamp, event["jobpath"], event["from"],
+                                                              event["to"], event["job_id"] or ""))
+        if nnew:
+            lines.append("{} {} new jobs".format(timestamp, nnew))
+        lines.append("{} {:20} {} ({} jobs)".format(timestamp, "status:", format_counters(self.statuses),
+                                                    len(self.states)))
+        for property in sorted(self.properties):
+            lines.append("{} {:20} {}".format(timestamp, "property " + property + ":",
+                                              format_counters(self.properties[property])))
+        for composition in compositions:
+            lines.append("{} {:20} {}".format(timestamp, "composition " + composition + ":",
+                                              format_counters(self.compositions[composition])))
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+        return
+
+
+def format_counters(counters):
+    """
+    :param counters: (dict) number of jobs per status
+    :return: (str) e.g. 'finished: 10, queued: 3'
+    """
+    return ", ".join("{}: {}".format(status, counters[status]) for status in sorted(counters))
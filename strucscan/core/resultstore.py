@@ -0,0 +1,238 @@
+from contextlib import contextmanager
+import json
+import os
+
+from strucscan.utils import encode, decode
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking available, e.g. on Windows
+    fcntl = None
+
+# in-memory index of collected job names, see get_collected_names
+_collected_names = {}
+
+
+def get_output_dict_path(data_tree_path, calculator, composition, seperator):
+    """
+    :param data_tree_path: (str) absolute path to data tree
+    :param calculator: (str) name of engine directory, e.g. 'VASP_5_4__500_kdens_0_150_SP_PBE'
+    :param composition: (str) name of composition directory, e.g. 'AlNi'
+    :param seperator: (str) strucscan.utils.SEPERATOR
+    :return: (str) absolute path to output dict of composition
+    """
+    return "{data_tree_path}/{calculator}/{calculator}{seperator}{composition}{seperator}output_dict.json". \
+        format(data_tree_path=data_tree_path,
+               calculator=calculator,
+               seperator=seperator,
+               composition=composition)
+
+
+@contextmanager
+def locked(fname):
+    """
+    - exclusive lock on 'fname.lock' that is shared between processes and strucscan instances
+
+    :param fname: (str) absolute path to file that is protected by the lock
+    """
+    with open(fname + ".lock", "a") as lockfile:
+        if fcntl is not None:
+            fcntl.flock(lockfile.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
+
+
+def write_atomic(fname, text):
+    """
+    - writes text to a temporary file in the same directory and renames it to fname,
+    so readers see either the old or the new file but never a truncated one
+
+    :param fname: (str) absolute path to file
+    :param text: (str) content of file
+    :return: 0
+    """
+    tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+    with open(tmp_fname, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_fname, fname)
+    return
+
+
+def get_journal_path(fname):
+    """
+    :param fname: (str) absolute path to output dict, e.g. '.../VASP__AlNi__output_dict.json'
+    :return: (str) absolute path to results journal, e.g. '.../VASP__AlNi__output_dict.journal.jsonl'
+    """
+    return os.path.splitext(fname)[0] + ".journal.jsonl"
+
+
+def read_output_dict(fname):
+    """
+    - reads the JSON snapshot of the output dict, without the entries of the results journal
+    - a snapshot that cannot be parsed (e.g. truncated by an older strucscan version) is moved to
+    'fname.corrupt' instead of being overwritten
+
+    :param fname: (str) absolute path to output dict
+    :return: (dict) output dict as stored in JSON, i.e. without decoding numpy arrays
+    """
+    try:
+        with open(fname) as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        print("Could not parse {}. Moved to {}.corrupt".format(fname, fname))
+        os.replace(fname, fname + ".corrupt")
+        return {}
+
+
+def read_journal(fname):
+    """
+    - replays the results journal of an output dict
+    - incomplete lines, e.g. from an interrupted write, are skipped
+
+    :param fname: (str) absolute path to output dict
+    :return: (dict) dictionary in form of {jobname: result_dict} without decoding numpy arrays
+    """
+    results = {}
+    try:
+        with open(get_journal_path(fname)) as stream:
+            for line in stream:
+                try:
+                    entry = json.loads(line)
+                    results[entry["jobname"]] = entry["result"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def load_output_dict(fname):
+    """
+    :param fname: (str) absolute path to output dict
+    :return: (dict) snapshot of output dict updated by all entries of the results journal
+    """
+    output_dict = read_output_dict(fname)
+    output_dict.update(read_journal(fname))
+    return output_dict
+
+
+def decode_output_dict(fname):
+    """
+    :param fname: (str) absolute path to output dict
+    :return: (dict) output dict including the results journal with numpy arrays decoded
+    """
+    return decode(json.dumps(load_output_dict(fname)))
+
+
+def get_collected_names(fname):
+    """
+    - set of names of all jobs stored in the output dict and its results journal
+    - the set is kept in memory: the output dict is read again only if it has been replaced,
+    and only entries appended to the journal since the last call are read
+
+    :param fname: (str) absolute path to output dict
+    :return: (set) set of job names. Do not modify
+    """
+    try:
+        stat = os.stat(fname)
+        snapshot_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        snapshot_key = None
+    index = _collected_names.get(fname)
+    if (index is None) or (index["snapshot"] != snapshot_key):
+        names = set(read_output_dict(fname).keys()) if snapshot_key is not None else set()
+        index = {"snapshot": snapshot_key, "names": names, "offset": 0}
+        _collected_names[fname] = index
+    try:
+        with open(get_journal_path(fname), "rb") as stream:
+            if os.fstat(stream.fileno()).st_size < index["offset"]:
+                # journal has been compacted by another process without replacing the snapshot yet
+                index["offset"] = 0
+            stream.seek(index["offset"])
+            for line in stream:
+                if not line.endswith(b"\n"):
+                    # incomplete line of a write in progress
+                    break
+                index["offset"] += len(line)
+                try:
+                    index["names"].add(json.loads(line)["jobname"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except FileNotFoundError:
+        index["offset"] = 0
+    return index["names"]
+
+
+def append_result(fname, jobname, result_dict):
+    """
+    - appends one collected result to the results journal of the output dict and syncs it to disk,
+    so it survives an interruption of strucscan without being parsed again
+
+    :param fname: (str) absolute path to output dict
+    :param jobname: (str) name of job, e.g. 'static__fcc__Al'
+    :param result_dict: (dict) summarized results of calculation
+    :return: 0
+    """
+    line = '{{"jobname": {}, "result": {}}}\n'.format(json.dumps(jobname), encode(result_dict))
+    with locked(fname):
+        with open(get_journal_path(fname), "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+    return
+
+
+def count_journal_entries(fname):
+    """
+    :param fname: (str) absolute path to output dict
+    :return: (int) number of lines in results journal
+    """
+    try:
+        with open(get_journal_path(fname), "rb") as stream:
+            return sum(1 for line in stream)
+    except FileNotFoundError:
+        return 0
+
+
+def compact(fname, min_entries=1):
+    """
+    - merges the results journal into the JSON snapshot of the output dict and empties the journal
+    - the snapshot is replaced atomically before the journal is emptied, so an interruption leaves
+    either the old snapshot and the full journal or the new snapshot
+
+    :param fname: (str) absolute path to output dict
+    :param min_entries: (int) compact only if the journal contains at least 'min_entries' entries
+    :return: (bool) True if the journal has been compacted
+    """
+    with locked(fname):
+        if (count_journal_entries(fname) < min_entries) and os.path.exists(fname):
+            return False
+        output_dict = load_output_dict(fname)
+        write_atomic(fname, json.dumps(output_dict))
+        journal = get_journal_path(fname)
+        if os.path.exists(journal):
+            os.remove(journal)
+    return True
+
+
+def merge_output_dict(fname, results):
+    """
+    - appends new results to the results journal and compacts it into the output dict on disk
+    - entries collected concurrently by other processes or strucscan instances are kept
+
+    :param fname: (str) absolute path to output dict
+    :param results: (dict) dictionary in form of {jobname: result_dict}
+    :return: 0
+    """
+    for jobname, result_dict in results.items():
+        append_result(fname, jobname, result_dict)
+    compact(fname)
+    return
@@ -1,5 +1,7 @@
 from strucscan.error import errormanager
-from strucscan.scheduler import NoQueue
+from strucscan.core import archive, ledger, submission
+from strucscan.scheduler import NoQueue, LocalPool, ACCOUNTING_ACTIVE_STATES
+from strucscan import instrumentation
 
 import os
 
@@ -9,7 +11,174 @@ QUEUED = "queued"                   # 0
 NOT_EXISTING = "does not exist"     # 0
 ERROR = "error"                     # 1/0
 
+MARKER_FILES = ["start.dat", "end.dat"]
 
+
+class JobDirState:
+    def __init__(self, jobpath, exists=False, names=None, stats=None, archived=False):
+        """
+        - snapshot of a job directory as read by a single os.scandir call
+        - behaves like the list of file names in the directory, i.e. it can be iterated and
+        supports 'in', so it can be handed to methods that expect os.listdir output
+        - sizes and modification times are kept for marker files (start.dat, end.dat) and result files
+
+        :param jobpath: (str) absolute path to job directory
+        :param exists: (bool) True if job directory exists
+        :param names: (str list) names of all entries in job directory
+        :param stats: (dict) dictionary in form of {name: (size, mtime)} for marker and result files
+        :param archived: (bool) True if the job directory has been packed into an archive
+        """
+        self.jobpath = jobpath
+        self.exists = exists
+        self.names = names if names is not None else []
+        self.stats = stats if stats is not None else {}
+        self.archived = archived
+        self._name_set = set(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self._name_set
+
+    def __len__(self):
+        return len(self.names)
+
+    def _stat(self, name):
+        if name not in self.stats:
+            try:
+                stat = os.stat(self.jobpath + "/" + name)
+                self.stats[name] = (stat.st_size, stat.st_mtime)
+            except FileNotFoundError:
+                self.stats[name] = (0, 0.)
+        return self.stats[name]
+
+    def get_size(self, name):
+        """
+        :param name: (str) file name
+        :return: (int) size of file in bytes
+        """
+        return self._stat(name)[0]
+
+    def get_mtime(self, name):
+        """
+        :param name: (str) file name
+        :return: (float) modification time of file
+        """
+        return self._stat(name)[1]
+
+
+def probe_jobpath(jobpath, calc=None):
+    """
+    - reads job directory with a single os.scandir call
+    - stats marker files and result files of 'calc' from the directory entries
+
+    :param jobpath: (str) absolute path to job directory
+    :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object
+    :return: (strucscan.core.statusmanager.JobDirState object)
+    """
+    names = []
+    stats = {}
+    try:
+        with os.scandir(jobpath) as entries:
+            for entry in entries:
+                names.append(entry.name)
+                if (entry.name in MARKER_FILES) or ((calc is not None) and calc.is_resultfile(entry.name)):
+                    try:
+                        stat = entry.stat()
+                        stats[entry.name] = (stat.st_size, stat.st_mtime)
+                    except FileNotFoundError:
+                        pass
+    except (FileNotFoundError, NotADirectoryError):
+        if archive.is_archived(jobpath):
+            return JobDirState(jobpath, exists=True, names=archive.listdir(jobpath), archived=True)
+        return JobDirState(jobpath, exists=False)
+    return JobDirState(jobpath, exists=True, names=names, stats=stats)
+
+
+def get_local_job_id(scheduler, jobpath, files):
+    """
+    :param scheduler: (strucscan.scheduler.LocalPool object)
+    :param jobpath: (str) absolute path to job directory
+    :param files: (strucscan.core.statusmanager.JobDirState object) content of job directory
+    :return: (str) id of the job in the pool. If images have been submitted as sub-jobs, id of a queued or
+    running image sub-job, or of the last image sub-job. None if no job was submitted to the pool
+    """
+    job_id = scheduler.get_job_id_by_jobpath(jobpath)
+    if any(name.startswith(ledger.IMAGE_DIR_PREFIX) for name in files):
+        nimages, finished = ledger.read_ledger(jobpath)
+        if nimages is not None:
+            for image_path in ledger.get_image_paths(jobpath, files, nimages, finished):
+                image_job_id = scheduler.get_job_id_by_jobpath(image_path)
+                if image_job_id is not None:
+                    job_id = image_job_id
+                    if scheduler.is_job_id_in_queue(job_id):
+                        break
+    return job_id
+
+
+def get_queue_job_id(calc, jobpath, files, snapshot):
+    """
+    - looks the job up by the id recorded at submission, see strucscan.core.submission. If images have been
+    submitted as sub-jobs, the records of the unfinished images are looked up as well
+    - orphaned jobs without record, e.g. submitted by older versions of strucscan, are matched by the working
+    directories of all jobs in queue
+
+    :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object
+    :param jobpath: (str) absolute path to job directory
+    :param files: (strucscan.core.statusmanager.JobDirState object) content of job directory
+    :param snapshot: (dict) jobs in queue, see strucscan.scheduler.GeneralScheduler.get_queue_snapshot
+    :return: (str) id of job. If the job is not in queue, the last recorded id or None
+    """
+    paths = [jobpath]
+    if any(name.startswith(ledger.IMAGE_DIR_PREFIX) for name in files):
+        nimages, finished = ledger.read_ledger(jobpath)
+        if nimages is not None:
+            paths += ledger.get_image_paths(jobpath, files, nimages, finished)
+    job_id = None
+    for path in paths:
+        if (path == jobpath) and (submission.SUBMISSION_FNAME not in files):
+            continue
+        recorded_id = submission.get_submitted_job_id(path, calc.machinename)
+        if recorded_id is not None:
+            job_id = recorded_id
+            if job_id in snapshot:
+                return job_id
+    if job_id is not None:
+        return job_id
+
+    # orphaned job
+    job_id = calc.scheduler.get_job_id_by_jobpath(jobpath)
+    if (job_id is None) and (len(paths) > 1):
+        # images restarted as sub-jobs in their own sub-directories
+        for image_path in paths[1:]:
+            job_id = calc.scheduler.get_job_id_by_jobpath(image_path)
+            if job_id in snapshot:
+                break
+    return job_id
+
+
+def get_accounting_state(calc, jobpath, job_id):
+    """
+    - looks up a recorded job that has left the queue snapshot in the accounting of the scheduler,
+    see strucscan.scheduler.Slurm.get_accounting_states
+    - the accounting is searched from the recorded submission time on, see strucscan.core.submission
+
+    :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object
+    :param jobpath: (str) absolute path to job directory
+    :param job_id: (str) recorded id of job
+    :return: (str) state of job, e.g. 'COMPLETED', 'FAILED' or 'TIMEOUT'. None if the job is unknown
+    to the accounting
+    """
+    record = submission.read_submission(jobpath)
+    start = None
+    if (record is not None) and (record["job_id"] == job_id):
+        start = record["time"]
+    with instrumentation.timer("scheduler.sacct"):
+        return calc.scheduler.get_accounting_states([job_id], start=start).get(job_id)
+
+
+@instrumentation.timed("statusmanager.determine_status__job_id")
 def determine_status__job_id(calc, jobpath, job_list):
     """
     On queuing systems, job_id equals queue id, on systems without queue, job_id equals process id
@@ -27,27 +196,62 @@ def determine_status__job_id(calc, jobpath, job_list):
     :return: (int, str, str) tuple of job status index (int), status (str) and job id (str).
     """
     status_index, status, job_id = (0, NOT_EXISTING, None)
-    if os.path.exists(jobpath):
-        os.chdir(jobpath)
-        files = os.listdir(os.getcwd())
+    instrumentation.count("statusmanager.probes")
+    files = probe_jobpath(jobpath, calc)
+    if files.archived:
+        # only finished jobs are archived
+        status_index, status, job_id = (1, FINISHED, None)
+    elif files.exists:
         if "end.dat" in files:
-            if calc.check_if_finished(files):
+            with instrumentation.timer("engine.check_if_finished"):
+                finished = calc.check_if_finished(files)
+            if finished:
                 status_index, status, job_id = (1, FINISHED, None)
             else:
-                status_index, status, job_id, _ = errormanager.determine_status__job_id(calc, jobpath, job_list)
+                status_index, status, job_id, _ = errormanager.determine_status__job_id(calc, jobpath, job_list,
+                                                                                        state=files)
         else:
-            if isinstance(calc.get_scheduler(), NoQueue):
+            scheduler = calc.get_scheduler()
+            local_job_id = None
+            if isinstance(scheduler, LocalPool):
+                local_job_id = get_local_job_id(scheduler, jobpath, files)
+            if local_job_id is not None:
+                # exact state of a job submitted by this strucscan instance
+                job_id = local_job_id
+                state = scheduler.get_state(job_id)
+                if state == LocalPool.QUEUED:
+                    status_index, status, job_id = (0, QUEUED, job_id)
+                elif state == LocalPool.RUNNING:
+                    status_index, status, job_id = (0, RUNNING, job_id)
+                else:
+                    # machine script exited without writing end.dat
+                    status_index, status, job_id, _ = errormanager.determine_status__job_id(calc, jobpath, job_list,
+                                                                                            state=files)
+            elif isinstance(scheduler, (NoQueue, LocalPool)):
+                # on LocalPool: job of a previous strucscan instance
                 if "start.dat" in files:
                     status_index, status, job_id = (0, RUNNING, None)
                 else:
                     status_index, status, job_id = (0, NOT_EXISTING, None)
             else:
-                job_id = calc.scheduler.get_job_id_by_jobpath(jobpath)
-                if calc.scheduler.is_job_id_in_queue(job_id):
+                snapshot = calc.scheduler.get_cached_queue_snapshot()
+                job_id = get_queue_job_id(calc, jobpath, files, snapshot)
+                accounting_state = None
+                if (job_id is not None) and (job_id not in snapshot):
+                    # recorded job that has left the queue, or is missing from the snapshot, e.g. if squeue failed
+                    accounting_state = get_accounting_state(calc, jobpath, job_id)
+                    if accounting_state == "COMPLETED":
+                        # machine script has exited normally, its last files may have been written after the probe
+                        files = probe_jobpath(jobpath, calc)
+                if (job_id in snapshot) or (accounting_state in ACCOUNTING_ACTIVE_STATES):
                     if calc.has_resultfile(files):
                         status_index, status, job_id = (0, RUNNING, job_id)
                     else:
                         status_index, status, job_id = (0, QUEUED, job_id)
+                elif (accounting_state == "COMPLETED") and ("end.dat" in files) and calc.check_if_finished(files):
+                    status_index, status, job_id = (1, FINISHED, None)
                 else:
-                    status_index, status, job_id, _ = errormanager.determine_status__job_id(calc, jobpath, job_list)
+                    # e.g. FAILED, TIMEOUT or CANCELLED, or exited without writing end.dat
+                    status_index, status, job_id, _ = errormanager.determine_status__job_id(calc, jobpath, job_list,
+                                                                                            state=files)
     return status_index, status, job_id
@@ -0,0 +1,60 @@
+import socket
+import time
+
+from strucscan.core.resultstore import write_atomic
+
+SUBMISSION_FNAME = "submission.dat"
+
+
+def write_submission(path, job_id, machinename):
+    """
+    - records the id that the scheduler returned on submission in the directory of the job (or image sub-job),
+    so that its status can be looked up by id instead of matching the working directories of all queued jobs
+    - a later submission in the same directory replaces the record
+
+    :param path: (str) absolute path to directory in which the machine script has been submitted
+    :param job_id: (str) id of job in scheduler
+    :param machinename: (str) name of machine, see strucscan.scheduler.GeneralScheduler
+    :return: (dict) record in form of {'job_id': str, 'machine': str, 'host': str, 'time': float}
+    """
+    record = {"job_id": str(job_id), "machine": machinename, "host": socket.gethostname(), "time": time.time()}
+    write_atomic(path + "/" + SUBMISSION_FNAME,
+                 "".join("{}: {}\n".format(key, value) for key, value in record.items()))
+    return record
+
+
+def read_submission(path):
+    """
+    :param path: (str) absolute path to directory of job (or image sub-job)
+    :return: (dict) record, see write_submission. None if nothing has been submitted from this directory
+    by a version of strucscan that records submissions
+    """
+    record = {}
+    try:
+        with open(path + "/" + SUBMISSION_FNAME, "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value:
+                    record[key.strip()] = value.strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if not record.get("job_id"):
+        return None
+    try:
+        record["time"] = float(record["time"])
+    except (KeyError, ValueError):
+        record["time"] = None
+    return record
+
+
+def get_submitted_job_id(path, machinename):
+    """
+    :param path: (str) absolute path to directory of job (or image sub-job)
+    :param machinename: (str) name of machine of the current scheduler
+    :return: (str) recorded id of job. None if there is no record or the job was submitted to another machine,
+    whose ids mean nothing to the current scheduler
+    """
+    record = read_submission(path)
+    if (record is None) or (record.get("machine") != machinename):
+        return None
+    return record["job_id"]
@@ -0,0 +1,163 @@
+from ase.formula import Formula
+import numpy as np
+import os
+
+from strucscan.core import datatree, resultstore
+from strucscan.resources import atomicdata
+from strucscan.utils import PROJECT_PATH
+
+# weight of the tabulated atomic volumes when fitting atomic volumes per species to collected results
+PRIOR_WEIGHT = 0.1
+
+# caches by data tree path and engine, see get_volume_cache
+_volume_caches = {}
+
+
+class VolumeCache:
+    def __init__(self):
+        """
+        - atomic volumes learned from collected results
+        - volumes of structures that have been calculated before are looked up by prototype and composition,
+        volumes of new structures are estimated from atomic volumes per species that are fitted to all results
+        """
+        self.volumes = {}             # {(prototype, reduced formula): (priority, atomic volume)}
+        self.species_volumes = {}     # {chemical symbol: atomic volume}
+
+    def add(self, prototype, stochio, atvolume, priority):
+        """
+        :param prototype: (str) name of prototype, e.g. 'fcc'
+        :param stochio: (str) chemical formula, e.g. 'Al3Ni'
+        :param atvolume: (float) atomic volume
+        :param priority: (int) results of higher priority replace results of lower priority
+        :return: 0
+        """
+        key = (prototype, str(Formula(stochio).reduce()[0]))
+        if (key not in self.volumes) or (self.volumes[key][0] < priority):
+            self.volumes[key] = (priority, atvolume)
+        return
+
+    def fit_species_volumes(self):
+        """
+        - fits atomic volumes V_i per species to the atomic volumes V of all results, V = sum(x_i * V_i),
+        where x_i is the fraction of species i. The fit is regularized towards the tabulated atomic volumes
+        of strucscan.resources.atomicdata
+
+        :return: 0
+        """
+        symbols = sorted({symbol for prototype, formula in self.volumes for symbol in Formula(formula).count()})
+        if symbols == []:
+            self.species_volumes = {}
+            return
+        rows = []
+        targets = []
+        for (prototype, formula), (priority, atvolume) in self.volumes.items():
+            count = Formula(formula).count()
+            n_atom = sum(count.values())
+            rows.append([count.get(symbol, 0) / n_atom for symbol in symbols])
+            targets.append(atvolume)
+        prior = np.array([atomicdata.atomic_volumes.get(symbol, np.mean(targets)) for symbol in symbols])
+        a = np.vstack([np.array(rows), PRIOR_WEIGHT * np.eye(len(symbols))])
+        b = np.concatenate([np.array(targets), PRIOR_WEIGHT * prior])
+        fitted = np.linalg.lstsq(a, b, rcond=None)[0]
+        self.species_volumes = {symbol: float(volume) for symbol, volume in zip(symbols, fitted)}
+        return
+
+    def get_atvolume(self, atoms, prototype=None):
+        """
+        :param atoms: (ASE atoms object) with assigned chemical symbols
+        :param prototype: (str) name of prototype, e.g. 'fcc'
+        :return: (float) learned atomic volume of prototype and composition if it has been calculated before,
+        otherwise estimated from the atomic volumes per species
+        """
+        formula = atoms.get_chemical_formula()
+        key = (prototype, str(Formula(formula).reduce()[0]))
+        if key in self.volumes:
+            return self.volumes[key][1]
+        count = Formula(formula).count()
+        n_atom = sum(count.values())
+        atvolume = 0.
+        for symbol, n in count.items():
+            atvolume += n / n_atom * self.species_volumes.get(symbol, atomicdata.atomic_volumes[symbol])
+        return atvolume
+
+
+def get_output_dict_paths(data_tree_path, engine):
+    """
+    :param data_tree_path: (str) absolute path to data tree
+    :param engine: (str) only output dicts of engine directories that contain this name are used, e.g. 'VASP'
+    :return: (dict) dictionary in form of {absolute path to output dict: (mtime, size of output dict and journal)}
+    """
+    paths = {}
+    if not os.path.isdir(data_tree_path):
+        return paths
+    for calculator in os.listdir(data_tree_path):
+        calculator_path = data_tree_path + "/" + calculator
+        if (engine is not None) and (engine not in calculator):
+            continue
+        if not os.path.isdir(calculator_path):
+            continue
+        with os.scandir(calculator_path) as entries:
+            names = {entry.name: entry for entry in entries if entry.is_file()}
+        for name, entry in names.items():
+            if name.endswith("output_dict.json"):
+                stat = entry.stat()
+                journal = os.path.basename(resultstore.get_journal_path(entry.path))
+                journal_size = names[journal].stat().st_size if journal in names else 0
+                paths[entry.path] = (stat.st_mtime_ns, stat.st_size, journal_size)
+            elif name.endswith("output_dict.journal.jsonl"):
+                fname = entry.path[:-len(".journal.jsonl")] + ".json"
+                if not os.path.exists(fname):
+                    paths[fname] = (0, 0, entry.stat().st_size)
+    return paths
+
+
+def build_volume_cache(output_dict_paths):
+    """
+    - reads atomic volumes from collected results: 'equilibrium_volume' of E-V curves
+    and 'volume' of fully relaxed ('total') structures. Results of E-V curves are preferred
+
+    :param output_dict_paths: (str list) absolute paths to output dicts
+    :return: (strucscan.core.volumecache.VolumeCache object)
+    """
+    cache = VolumeCache()
+    for fname in output_dict_paths:
+        for jobname, result_dict in resultstore.load_output_dict(fname).items():
+            property, prototype, stochio = datatree.parse_dirname(jobname)
+            try:
+                n_atom = sum(Formula(stochio).count().values())
+                if ("eos" in property) and ("equilibrium_volume" in result_dict):
+                    cache.add(prototype, stochio, float(result_dict["equilibrium_volume"]) / n_atom, 2)
+                elif (property == "total") and ("volume" in result_dict):
+                    cache.add(prototype, stochio, float(result_dict["volume"]) / n_atom, 1)
+            except (ValueError, TypeError, ZeroDivisionError):
+                # unknown chemical formula or results that are no numbers
+                continue
+    cache.fit_species_volumes()
+    return cache
+
+
+def get_volume_cache(data_tree_path=None, engine=None):
+    """
+    - volume cache is rebuilt only if an output dict or its results journal has changed since the last call
+
+    :param data_tree_path: (str) absolute path to data tree. If None, PROJECT_PATH in ~/.strucscan is used
+    :param engine: (str) only results of engine directories that contain this name are used, e.g. 'VASP'
+    :return: (strucscan.core.volumecache.VolumeCache object)
+    """
+    if data_tree_path is None:
+        data_tree_path = PROJECT_PATH()
+    paths = get_output_dict_paths(data_tree_path, engine)
+    key = (data_tree_path, engine)
+    if (key not in _volume_caches) or (_volume_caches[key][0] != paths):
+        _volume_caches[key] = (paths, build_volume_cache(sorted(paths)))
+    return _volume_caches[key][1]
+
+
+def get_initial_atvolume(atoms, prototype=None, engine=None):
+    """
+    :param atoms: (ASE atoms object) with assigned chemical symbols
+    :param prototype: (str) name of prototype, e.g. 'fcc'
+    :param engine: (str) only results of engine directories that contain this name are used, e.g. 'VASP'
+    :return: (float) learned initial atomic volume
+    """
+    return get_volume_cache(engine=engine).get_atvolume(atoms, prototype=prototype)
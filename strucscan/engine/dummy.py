@@ -1,13 +1,12 @@
 from strucscan.engine.generalengine import GeneralEngine
-from strucscan.core import datatree
+from strucscan.core import datatree, archive, ledger
 from strucscan.utils import PROJECT_PATH, STRUCT_FILE_FORMAT
+from strucscan import structio
 from strucscan.resources.properties import *
 
-from ase import io
 from ase.calculators.singlepoint import SinglePointCalculator
 
 import numpy as np
-import subprocess
 import os
 
 
@@ -59,21 +58,24 @@ class DummyEngine(GeneralEngine):
         property = jobobject.property
 
         if not os.path.exists(jobpath):
-            os.makedirs(jobpath)
+            os.makedirs(jobpath, exist_ok=True)
 
         # write machinefile
         ncores = int(machine_info["ncores"])
         nnodes = int(machine_info["nnodes"])
         ntotalcores = ncores * nnodes
-        nsteps = len(atoms)
+        nsteps = 1
+        if isinstance(atoms, list):
+            nsteps = len(atoms)
         jobname = self.subjobname(self.species, property)
         machinefile, machinefilename = self.make_machinefile(machine_info, jobname, ntotalcores, property, nsteps)
 
         # write structure
         if isinstance(atoms, list):
             # this is in the case of, e.g. murnaghan calculation, transformation path, ...
-            for i, atom in enumerate(atoms):
-                self.write_structure(atom, jobpath, structfilename="structure-{:d}.{}".format(i, self.struct_file_format))
+            structio.write_structures(atoms, [jobpath + "/structure-{:d}.{}".format(i, self.struct_file_format)
+                                              for i in range(len(atoms))], "cfg")
+            ledger.write_ledger(jobpath, len(atoms))
             atoms = atoms[0]
         else:
             self.write_structure(atoms, jobpath)
@@ -93,6 +95,8 @@ class DummyEngine(GeneralEngine):
         with open(jobpath + "/" + machinefilename, "w") as f:
             for line in machinefile:
                 f.write(line)
+        if self.split_images and (nsteps > 1):
+            self.write_image_subjobs(machine_info, jobpath, jobname, ntotalcores, property, nsteps)
 
         return machinefilename
 
@@ -118,7 +122,7 @@ class DummyEngine(GeneralEngine):
                    )
         return absolute_jobpath
 
-    def make_machinefile(self, machine_info, jobname, ntotalcores, property, nsteps):
+    def make_machinefile(self, machine_info, jobname, ntotalcores, property, nsteps, image=None, restart_lines=None):
         """
         - dummy method to create / write machine script
 
@@ -127,6 +131,8 @@ class DummyEngine(GeneralEngine):
         :param ntotalcores: (int) number of total cores, that is #cores per node * #of nodes
         :param property: (str) name of property
         :param nsteps: (int) number of single calculation of, e.g. E-V curves, transformation path, ...
+        :param image: (int) if given, machine script of a sub-job that calculates only this image in its sub-directory
+        :param restart_lines: (str list) not used by dummy engine
         :return: (str list, str) tuple of (list of lines in machine script, machine script file name)
         """
         machine_script, machine_script_fname = self.scheduler.configure_machine_script(machine_info, jobname=jobname)
@@ -140,7 +146,8 @@ class DummyEngine(GeneralEngine):
             config = self.machine_configuration_dict["DUMMY"]["serial"]
         call = config.split("\n")[-2]
 
-        machine_script.append("echo \"property: %s\" >> start.dat\n" % property)
+        startfile = "start.dat" if image is None else "../start.dat"
+        machine_script.append("echo \"property: %s\" >> %s\n" % (property, startfile))
         machine_script.append("\n")
 
         if modules != []:
@@ -148,14 +155,11 @@ class DummyEngine(GeneralEngine):
                 machine_script.append("module load %s\n" % module)
         machine_script.append("\n")
 
-        if nsteps > 1:
+        if image is not None:
+            machine_script += self.make_image_lines(call, image, subdir=True)
+        elif nsteps > 1:
             for i in range(nsteps):
-                machine_script.append("cp structure-{:d}.cfg structure.cfg\n".format(i))
-                machine_script.append(call + "\n")
-                machine_script.append("mv final.cfg final-{:d}.cfg\n".format(i))
-                machine_script.append("mv log.out log-{:d}.out\n".format(i))
-                machine_script.append("rm structure-{:d}.cfg\n".format(i))
-                # you can add further lines to machinefile to, e.g. move or gzip files
+                machine_script += self.make_image_lines(call, i)
                 machine_script.append("\n")
             machine_script.append("rm structure.cfg\n")
         else:
@@ -163,21 +167,53 @@ class DummyEngine(GeneralEngine):
             # you can add further lines to machinefile to, e.g. move or gzip files
 
         machine_script.append("\n")
-        machine_script.append("STOP=`date`\n")
-        machine_script.append("echo \"stop: $STOP  $HOSTNAME\" >> end.dat ")
+        footer = ["STOP=`date`\n",
+                  "echo \"stop: $STOP  $HOSTNAME\" >> end.dat "]
+        if image is not None:
+            footer = ledger.get_completion_lines(nsteps, footer)
+        machine_script += footer
         return machine_script, machine_script_fname
 
+    def get_image_lines(self, call, index):
+        """
+        - dummy lines of machine script that calculate image with index
+
+        :param call: (str) binary call
+        :param index: (int) index of image
+        :return: (str list) lines of machine script
+        """
+        # you can add further lines to machinefile to, e.g. move or gzip files
+        return ["cp structure-{:d}.cfg structure.cfg\n".format(index),
+                call + "\n",
+                "mv final.cfg final-{:d}.cfg\n".format(index),
+                "mv log.out log-{:d}.out\n".format(index),
+                "rm structure-{:d}.cfg\n".format(index)]
+
+    def get_image_files(self, index):
+        """
+        :param index: (int) index of image
+        :return: (str list) names of dummy result files of image
+        """
+        return ["final-{:d}.cfg".format(index), "log-{:d}.out".format(index)]
+
+    def get_image_input_files(self, index):
+        """
+        :param index: (int) index of image
+        :return: (str list) names of dummy input files of image
+        """
+        return ["infile.in", "potfile.pot", "structure-{:d}.cfg".format(index)]
+
     @staticmethod
     def write_structure(atoms, jobpath, structfilename="structure.cfg"):
         """
-        - dummy method to write engine specific structure file
+        - dummy method to write engine specific structure file, see strucscan.structio.write_structure
 
         :param atoms: (ASE atoms object) atoms object with assigned chemical symbols, magnetic moments and scaled positions
         :param jobpath: (str) absolute path to job directory
         :param structfilename: (str) name of structure file that is written to disk. for VASP, structfilename is 'POSCAR'
         :return: 0
         """
-        io.write(jobpath + "/" + structfilename, atoms, format="cfg")
+        structio.write_structure(atoms, jobpath + "/" + structfilename, "cfg")
         return
 
     @staticmethod
@@ -193,39 +229,30 @@ class DummyEngine(GeneralEngine):
         if resultfilename not in fname:
             fname += "/" + resultfilename
         try:
-            final_struct = io.read(fname, format="cfg")
+            final_struct = archive.read_structure(fname, format="cfg")
             calc = SinglePointCalculator(atoms=final_struct, energy=0., forces=np.zeros((len(final_struct), 3)), stress=np.zeros(6))
             final_struct.calc = calc
             return final_struct
         except Exception:
             raise FileNotFoundError("{} not found.".format(fname))
 
-    def has_resultfile(self, files):
-        try:
-            for file in files:
-                if ("log" in file) and (".out" in file):
-                    return True
-            else:
-                return False
-        except NotADirectoryError:
-            raise
+    def is_resultfile(self, filename):
+        """
+        :param filename: (str) name of file
+        :return: (bool)
+        """
+        return ("log" in filename) and (".out" in filename)
 
-    def check_if_finished(self, files):
+    def check_if_finished(self, state):
         """
         - dummy method to check if the calculation in job directory with files with files is finished
 
-        :param files: (str list) str list of all files in directory
+        :param state: (strucscan.core.statusmanager.JobDirState object) content of job directory
         :return: (bool)
         """
-        result_filename = self.resultfilename
-        for file in files:
-            if ("log" in file) and (".out" in file):
-                result_filename = file
-        cmd = subprocess.Popen("zgrep \"This is a dummy log file.\" %s" % result_filename, shell=True,
-                               stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output, err = cmd.communicate()
-        if str(err) != "":
-            if str(output)[2:-1] != "":
-                return True
-        return
+        logfiles = [file for file in state if self.is_resultfile(file)]
+        if logfiles == []:
+            return False
+        result_filename = max(logfiles, key=state.get_mtime)
+        return self.logfile_contains(state, result_filename, "This is a dummy log file.")
 
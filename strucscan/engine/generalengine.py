@@ -1,5 +1,9 @@
 from strucscan.utils import SEPERATOR
-from strucscan.scheduler import get_machine_configuration_dict
+from strucscan.core import ledger, submission
+from strucscan.scheduler import get_machine_configuration_dict, get_scheduler
+
+import gzip
+import threading
 
 class GeneralEngine:
     def __init__(self, input_dict):
@@ -19,8 +23,11 @@ class GeneralEngine:
         self.potential = self.input_dict["potential"]
         self.settings = self.input_dict["settings"]
         self.init_atvolume = self.input_dict["initial atvolume"]
+        self.split_images = self.input_dict.get("split images", False) == True
 
         self.resultfilename = ""
+        self.logfile_cache = {}     # {path: (size, modification time, {pattern: bool})}
+        self.logfile_lock = threading.Lock()
 
     def set_scheduler(self):
         """
@@ -28,19 +35,9 @@ class GeneralEngine:
 
         :return: 0
         """
-        try:
-            scheduler_name = self.machine_configuration_dict["scheduler"]
-            if (scheduler_name.lower() == "sge") or (scheduler_name.lower() == "sungridengine"):
-                from strucscan.scheduler import SunGridEngine
-                self.scheduler = SunGridEngine(self.machinename)
-            elif (scheduler_name.lower() == "slurm"):
-                from strucscan.scheduler import Slurm
-                self.scheduler = Slurm(self.machinename)
-            elif (scheduler_name.lower() == "noqueue"):
-                from strucscan.scheduler import NoQueue
-                self.scheduler = NoQueue(self.machinename)
-        except KeyError:
-            raise KeyError("Scheduler name not set in config.yaml.")
+        scheduler = get_scheduler(self.machinename)
+        if scheduler is not None:
+            self.scheduler = scheduler
 
     def get_scheduler(self):
         """
@@ -76,7 +73,7 @@ class GeneralEngine:
         """
         raise NotImplementedError
 
-    def make_machinefile(self, machineconfig, jobname, ntotalcores, property, nsteps):
+    def make_machinefile(self, machineconfig, jobname, ntotalcores, property, nsteps, image=None, restart_lines=None):
         """
         - abstract method to create / write machine script
 
@@ -85,10 +82,99 @@ class GeneralEngine:
         :param ntotalcores: (int) number of total cores, that is #cores per node * #of nodes
         :param property: (str) name of property
         :param nsteps: (int) number of single calculation of, e.g. E-V curves, transformation path, ...
+        :param image: (int) if given, machine script of a sub-job that calculates only this image
+        in its sub-directory, see strucscan.engine.generalengine.GeneralEngine.write_image_subjobs
+        :param restart_lines: (str list) lines that provide restart files of the prerequisite job before
+        the first calculation, e.g. wave functions
         :return: (str list, str) tuple of (list of lines in machine script, machine script file name)
         """
         raise NotImplementedError
 
+    def get_image_lines(self, call, index):
+        """
+        - abstract method that returns the lines of the machine script that calculate a single image of a job
+        with multiple structures and rename its result files by the index of the image
+
+        :param call: (str) binary call
+        :param index: (int) index of image
+        :return: (str list) lines of machine script
+        """
+        raise NotImplementedError
+
+    def get_image_files(self, index):
+        """
+        - abstract method that returns the names of the result files of a single image
+
+        :param index: (int) index of image
+        :return: (str list) names of result files, the first one is the final result file
+        """
+        raise NotImplementedError
+
+    def get_image_input_files(self, index):
+        """
+        - abstract method that returns the names of the input files required to calculate a single image
+
+        :param index: (int) index of image
+        :return: (str list) names of input files
+        """
+        raise NotImplementedError
+
+    def get_image_test(self, index, path=""):
+        """
+        - returns shell condition that is true if the image has been finished successfully
+
+        :param index: (int) index of image
+        :param path: (str) path to result files relative to working directory of machine script, e.g. '../'
+        :return: (str) shell condition
+        """
+        return "[ -e {}{} ]".format(path, self.get_image_files(index)[0])
+
+    def make_image_lines(self, call, index, subdir=False):
+        """
+        - lines of machine script that calculate a single image and mark it as finished in the image ledger,
+        see strucscan.core.ledger
+
+        :param call: (str) binary call
+        :param index: (int) index of image
+        :param subdir: (bool) image is calculated in its own sub-directory of the job directory.
+        The result files are moved to the job directory afterwards
+        :return: (str list) lines of machine script
+        """
+        lines = self.get_image_lines(call, index)
+        path = ""
+        if subdir:
+            lines.append("mv {} ..\n".format(" ".join(self.get_image_files(index))))
+            path = "../"
+        lines.append(ledger.get_ledger_line(index, test=self.get_image_test(index, path=path),
+                                            ledger=path + ledger.LEDGER_FNAME))
+        return lines
+
+    def write_image_subjobs(self, machine_info, jobpath, jobname, ntotalcores, property, nsteps, restart_lines=None):
+        """
+        - fans a job with multiple structures out into independent sub-jobs, one per image, in the sub-directories
+        'image-<index>' of the job directory. Every sub-job moves its result files back to the job directory,
+        and the sub-job that finishes the last image writes 'end.dat', see strucscan.core.ledger
+
+        :param machine_info: (dict) dictionary of form {"queuename": str, "ncores": int, "nnodes": int}
+        :param jobpath: (str) absolute path to job directory
+        :param jobname: (str) name of job
+        :param ntotalcores: (int) number of total cores, that is #cores per node * #of nodes
+        :param property: (str) name of property
+        :param nsteps: (int) number of images
+        :param restart_lines: (str list) see strucscan.engine.generalengine.GeneralEngine.make_machinefile
+        :return: (str list) absolute paths to sub-directories of images
+        """
+        image_paths = []
+        for index in range(nsteps):
+            image_path = ledger.make_image_dir(jobpath, index, self.get_image_input_files(index))
+            machinefile, machinefilename = self.make_machinefile(machine_info, jobname, ntotalcores, property,
+                                                                 nsteps, image=index, restart_lines=restart_lines)
+            with open(image_path + "/" + machinefilename, "w") as f:
+                for line in machinefile:
+                    f.write(line)
+            image_paths.append(image_path)
+        return image_paths
+
     @staticmethod
     def subjobname(species, property):
         """
@@ -122,31 +208,78 @@ class GeneralEngine:
         """
         raise NotImplementedError
 
+    def is_resultfile(self, filename):
+        """
+        - checks if file with filename is a (possibly compressed) result file of the engine
+
+        :param filename: (str) name of file
+        :return: (bool)
+        """
+        return self.resultfilename in filename
+
     def has_resultfile(self, files):
         """
         - VASP specific method to check if the final result file lies in job directory with files
 
-        :param files: (str list) str list of all files in directory
+        :param files: (str list or strucscan.core.statusmanager.JobDirState object) all files in directory
         :return: (bool)
         """
         try:
             for file in files:
-                if self.resultfilename in file:
+                if self.is_resultfile(file):
                     return True
             else:
                 return False
         except NotADirectoryError:
             raise
 
-    def check_if_finished(self, files):
+    def check_if_finished(self, state):
         """
         - abstract method to check if the calculation in job directory with files with files is finished
 
-        :param files: (str list) str list of all files in directory
+        :param state: (strucscan.core.statusmanager.JobDirState object) content of job directory
         :return: (bool)
         """
         raise NotImplementedError
 
+    def logfile_contains(self, state, filename, pattern):
+        """
+        - checks if (gzipped) file contains pattern without spawning a subprocess
+        - the result is cached per path for the latest size and modification time of the file,
+        so unchanged files are read only once and the cache holds one entry per file
+        - the cache is shared by the threads that probe job directories
+
+        :param state: (strucscan.core.statusmanager.JobDirState object) content of job directory
+        :param filename: (str) name of file in job directory
+        :param pattern: (str) pattern to search for
+        :return: (bool)
+        """
+        path = state.jobpath + "/" + filename
+        size, mtime = state.get_size(filename), state.get_mtime(filename)
+        with self.logfile_lock:
+            entry = self.logfile_cache.get(path)
+            if (entry is not None) and (entry[:2] == (size, mtime)) and (pattern in entry[2]):
+                return entry[2][pattern]
+        found = False
+        _open = gzip.open if filename.endswith(".gz") else open
+        try:
+            with _open(path, "rt", errors="replace") as f:
+                for line in f:
+                    if pattern in line:
+                        found = True
+                        break
+        except (OSError, EOFError):
+            # file vanished, is still being written or compressed
+            return False
+        with self.logfile_lock:
+            entry = self.logfile_cache.get(path)
+            if (entry is None) or (entry[:2] != (size, mtime)):
+                # results for earlier versions of the file are dropped
+                entry = (size, mtime, {})
+                self.logfile_cache[path] = entry
+            entry[2][pattern] = found
+        return found
+
     def get_result_filename(self):
         """
         - abstract method that returns name of final result file. For VASP, e.g. it is 'OUTCAR'
@@ -155,14 +288,37 @@ class GeneralEngine:
         """
         return self.resultfilename
 
-    def submit_job(self, machinefilename):
+    def get_cost_features(self, atoms):
+        """
+        - engine specific features of the computational cost of a job with structure atoms besides the number
+        of atoms, see strucscan.core.planner
+
+        :param atoms: (ASE atoms object)
+        :return: (dict) e.g. {'nkpoints': 1000, 'encut': 500}
+        """
+        return {}
+
+    def read_cost_features(self, jobpath):
+        """
+        - engine specific features of the computational cost of an existing job, see get_cost_features
+
+        :param jobpath: (str) absolute path to job directory
+        :return: (dict) e.g. {'nkpoints': 1000, 'encut': 500}
+        """
+        return {}
+
+    def submit_job(self, machinefilename, jobpath):
         """
         - calls strucscan.scheduler.GeneralScheduler.submit
+        - records the returned id in the job directory, see strucscan.core.submission
 
         :param machinefilename: (str) name of machine script file
+        :param jobpath: (str) absolute path to job directory
         :return: (str) id of job. On queuing systems, job_id equilas queue id,
         on systems without queue, job_id euqils process id
         """
-        job_id = self.scheduler.submit(machinefilename)
+        job_id = self.scheduler.submit(machinefilename, jobpath)
+        if job_id is not None:
+            submission.write_submission(jobpath, job_id, self.machinename)
         return job_id
 
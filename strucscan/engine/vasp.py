@@ -1,15 +1,18 @@
 from strucscan.engine.generalengine import GeneralEngine
-from strucscan.core import datatree
-from strucscan.utils import SEPERATOR, PROJECT_PATH, RESOURCE_PATH, get_nspecies
+from strucscan.core import datatree, archive, ledger
+from strucscan.utils import SEPERATOR, PROJECT_PATH, RESOURCE_PATH, KEEP_CHGCAR, KEEP_WAVECAR, ARCHIVE_JOBS, get_nspecies
+from strucscan import structio
 from strucscan.scheduler import get_machine_configuration_dict
 from strucscan.resources.properties import *
 
-from ase import io
-
 import numpy as np
+import shutil
 import os
 import subprocess
 
+# restart files handed from a prerequisite job to dependent jobs, in order of preference
+RESTART_FILES = ["WAVECAR", "CHGCAR"]
+
 
 class Vasp(GeneralEngine):
     def __init__(self, input_dict):
@@ -119,10 +122,14 @@ class Vasp(GeneralEngine):
             del incar_dict["kdens"]
         return incar_dict
 
-    def configure_incar(self, incar_dict, atoms, ntotalcores, magconfig, initial_magmoms, property):
+    def configure_incar(self, incar_dict, atoms, ntotalcores, magconfig, initial_magmoms, property,
+                        restart_files=(), nsteps=1):
         """
         - parses and configures incar
         - ensures that tags are set properly (e.g, ISPIN, ISIF, ...)
+        - jobs with a single structure write CHGCAR if KEEP_CHGCAR and WAVECAR if KEEP_WAVECAR is set
+        in ~/.strucscan, so dependent jobs can start from them
+        - if restart files of the prerequisite job are provided, ISTART / ICHARG are set to read them
 
         :param incar_dict: (dict) dictionary in form of {INCAR_TAG : VALUE}
         :param atoms: (ASE atoms object)
@@ -130,6 +137,8 @@ class Vasp(GeneralEngine):
         :param magconfig: (str) magnetic configuration: 'SP' or 'NM'
         :param initial_magmoms: (float list) list of initial magmom per element
         :param property: (str) name of property
+        :param restart_files: (str list) names of restart files provided by the prerequisite job, e.g. ['CHGCAR']
+        :param nsteps: (int) number of structures of job
         :return: (str list) list of lines that needs to be written to INCAR file
         """
         configuration_dict = {}
@@ -162,6 +171,21 @@ class Vasp(GeneralEngine):
         else:
             raise Exception("Could not distinguish property in static, atomic, total relaxation. Exiting.")
 
+        if nsteps == 1:
+            if KEEP_CHGCAR():
+                configuration_dict["LCHARG"] = ".TRUE."
+            if KEEP_WAVECAR():
+                configuration_dict["LWAVE"] = ".TRUE."
+        if property == "dos":
+            if "CHGCAR" not in restart_files:
+                # non-selfconsistent calculation is not possible without charge density
+                del configuration_dict["ICHARG"]
+                incar_dict.pop("ICHARG", None)
+        elif "WAVECAR" in restart_files:
+            configuration_dict["ISTART"] = 1
+        elif "CHGCAR" in restart_files:
+            configuration_dict["ICHARG"] = 1
+
         for key, value in configuration_dict.items():
             incar_dict[key] = str(value)
 
@@ -211,7 +235,7 @@ class Vasp(GeneralEngine):
                 break
 
         if not os.path.exists(jobpath):
-            os.makedirs(jobpath)
+            os.makedirs(jobpath, exist_ok=True)
 
         # machine file
         jobname = self.subjobname(self.species, property)
@@ -222,17 +246,22 @@ class Vasp(GeneralEngine):
         nsteps = 1
         if isinstance(atoms, list):
             nsteps = len(atoms)
-        machinefile, machinefilename = self.make_machinefile(machine_info, jobname, ntotalcores, property, nsteps)
+        restart_files, restart_lines = self.get_restart_files(jobobject.conditional_files, jobpath)
+        machinefile, machinefilename = self.make_machinefile(machine_info, jobname, ntotalcores, property, nsteps,
+                                                             restart_lines=restart_lines)
         with open(jobpath + "/" + machinefilename, "w") as f:
             for line in machinefile:
                 f.write(line)
+        if self.split_images and (nsteps > 1):
+            self.write_image_subjobs(machine_info, jobpath, jobname, ntotalcores, property, nsteps,
+                                     restart_lines=restart_lines)
 
         # write POSCAR
         if isinstance(atoms, list):
             # this is in the case of any task that requires multiple structures for calculation,
             # e.g. E-V curves, murnaghan calculation, transformation paths, ... .
-            for i, atom in enumerate(atoms):
-                self.write_structure(atom, jobpath, structfilename="POSCAR-%i" % i)
+            structio.write_structures(atoms, [jobpath + "/POSCAR-%i" % i for i in range(len(atoms))], "vasp")
+            ledger.write_ledger(jobpath, len(atoms))
             atoms = atoms[0]
         else:
             self.write_structure(atoms, jobpath)
@@ -246,7 +275,8 @@ class Vasp(GeneralEngine):
                 key = line.split("=")[0].strip().upper()
                 value = line.split("=")[-1].strip("\n").strip().upper()
                 incar_dict[key] = value
-        incar_lines = self.configure_incar(incar_dict, atoms, ntotalcores, magconfig, initial_magmoms, property)
+        incar_lines = self.configure_incar(incar_dict, atoms, ntotalcores, magconfig, initial_magmoms, property,
+                                           restart_files=restart_files, nsteps=nsteps)
 
         # generate KPOINTS
         kpoints = self.kpoints(atoms, property)
@@ -264,6 +294,43 @@ class Vasp(GeneralEngine):
         os.system("cat {} > {}/POTCAR".format(cat_command, jobpath))
         return machinefilename
 
+    @staticmethod
+    def get_restart_files(conditional_jobpath, jobpath):
+        """
+        - looks up restart files (WAVECAR, CHGCAR, possibly gzipped) of the prerequisite job
+        - files of job directories are unpacked by the machine script on the compute node.
+        Files of archived job directories, or of job directories that may be archived before the job runs
+        (ARCHIVE_JOBS in ~/.strucscan), are extracted into the job directory right away
+
+        :param conditional_jobpath: (str) absolute path to job directory of prerequisite job. Empty if there is none
+        :param jobpath: (str) absolute path to job directory
+        :return: (str list, str list) tuple of names of available restart files and lines of machine script
+        that copy them into the working directory
+        """
+        restart_files = []
+        restart_lines = []
+        if (conditional_jobpath == "") or (conditional_jobpath is None):
+            return restart_files, restart_lines
+        try:
+            files = archive.listdir(conditional_jobpath)
+        except FileNotFoundError:
+            return restart_files, restart_lines
+        extract = archive.is_archived(conditional_jobpath) or ARCHIVE_JOBS()
+        for name in RESTART_FILES:
+            for fname in [name + ".gz", name]:
+                if fname in files:
+                    source = conditional_jobpath + "/" + fname
+                    if extract:
+                        with archive.open_file(source, binary=True) as src, open(jobpath + "/" + name, "wb") as dst:
+                            shutil.copyfileobj(src, dst)
+                    elif fname.endswith(".gz"):
+                        restart_lines.append("zcat {} > {}\n".format(source, name))
+                    else:
+                        restart_lines.append("cp {} {}\n".format(source, name))
+                    restart_files.append(name)
+                    break
+        return restart_files, restart_lines
+
     def get_absolute_jobpath(self, property, jobobject, structpath=None):
         """
         - VASP specific method to return absolute path to job directory
@@ -305,7 +372,7 @@ class Vasp(GeneralEngine):
 
         return absolute_jobpath
 
-    def make_machinefile(self, machine_info, jobname, ntotalcores, property, nsteps):
+    def make_machinefile(self, machine_info, jobname, ntotalcores, property, nsteps, image=None, restart_lines=None):
         """
         - VASP specific method to create and write machine script
 
@@ -314,6 +381,9 @@ class Vasp(GeneralEngine):
         :param ntotalcores: (int) number of total cores, that is #cores per node * #of nodes
         :param property: (str) name of property
         :param nsteps: (int) number of single calculation of, e.g. E-V curves, transformation path, ...
+        :param image: (int) if given, machine script of a sub-job that calculates only this image in its sub-directory
+        :param restart_lines: (str list) lines that copy WAVECAR / CHGCAR of the prerequisite job,
+        see strucscan.engine.vasp.Vasp.get_restart_files
         :return: (str list, str) tuple of (list of lines in machine script, machine script file name)
         """
         machine_script, machine_script_fname = self.scheduler.configure_machine_script(machine_info, jobname=jobname)
@@ -326,23 +396,23 @@ class Vasp(GeneralEngine):
         call = call.replace("$NTOTALCORES", str(ntotalcores))
         call = call.split(">")[0] + " >& vasp.out"
 
-        machine_script.append("echo \"property: %s\" >> start.dat\n" % property)
+        startfile = "start.dat" if image is None else "../start.dat"
+        machine_script.append("echo \"property: %s\" >> %s\n" % (property, startfile))
         machine_script.append("\n")
 
         for prerequisite in prerequisites:
             machine_script.append(prerequisite)
         machine_script.append("\n")
 
-        if nsteps > 1:
+        if restart_lines:
+            machine_script += restart_lines
+            machine_script.append("\n")
+
+        if image is not None:
+            machine_script += self.make_image_lines(call, image, subdir=True)
+        elif nsteps > 1:
             for i in range(nsteps):
-                machine_script.append("cp POSCAR-%i POSCAR\n" % i)
-                machine_script.append(call + "\n")
-                machine_script.append("mv CONTCAR CONTCAR-%i\n" % i)
-                machine_script.append("mv OUTCAR OUTCAR-%i\n" % i)
-                machine_script.append("gzip OUTCAR-%i\n" % i)
-                machine_script.append("mv OSZICAR OSZICAR-%i\n" % i)
-                machine_script.append("mv vasprun.xml vasprun-%i.xml\n" % i)
-                machine_script.append("gzip vasprun-%i.xml\n" %i)
+                machine_script += self.make_image_lines(call, i)
                 machine_script.append("\n")
             machine_script.append("rm POSCAR\n")
         else:
@@ -350,17 +420,113 @@ class Vasp(GeneralEngine):
             machine_script.append("gzip OUTCAR\n")
             machine_script.append("gzip OSZICAR\n")
             machine_script.append("gzip vasprun.xml\n")
+            # keep restart files for dependent jobs, see strucscan.engine.vasp.Vasp.get_restart_files
+            if KEEP_CHGCAR():
+                machine_script.append("gzip -f CHGCAR\n")
+            if KEEP_WAVECAR():
+                machine_script.append("gzip -f WAVECAR\n")
 
         machine_script.append("rm WAVECAR EIGENVAL CHG DOSCAR IBZKPT REPORT XDATCAR PROCAR PCDAT\n")
         machine_script.append("\n")
-        machine_script.append("STOP=`date`\n")
-        machine_script.append("echo \"stop: $STOP  $HOSTNAME\" >> end.dat ")
+        footer = ["STOP=`date`\n",
+                  "echo \"stop: $STOP  $HOSTNAME\" >> end.dat "]
+        if image is not None:
+            footer = ledger.get_completion_lines(nsteps, footer)
+        machine_script += footer
         return machine_script, machine_script_fname
 
+    def get_image_lines(self, call, index):
+        """
+        - VASP specific lines of machine script that calculate image with index
+
+        :param call: (str) binary call
+        :param index: (int) index of image
+        :return: (str list) lines of machine script
+        """
+        return ["cp POSCAR-%i POSCAR\n" % index,
+                call + "\n",
+                "mv CONTCAR CONTCAR-%i\n" % index,
+                "mv OUTCAR OUTCAR-%i\n" % index,
+                "gzip OUTCAR-%i\n" % index,
+                "mv OSZICAR OSZICAR-%i\n" % index,
+                "mv vasprun.xml vasprun-%i.xml\n" % index,
+                "gzip vasprun-%i.xml\n" % index]
+
+    def get_image_files(self, index):
+        """
+        :param index: (int) index of image
+        :return: (str list) names of VASP result files of image
+        """
+        return ["OUTCAR-%i.gz" % index, "CONTCAR-%i" % index, "OSZICAR-%i" % index, "vasprun-%i.xml.gz" % index]
+
+    def get_image_input_files(self, index):
+        """
+        :param index: (int) index of image
+        :return: (str list) names of VASP input files of image
+        """
+        return ["INCAR", "KPOINTS", "POTCAR", "POSCAR-%i" % index]
+
+    def get_image_test(self, index, path=""):
+        """
+        :param index: (int) index of image
+        :param path: (str) path to result files relative to working directory of machine script
+        :return: (str) shell condition that is true if OUTCAR of image is complete
+        """
+        return "zgrep -q \"Total CPU time used (sec):\" {}OUTCAR-{:d}.gz".format(path, index)
+
+    @staticmethod
+    def get_cost_features_from_lines(kpoints, incar):
+        """
+        :param kpoints: (str list) lines of KPOINTS file
+        :param incar: (str) INCAR lines
+        :return: (dict) number of k-points of explicit list or automatic mesh and ENCUT, e.g. {'nkpoints': 1000, 'encut': 500.0}.
+        Features that cannot be read are omitted
+        """
+        features = {}
+        try:
+            nkpoints = int(kpoints[1].split()[0])
+            if nkpoints == 0:
+                # automatic mesh
+                nkpoints = int(np.prod([int(n) for n in kpoints[3].split()[:3]]))
+            features["nkpoints"] = nkpoints
+        except (IndexError, ValueError):
+            pass
+        try:
+            features["encut"] = float(Vasp.parse_incar(incar)["ENCUT"])
+        except (KeyError, ValueError):
+            pass
+        return features
+
+    def get_cost_features(self, atoms):
+        """
+        :param atoms: (ASE atoms object)
+        :return: (dict) number of k-points and ENCUT of new job, see get_cost_features_from_lines
+        """
+        try:
+            with open("{}/{}".format(self.SETTINGS_PATH, self.settings), "r") as f:
+                incar = f.read()
+        except OSError:
+            incar = ""
+        return self.get_cost_features_from_lines(self.kpoints(atoms), incar)
+
+    def read_cost_features(self, jobpath):
+        """
+        :param jobpath: (str) absolute path to job directory
+        :return: (dict) number of k-points and ENCUT of existing job, see get_cost_features_from_lines
+        """
+        try:
+            with open(jobpath + "/KPOINTS", "r") as f:
+                kpoints = f.readlines()
+            with open(jobpath + "/INCAR", "r") as f:
+                incar = f.read()
+        except OSError:
+            return {}
+        return self.get_cost_features_from_lines(kpoints, incar)
+
     @staticmethod
     def write_structure(atoms, jobpath, structfilename="POSCAR"):
         """
-        - VASP specific method to write engine specific structure file
+        - VASP specific method to write engine specific structure file, see strucscan.structio.write_structure
 
         :param atoms: (ASE atoms object) atoms object with assigned chemical symbols, magnetic moments
         and scaled positions
@@ -368,7 +534,7 @@ class Vasp(GeneralEngine):
         :param structfilename: (str) name of structure file that is written to disk. for VASP, structfilename is 'POSCAR'
         :return: 0
         """
-        io.write(jobpath + "/" + structfilename, atoms, format="vasp")
+        structio.write_structure(atoms, jobpath + "/" + structfilename, "vasp")
         return
 
     @staticmethod
@@ -384,26 +550,23 @@ class Vasp(GeneralEngine):
         if resultfilename not in fname:
             fname += "/" + resultfilename
         try:
-            final_struct = io.read(fname, format="vasp-out")
+            final_struct = archive.read_structure(fname, format="vasp-out")
             return final_struct
         except Exception:
             raise FileNotFoundError("{} not found.".format(fname))
 
-    def check_if_finished(self, files):
+    def check_if_finished(self, state):
         """
         - VASP specific method to check if the calculation in job directory with files with files is finished
+        - for jobs with multiple structures, the most recently written OUTCAR-*.gz is checked
 
-        :param files: (str list) str list of all files in directory
+        :param state: (strucscan.core.statusmanager.JobDirState object) content of job directory
         :return: (bool)
         """
         result_filename = self.resultfilename
-        for file in files:
-            if ("OUTCAR" in file) and (".gz" in file):
-                result_filename = file
-        cmd = subprocess.Popen("zgrep \"Total CPU time used (sec):\" %s" % result_filename, shell=True,
-                               stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output, err = cmd.communicate()
-        if str(err) != "":
-            if str(output)[2:-1] != "":
-                return True
-        return
+        gzipped = [file for file in state if ("OUTCAR" in file) and (".gz" in file)]
+        if gzipped != []:
+            result_filename = max(gzipped, key=state.get_mtime)
+        elif result_filename not in state:
+            return False
+        return self.logfile_contains(state, result_filename, "Total CPU time used (sec):")
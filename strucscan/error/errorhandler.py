@@ -1,9 +1,11 @@
 from shutil import copyfile
+import re
 
 from ase import io
 
-from strucscan.core import datatree
+from strucscan.core import datatree, ledger
 from strucscan.scheduler import *
+from strucscan.utils import PARALLEL_RESTARTS
 
 
 class GeneralErrorManager:
@@ -37,7 +39,14 @@ class GeneralErrorManager:
 
 
 class VaspErrorManager(GeneralErrorManager):
-    def __init__(self, calc, jobpath, job_id):
+    def __init__(self, calc, jobpath, job_id, state=None):
+        """
+        :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object
+        :param jobpath: (str) absolute path to job directory
+        :param job_id: (str) id of job in scheduler
+        :param state: (strucscan.core.statusmanager.JobDirState object) content of job directory.
+        If None, the job directory is listed
+        """
         GeneralErrorManager.__init__(self, calc, jobpath, job_id)
 
         calculator, composition, property, prototype, stochio = datatree.parse_absolute_path(jobpath)
@@ -45,58 +54,97 @@ class VaspErrorManager(GeneralErrorManager):
         suffix = get_machinefile_suffix(calc)
         self.machinefilename = jobname + "." + suffix
 
-        if not os.path.exists(jobpath):
+        if (state is not None) and (not state.exists):
+            raise NotADirectoryError("Job directory has not been created.")
+        elif (state is None) and (not os.path.exists(jobpath)):
             raise NotADirectoryError("Job directory has not been created.")
         else:
-            files = os.listdir(jobpath)
-            if "vasp.out" not in files:
+            files = state if state is not None else os.listdir(jobpath)
+            nimages, missing = determine_missing_images(jobpath, files,
+                                                        resultpattern=r"OUTCAR-(\d+)\.gz",
+                                                        strucpattern=r"POSCAR-(\d+)")
+            vasp_out = "vasp.out" in files
+            if (not vasp_out) and (nimages > 0):
+                # image sub-jobs write vasp.out to the sub-directories of their images, see strucscan.core.ledger
+                finished = set(range(nimages)) - set(missing)
+                vasp_out = any(os.path.exists(image_path + "/vasp.out")
+                               for image_path in ledger.get_image_paths(jobpath, files, nimages, finished))
+            if not vasp_out:
                 # error in submission script
                 self.status__job_id = (1, "error", self.job_id)
+            elif nimages > 0:
+                # job with multiple structures, e.g. E-V curve: only images missing in the ledger are restarted
+                job_id = self.restart_images(nimages, missing)
+                self.status_index, self.status, self.job_id = (0, "queued", job_id)
             elif ("vasp.out" in files) and ("OUTCAR" not in files):
                 # vasp_std started but canceled immediately
                 self.status__job_id = (1, "error", self.job_id)
             elif ("vasp.out" in files) and ("OUTCAR" and files):
                 # vasp_std started, scheduler had no time to gzip OUTCAR, job timed out
-                os.chdir(jobpath)
                 try:
-                    io.read("CONTCAR", format="vasp")
+                    io.read(jobpath + "/CONTCAR", format="vasp")
                 except IndexError:
                     # no lines written to CONTCAR, too less memory, ...
                     self.status_index, self.status, self.job_id = (1, "error", self.job_id)
                 else:
-                    copyfile("CONTCAR", "POSCAR")
-
-                    n_structures, n_finished = determine_left_over_structures(jobpath,
-                                                                              resultfilename="OUTCAR",
-                                                                              strucfilename="POSCAR")
-                    if n_structures > 0:
-                        self.machinefile = self.adapt_machinfile()
-                        with open(self.jobpath + "/" + self.machinefilename, "w") as f:
-                            for line in self.machinefile:
-                                f.write(line)
-
-                    job_id = calc.submit_job(self.machinefilename)
+                    copyfile(jobpath + "/CONTCAR", jobpath + "/POSCAR")
+                    remove_end_file(jobpath)
+                    job_id = calc.submit_job(self.machinefilename, jobpath)
                     self.status_index, self.status, self.job_id = (0, "queued", job_id)
             elif "OUTCAR.gz" in files:
                 # vasp_std started and finished, error in subroutines, memory error, ...
                 self.status_index, self.status, self.job_id = (1, "error", self.job_id)
 
-    def adapt_machinfile(self):
+    def restart_images(self, nimages, missing):
+        """
+        - restarts the images of a job with multiple structures that have not been finished
+        - if PARALLEL_RESTARTS is set in ~/.strucscan, every missing image is submitted as an independent sub-job
+        in its own sub-directory, see strucscan.core.ledger. Otherwise, the missing images are calculated
+        one after another in the job directory
+
+        :param nimages: (int) number of images of job
+        :param missing: (int list) indices of images that have not been finished
+        :return: (str) id of (first) restarted job
+        """
+        remove_end_file(self.jobpath)
+        if PARALLEL_RESTARTS() and (len(missing) > 1):
+            job_ids = []
+            for index in missing:
+                image_path = ledger.make_image_dir(self.jobpath, index, self.calc.get_image_input_files(index))
+                machinefile = self.adapt_machinfile(missing=[index], nimages=nimages)
+                with open(image_path + "/" + self.machinefilename, "w") as f:
+                    for line in machinefile:
+                        f.write(line)
+                job_ids.append(self.calc.submit_job(self.machinefilename, image_path))
+            return job_ids[0]
+        self.machinefile = self.adapt_machinfile(missing=missing)
+        with open(self.jobpath + "/" + self.machinefilename, "w") as f:
+            for line in self.machinefile:
+                f.write(line)
+        return self.calc.submit_job(self.machinefilename, self.jobpath)
+
+    def adapt_machinfile(self, missing=None, nimages=None):
         """
         - adapts machine file of failed job for restart
 
+        :param missing: (int list) indices of images to calculate. If None, all images missing in the ledger
+        :param nimages: (int) number of images of job. If given, the machine file is written for a sub-job that
+        runs in the sub-directory of its image and writes 'end.dat' only if all images of the job have been finished
         :return: (str list) adapted machine file
         """
         machinefile = []
         try:
-            with open(self.machinefilename, "r") as f:
+            with open(self.jobpath + "/" + self.machinefilename, "r") as f:
                 machinefile = f.readlines()
         except FileNotFoundError:
             raise
 
         if machinefile != []:
             header, footer, binary_call = split_machinefile_into_header_footer_binary_call(machinefile)
-            n_structures, n_finished = determine_left_over_structures(self.jobpath, resultfilename="OUTCAR", strucfilename="POSCAR")
+            if missing is None:
+                _, missing = determine_missing_images(self.jobpath, os.listdir(self.jobpath),
+                                                      resultpattern=r"OUTCAR-(\d+)\.gz",
+                                                      strucpattern=r"POSCAR-(\d+)")
             header.append("\n")
 
             ntotalcores = self.calc.get_scheduler().get_total_number_of_cores(machinefile)
@@ -109,15 +157,13 @@ class VaspErrorManager(GeneralErrorManager):
                 header.append(prerequisite)
             header.append("\n")
 
-            for ind in range(n_finished, n_structures-n_finished):
-                header.append("cp POSCAR-%i POSCAR\n" % ind)
-                header.append("%s\n" % binary_call)
-                header.append("gzip OUTCAR\n")
-                header.append("gzip OUTCAR.gz OUTCAR-%i.gz\n" % ind)
-                header.append("gzip vasprun.xml.gz\n")
-                header.append("mv vasprun.xml.gz vasprun.xml-%i.gz\n" % ind)
-                header.append("")
-            header.append("rm WAVECAR EIGENVAL CHG DOSCAR IBZKPT REPORT XDATCAR PROCAR PCDAT vasp.out")
+            subdir = nimages is not None
+            for ind in missing:
+                header += self.calc.make_image_lines(binary_call, ind, subdir=subdir)
+                header.append("\n")
+            header.append("rm WAVECAR EIGENVAL CHG DOSCAR IBZKPT REPORT XDATCAR PROCAR PCDAT\n")
+            if subdir:
+                footer = ledger.get_completion_lines(nimages, footer)
             for line in footer:
                 header.append(line)
             return header
@@ -159,6 +205,28 @@ def split_machinefile_into_header_footer_binary_call(machinefile):
     return header, footer, call
 
 
+def determine_missing_images(jobpath, files, resultpattern, strucpattern):
+    """
+    - if job requires to calculate multiple structures, e.g. E-V curves, ..., this method determines
+    the number of images and the images that have not been finished yet from the image ledger of the job,
+    see strucscan.core.ledger
+    - for job directories without ledger, images are determined from the names of result and structure files
+
+    :param jobpath: (str) path to working directory
+    :param files: (str list or strucscan.core.statusmanager.JobDirState object) all files in job directory
+    :param resultpattern: (str) regular expression of final result file of image, e.g. r'OUTCAR-(\\d+)\\.gz'
+    :param strucpattern: (str) regular expression of structure file of image, e.g. r'POSCAR-(\\d+)'
+    :return: (int, int list) number of images (0 for jobs with a single structure), sorted indices of images
+    that have not been finished
+    """
+    nimages, finished = ledger.read_ledger(jobpath)
+    if nimages is None:
+        finished = ledger.get_image_indices(files, resultpattern)
+        indices = finished | ledger.get_image_indices(files, strucpattern)
+        nimages = max(indices) + 1 if indices else 0
+    return nimages, ledger.get_missing_images(nimages, finished)
+
+
 def determine_left_over_structures(jobpath, resultfilename="", strucfilename=""):
     """
     - if job requires to calculate multiple structures, e.g. E-V curves, ..., this method determines
@@ -169,13 +237,22 @@ def determine_left_over_structures(jobpath, resultfilename="", strucfilename="")
     :param strucfilename: (str) structure file name. For VASP, e.g. it is "POSCAR"
     :return: (int, int) number of total struture files in jobpath, number of finished structures in jobpath
     """
-    files = os.listdir(jobpath)
-    n_todo = 0
-    n_finished = 0
-    for file in files:
-        if (resultfilename + "-" in file) and (".gz" in file):
-            n_finished += 1
-        if strucfilename + "-" in file:
-            n_todo += 1
-    n_structures = n_todo + n_finished
-    return n_structures, n_finished
+    n_structures, missing = determine_missing_images(jobpath, os.listdir(jobpath),
+                                                     resultpattern=re.escape(resultfilename) + r"-(\d+)\.gz",
+                                                     strucpattern=re.escape(strucfilename) + r"-(\d+)")
+    return n_structures, n_structures - len(missing)
+
+
+def remove_end_file(jobpath):
+    """
+    - removes 'end.dat' of a job before it is restarted, so the job is not taken as finished or failed again
+    before the restarted job has run
+
+    :param jobpath: (str) absolute path to job directory
+    :return: 0
+    """
+    try:
+        os.remove(jobpath + "/end.dat")
+    except FileNotFoundError:
+        pass
+    return
@@ -2,7 +2,7 @@ from strucscan.engine.vasp import Vasp
 from strucscan.error.errorhandler import *
 
 
-def determine_status__job_id(calc, jobpath, job_list):
+def determine_status__job_id(calc, jobpath, job_list, state=None):
     """
     - checks job ib jobpath on any errors
     - if the job has been restarted more than 3 times, the job status is set to (1, 'error') which leads the JobManager to count the job as finished, i.e. to stop monitoring it
@@ -18,6 +18,8 @@ def determine_status__job_id(calc, jobpath, job_list):
     :param calc: (strucscan.engine.generalengine.GeneralEngine object) calculator object
     :param jobpath: (str) absolute path to job directory
     :param job_list: (list) list of all JobObjects
+    :param state: (strucscan.core.statusmanager.JobDirState object) content of job directory as probed by
+    the statusmanager. If None, the job directory is read again
     :return: (int, str, str) tuple of job status index (int), status (str) and job id (str).
     On queuing systems, job_id equals queue id, on systems without queue, job_id equals process id
     """
@@ -47,6 +49,6 @@ def determine_status__job_id(calc, jobpath, job_list):
             jobobject.set_nrestarts(nrestarts)
             job_list[index] = jobobject
             if isinstance(calc, Vasp):
-                status_index, status, job_id = VaspErrorManager(calc, jobpath, job_id).return_status__job_id()
+                status_index, status, job_id = VaspErrorManager(calc, jobpath, job_id, state=state).return_status__job_id()
             # here you can add ErrorManagers for further engines
     return status_index, status, job_id, nrestarts
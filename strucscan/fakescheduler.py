@@ -0,0 +1,503 @@
+from datetime import datetime
+import getpass
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from strucscan.core.resultstore import locked, write_atomic
+
+COMMANDS = ["sbatch", "squeue", "sacct", "scontrol", "scancel", "qsub", "qstat", "qdel"]
+
+DEFAULT_SETTINGS = {"queue latency": 0.,
+                    "run time": 1.,
+                    "failure rate": 0.,
+                    "run scripts": True,
+                    "command latency": 0.,
+                    "seed": 0}
+
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+ACTIVE_STATES = [PENDING, RUNNING]
+
+SLURM_SHORT_STATES = {PENDING: "PD", RUNNING: "R", COMPLETED: "CD", FAILED: "F", CANCELLED: "CA"}
+SGE_STATES = {PENDING: "qw", RUNNING: "r"}
+
+STATE_DIR_VARIABLE = "STRUCSCAN_FAKE_SCHEDULER_DIR"
+
+
+def get_default_state_dir():
+    """
+    :return: (str) state directory used if no 'state dir' is given in the config.yaml of the machine
+    """
+    return os.path.join(tempfile.gettempdir(), "strucscan-fakescheduler-" + getpass.getuser())
+
+
+class FakeScheduler:
+    def __init__(self, state_dir, settings=None):
+        """
+        - stand-in for the commands of Slurm (sbatch, squeue, sacct, scontrol, scancel) and SunGridEngine
+        (qsub, qstat, qdel), so strucscan.scheduler.Slurm and strucscan.scheduler.SunGridEngine can be tested
+        and benchmarked without a cluster
+        - the state of all jobs is kept in a JSON file in the state directory under a file lock, so the commands
+        can be called from several processes. Jobs move from pending to running to completed or failed
+        whenever a command is called, based on their submission time, so no daemon has to run
+        - activated by a 'fake scheduler' entry in the config.yaml of a machine, see
+        strucscan.scheduler.get_machine_configuration_dict, e.g.
+
+            scheduler: slurm
+            fake scheduler:
+              queue latency: 2      # seconds a job is pending
+              run time: 5           # seconds a job is running if machine scripts are not executed
+              failure rate: 0.1     # fraction of jobs that fail without running their machine script
+              run scripts: True     # execute machine scripts when jobs start
+              command latency: 0.   # seconds every command takes
+              seed: 0               # seed of failures
+
+        :param state_dir: (str) absolute path to directory of the job state file
+        :param settings: (dict) settings of the fake scheduler, see DEFAULT_SETTINGS. If None, the settings written by
+        strucscan.fakescheduler.install are used
+        """
+        self.state_dir = state_dir
+        self.state_fname = os.path.join(state_dir, "jobs.json")
+        self.settings = dict(DEFAULT_SETTINGS)
+        if settings is None:
+            try:
+                with open(os.path.join(state_dir, "settings.json"), "r") as f:
+                    settings = json.load(f)
+            except FileNotFoundError:
+                settings = {}
+        self.settings.update(settings)
+        os.makedirs(state_dir, exist_ok=True)
+
+    def load(self):
+        """
+        :return: (dict) state in form of {"counter": int, "jobs": {job_id: job dict}}
+        """
+        try:
+            with open(self.state_fname, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"counter": 1000, "jobs": {}}
+
+    def save(self, state):
+        """
+        :param state: (dict) state as returned by FakeScheduler.load
+        :return: 0
+        """
+        write_atomic(self.state_fname, json.dumps(state))
+        return
+
+    def is_failing(self, job_id):
+        """
+        :param job_id: (str) id of job
+        :return: (bool) True if job is chosen to fail. The choice depends only on job id and seed
+        """
+        digest = hashlib.md5("{}:{}".format(self.settings["seed"], job_id).encode()).hexdigest()
+        return int(digest[:8], 16) / float(0xffffffff) < float(self.settings["failure rate"])
+
+    def start(self, job):
+        """
+        - executes machine script of job in a detached process, the exit code is written to the state directory
+
+        :param job: (dict) job dict
+        :return: 0
+        """
+        exit_fname = os.path.join(self.state_dir, job["id"] + ".exit")
+        env = dict(os.environ)
+        env.update({"SLURM_JOB_ID": job["id"], "JOB_ID": job["id"]})
+        subprocess.Popen(["bash", "-c", 'bash "$0"; echo $? > "$1"', job["script"], exit_fname],
+                         cwd=job["workdir"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        return
+
+    def advance(self, state, now=None):
+        """
+        - moves jobs from pending to running after 'queue latency' and from running to completed or failed
+        after 'run time' or, if machine scripts are executed, after the machine script has exited
+
+        :param state: (dict) state as returned by FakeScheduler.load
+        :param now: (float) current time. If None, time.time() is used
+        :return: (bool) True if any job changed its state
+        """
+        if now is None:
+            now = time.time()
+        changed = False
+        for job_id, job in state["jobs"].items():
+            if (job["state"] == PENDING) and (now - job["submit"] >= float(self.settings["queue latency"])):
+                job["state"] = RUNNING
+                job["start"] = now
+                if self.settings["run scripts"] and not job["failing"]:
+                    self.start(job)
+                changed = True
+            if job["state"] == RUNNING:
+                if self.settings["run scripts"] and not job["failing"]:
+                    exit_fname = os.path.join(self.state_dir, job_id + ".exit")
+                    if not os.path.exists(exit_fname):
+                        continue
+                    try:
+                        with open(exit_fname, "r") as f:
+                            job["exit code"] = int(f.read().strip())
+                    except ValueError:
+                        # exit code is being written
+                        continue
+                    os.remove(exit_fname)
+                elif now - job["start"] >= float(self.settings["run time"]):
+                    job["exit code"] = 1 if job["failing"] else 0
+                else:
+                    continue
+                job["state"] = COMPLETED if job["exit code"] == 0 else FAILED
+                job["end"] = now
+                changed = True
+        return changed
+
+    def submit(self, script, workdir, name=None, partition="", ncores=1):
+        """
+        :param script: (str) name of machine script in workdir
+        :param workdir: (str) absolute path to working directory of job
+        :param name: (str) name of job. If None, the name of the machine script is used
+        :param partition: (str) name of queue
+        :param ncores: (int) number of cores
+        :return: (str) id of job
+        """
+        with locked(self.state_fname):
+            state = self.load()
+            state["counter"] += 1
+            job_id = str(state["counter"])
+            state["jobs"][job_id] = {"id": job_id,
+                                     "name": name if name else script,
+                                     "script": script,
+                                     "workdir": workdir,
+                                     "partition": partition,
+                                     "ncores": ncores,
+                                     "state": PENDING,
+                                     "submit": time.time(),
+                                     "start": None,
+                                     "end": None,
+                                     "exit code": None,
+                                     "failing": self.is_failing(job_id)}
+            self.advance(state)
+            self.save(state)
+        return job_id
+
+    def get_jobs(self):
+        """
+        :return: (dict list) all job dicts in order of submission, after advancing the state
+        """
+        with locked(self.state_fname):
+            state = self.load()
+            if self.advance(state):
+                self.save(state)
+        return sorted(state["jobs"].values(), key=lambda job: int(job["id"]))
+
+    def cancel(self, job_ids):
+        """
+        :param job_ids: (str list) ids of jobs
+        :return: (str list) ids of jobs that were pending or running
+        """
+        cancelled = []
+        with locked(self.state_fname):
+            state = self.load()
+            self.advance(state)
+            for job_id in job_ids:
+                job = state["jobs"].get(job_id)
+                if (job is not None) and (job["state"] in ACTIVE_STATES):
+                    job["state"] = CANCELLED
+                    job["end"] = time.time()
+                    cancelled.append(job_id)
+            self.save(state)
+        return cancelled
+
+    # Slurm
+
+    def sbatch(self, args, cwd):
+        script = args[-1]
+        directives = read_directives(os.path.join(cwd, script), "#SBATCH")
+        job_id = self.submit(script, cwd, name=directives.get("-J", directives.get("--job-name")),
+                             partition=directives.get("-p", directives.get("--partition", "")),
+                             ncores=int(directives.get("-n", directives.get("--ntasks", 1))))
+        return "Submitted batch job {}\n".format(job_id), 0
+
+    def squeue(self, args, cwd):
+        options = parse_options(args, flags=["-h", "--noheader"])
+        fmt = options.get("-o", options.get("--format", "%.18i %.9P %.8j %.8u %.2t %.10M %.6D %R"))
+        jobs = [job for job in self.get_jobs() if job["state"] in ACTIVE_STATES]
+        if "-j" in options:
+            job_ids = options["-j"].split(",")
+            jobs = [job for job in jobs if job["id"] in job_ids]
+        lines = []
+        if ("-h" not in options) and ("--noheader" not in options):
+            lines.append(format_squeue(fmt, None))
+        lines += [format_squeue(fmt, job) for job in jobs]
+        return "".join(line + "\n" for line in lines), 0
+
+    def sacct(self, args, cwd):
+        options = parse_options(args, flags=["-P", "--parsable2", "-n", "--noheader", "-X", "--allocations"])
+        fields = options.get("--format", options.get("-o", "JobID,JobName,Partition,AllocCPUS,State,ExitCode"))
+        fields = fields.split(",")
+        jobs = self.get_jobs()
+        if "-j" in options:
+            job_ids = options["-j"].split(",")
+            jobs = [job for job in jobs if job["id"] in job_ids]
+        rows = [[get_sacct_field(job, field) for field in fields] for job in jobs]
+        header = ("-n" not in options) and ("--noheader" not in options)
+        if ("-P" in options) or ("--parsable2" in options):
+            lines = (["|".join(fields)] if header else []) + ["|".join(row) for row in rows]
+        else:
+            lines = []
+            if header:
+                lines.append(" ".join("{:>12}".format(field[:12]) for field in fields))
+                lines.append(" ".join(12 * "-" for field in fields))
+            lines += [" ".join("{:>12}".format(value[:12]) for value in row) for row in rows]
+        return "".join(line + "\n" for line in lines), 0
+
+    def scontrol(self, args, cwd):
+        if (len(args) < 3) or (args[0] != "show") or (args[1] != "job"):
+            return "scontrol: only 'scontrol show job <id>' is supported\n", 1
+        jobs = {job["id"]: job for job in self.get_jobs()}
+        job = jobs.get(args[2])
+        if job is None:
+            return "slurm_load_jobs error: Invalid job id specified\n", 1
+        lines = ["JobId={} JobName={}".format(job["id"], job["name"]),
+                 "   JobState={} Reason=None ExitCode={}:0".format(job["state"], job["exit code"] or 0),
+                 "   Partition={} NumCPUs={}".format(job["partition"], job["ncores"]),
+                 "   Command={}".format(os.path.join(job["workdir"], job["script"])),
+                 "   WorkDir={}".format(job["workdir"])]
+        return "".join(line + "\n" for line in lines), 0
+
+    def scancel(self, args, cwd):
+        self.cancel([arg for arg in args if not arg.startswith("-")])
+        return "", 0
+
+    # SunGridEngine
+
+    def qsub(self, args, cwd):
+        script = args[-1]
+        directives = read_directives(os.path.join(cwd, script), "#$")
+        queue = ""
+        for resource in directives.get("-l", "").split(","):
+            if resource.startswith("qname="):
+                queue = resource.split("=")[-1]
+        ncores = directives.get("-pe", "x 1").split()[-1]
+        name = directives.get("-N", script)
+        job_id = self.submit(script, cwd, name=name, partition=queue, ncores=int(ncores))
+        return "Your job {} (\"{}\") has been submitted\n".format(job_id, name), 0
+
+    def qstat(self, args, cwd):
+        jobs = [job for job in self.get_jobs() if job["state"] in ACTIVE_STATES]
+        user = getpass.getuser()
+        if "-j" in args:
+            job_id = args[args.index("-j") + 1]
+            job = {job["id"]: job for job in jobs}.get(job_id)
+            if job is None:
+                return "Following jobs do not exist: \n{}\n".format(job_id), 1
+            lines = ["=" * 62,
+                     "job_number:                 {}".format(job["id"]),
+                     "job_name:                   {}".format(job["name"]),
+                     "owner:                      {}".format(user),
+                     "sge_o_workdir:              {}".format(job["workdir"])]
+            return "".join(line + "\n" for line in lines), 0
+        if "-xml" in args:
+            return format_qstat_xml(jobs, user), 0
+        if jobs == []:
+            return "", 0
+        lines = ["job-ID  prior   name       user         state submit/start at     queue"
+                 "                          slots ja-task-ID ",
+                 "-" * 121]
+        for job in jobs:
+            timestamp = datetime.fromtimestamp(job["start"] or job["submit"]).strftime("%m/%d/%Y %H:%M:%S")
+            lines.append("{:>7} {:7} {:10} {:12} {:5} {:19} {:30} {:>5}".format(
+                job["id"], "0.50000", job["name"][:10], user[:12], SGE_STATES[job["state"]], timestamp,
+                job["partition"] if job["state"] == RUNNING else "", job["ncores"]))
+        return "".join(line + "\n" for line in lines), 0
+
+    def qdel(self, args, cwd):
+        cancelled = self.cancel([arg for arg in args if not arg.startswith("-")])
+        return "".join("{} has deleted job {}\n".format(getpass.getuser(), job_id) for job_id in cancelled), 0
+
+
+def read_directives(path, prefix):
+    """
+    :param path: (str) absolute path to machine script
+    :param prefix: (str) prefix of scheduler directives, e.g. '#SBATCH'
+    :return: (dict) dictionary in form of {option: value}, e.g. {'-n': '12'}
+    """
+    directives = {}
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith(prefix):
+                words = line[len(prefix):].split(None, 1)
+                if words:
+                    option, _, value = words[0].partition("=")
+                    if (value == "") and (len(words) > 1):
+                        value = words[1].strip()
+                    directives[option] = value
+    return directives
+
+
+def parse_options(args, flags=()):
+    """
+    :param args: (str list) command line arguments
+    :param flags: (str list) options without value
+    :return: (dict) dictionary in form of {option: value}
+    """
+    options = {}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in flags:
+            options[arg] = True
+        elif arg.startswith("--") and ("=" in arg):
+            option, _, value = arg.partition("=")
+            options[option] = value
+        elif arg.startswith("-") and (i + 1 < len(args)):
+            options[arg] = args[i + 1]
+            i += 1
+        i += 1
+    return options
+
+
+def format_squeue(fmt, job):
+    """
+    :param fmt: (str) squeue output format, e.g. '%i %T %Z'
+    :param job: (dict) job dict. If None, the header line is returned
+    :return: (str) line of squeue output
+    """
+    fields = {"i": ("JOBID", lambda job: job["id"]),
+              "j": ("NAME", lambda job: job["name"]),
+              "u": ("USER", lambda job: getpass.getuser()),
+              "P": ("PARTITION", lambda job: job["partition"]),
+              "T": ("STATE", lambda job: job["state"]),
+              "t": ("ST", lambda job: SLURM_SHORT_STATES[job["state"]]),
+              "M": ("TIME", lambda job: "{:d}:{:02d}".format(*divmod(int(time.time() - (job["start"] or time.time())), 60))),
+              "D": ("NODES", lambda job: "1"),
+              "C": ("CPUS", lambda job: str(job["ncores"])),
+              "Z": ("WORK_DIR", lambda job: job["workdir"]),
+              "R": ("NODELIST(REASON)", lambda job: "localhost" if job["state"] == RUNNING else "(Priority)")}
+    line = ""
+    i = 0
+    while i < len(fmt):
+        if fmt[i] != "%":
+            line += fmt[i]
+            i += 1
+            continue
+        j = i + 1
+        while (j < len(fmt)) and (fmt[j] in ".0123456789"):
+            j += 1
+        width = fmt[i + 1:j].lstrip(".")
+        header, get = fields.get(fmt[j], ("", lambda job: ""))
+        value = header if job is None else get(job)
+        if width:
+            value = "{:>{}}".format(value[:int(width)], int(width))
+        line += value
+        i = j + 1
+    return line
+
+
+def get_sacct_field(job, field):
+    """
+    :param job: (dict) job dict
+    :param field: (str) sacct field, e.g. 'State'
+    :return: (str) value of field
+    """
+    values = {"jobid": job["id"],
+              "jobname": job["name"],
+              "partition": job["partition"],
+              "alloccpus": str(job["ncores"]),
+              "state": job["state"],
+              "exitcode": "{}:0".format(job["exit code"] or 0),
+              "workdir": job["workdir"]}
+    return values.get(field.lower(), "")
+
+
+def format_qstat_xml(jobs, user):
+    """
+    :param jobs: (dict list) pending and running job dicts
+    :param user: (str) name of user
+    :return: (str) output of 'qstat -xml'
+    """
+    def job_list(job, state):
+        return ("    <job_list state=\"{state}\">\n"
+                "      <JB_job_number>{id}</JB_job_number>\n"
+                "      <JB_name>{name}</JB_name>\n"
+                "      <JB_owner>{user}</JB_owner>\n"
+                "      <state>{short}</state>\n"
+                "      <queue_name>{queue}</queue_name>\n"
+                "      <slots>{ncores}</slots>\n"
+                "    </job_list>\n").format(state=state, id=job["id"], name=job["name"], user=user,
+                                            short=SGE_STATES[job["state"]], queue=job["partition"],
+                                            ncores=job["ncores"])
+    xml = "<?xml version='1.0'?>\n<job_info>\n  <queue_info>\n"
+    xml += "".join(job_list(job, "running") for job in jobs if job["state"] == RUNNING)
+    xml += "  </queue_info>\n  <job_info>\n"
+    xml += "".join(job_list(job, "pending") for job in jobs if job["state"] == PENDING)
+    xml += "  </job_info>\n</job_info>\n"
+    return xml
+
+
+def install(settings=None):
+    """
+    - writes the fake commands and settings to the state directory and prepends it to PATH
+
+    :param settings: (dict) settings of the fake scheduler, see DEFAULT_SETTINGS. 'state dir' sets the
+    state directory, default is a directory in the temporary directory of the system. The environment variable
+    STRUCSCAN_FAKE_SCHEDULER_DIR overrides 'state dir', e.g. to separate test runs
+    :return: (str) absolute path to state directory
+    """
+    settings = dict(settings or {})
+    state_dir = settings.pop("state dir", get_default_state_dir())
+    state_dir = os.path.abspath(os.path.expanduser(str(os.environ.get(STATE_DIR_VARIABLE) or state_dir)))
+    bin_dir = os.path.join(state_dir, "bin")
+    package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.makedirs(bin_dir, exist_ok=True)
+    with locked(os.path.join(state_dir, "jobs.json")):
+        write_atomic(os.path.join(state_dir, "settings.json"), json.dumps(settings))
+        for command in COMMANDS:
+            fname = os.path.join(bin_dir, command)
+            # strucscan is importable by the commands even if it is not installed. A state directory set
+            # in the environment of the command, e.g. by the 'command prefix' of a site, takes precedence
+            script = "#!/bin/sh\n{0}=${{{0}:-{1}}} PYTHONPATH={2}${{PYTHONPATH:+:$PYTHONPATH}} exec {3} " \
+                     "-m strucscan.fakescheduler {4} \"$@\"\n".format(STATE_DIR_VARIABLE, state_dir, package_path,
+                                                                       sys.executable, command)
+            if os.path.exists(fname):
+                with open(fname, "r") as f:
+                    if f.read() == script:
+                        continue
+            write_atomic(fname, script)
+            os.chmod(fname, 0o755)
+    path = os.environ.get("PATH", "")
+    if path.split(os.pathsep)[0] != bin_dir:
+        os.environ["PATH"] = bin_dir + os.pathsep + path
+    return state_dir
+
+
+def main(argv=None):
+    """
+    - entry point of the fake commands: python -m strucscan.fakescheduler <command> [arguments]
+
+    :param argv: (str list) command line arguments. If None, sys.argv is used
+    :return: (int) exit code
+    """
+    if argv is None:
+        argv = sys.argv
+    if (len(argv) < 2) or (argv[1] not in COMMANDS):
+        sys.stderr.write("Usage: python -m strucscan.fakescheduler [{}] [arguments]\n".format("|".join(COMMANDS)))
+        return 2
+    scheduler = FakeScheduler(os.environ.get(STATE_DIR_VARIABLE, get_default_state_dir()))
+    time.sleep(float(scheduler.settings["command latency"]))
+    output, exit_code = getattr(scheduler, argv[1])(argv[2:], os.getcwd())
+    if exit_code == 0:
+        sys.stdout.write(output)
+    else:
+        sys.stderr.write(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
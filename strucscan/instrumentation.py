@@ -0,0 +1,215 @@
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import threading
+import atexit
+import random
+import json
+import time
+import os
+
+from strucscan.utils import METRICS_FILE, METRICS_SAMPLE_RATE, PROJECT_PATH, SEPERATOR
+
+
+class Instrumentation:
+    def __init__(self):
+        """
+        - collects timers and counters of the monitoring loop
+        - timers and counters are accumulated per monitoring cycle and in total
+        - after each cycle, one JSON line is appended to the metrics file
+        - at exit, a summary of all cycles is written next to the metrics file
+
+        Timing is sampled: only a fraction 'sample_rate' of all calls is timed,
+        while every call is counted. Total times are extrapolated from the sampled calls.
+        """
+        self.enabled = False
+        self.fname = None
+        self.sample_rate = 1.
+        self.cycle = 0
+        self.start_time = time.time()
+        self.cycle_start_time = self.start_time
+        self.cycle_timers = {}
+        self.cycle_counters = {}
+        self.total_timers = {}
+        self.total_counters = {}
+        self.summary_written = False
+        self.atexit_registered = False
+        self.lock = threading.Lock()
+
+    def configure(self, fname=None, sample_rate=None):
+        """
+        - enables instrumentation if a metrics file is configured in ~/.strucscan
+
+        :param fname: (str) path to JSON-lines metrics file. If None, METRICS_FILE in ~/.strucscan is used
+        :param sample_rate: (float) fraction of calls that are timed. If None, METRICS_SAMPLE_RATE in ~/.strucscan is used
+        :return: (bool) True if instrumentation is enabled
+        """
+        if fname is None:
+            fname = METRICS_FILE()
+        if sample_rate is None:
+            sample_rate = METRICS_SAMPLE_RATE()
+        if (fname is False) or (fname is None) or (str(fname).lower() in ["false", "off", ""]):
+            self.enabled = False
+            return self.enabled
+        if fname is True or (str(fname).lower() in ["true", "on"]):
+            fname = "{}/metrics{}{}.jsonl".format(PROJECT_PATH(), SEPERATOR,
+                                                  datetime.now().strftime("%m-%d-%Y_%H-%M"))
+        directory = os.path.dirname(os.path.abspath(fname))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.fname = os.path.abspath(fname)
+        self.sample_rate = min(max(float(sample_rate), 0.), 1.)
+        self.enabled = True
+        self.summary_written = False
+        if not self.atexit_registered:
+            # configure is called again for every scan of the daemon
+            atexit.register(self.write_summary)
+            self.atexit_registered = True
+        return self.enabled
+
+    def is_sampled(self):
+        """
+        :return: (bool) True if the current call should be timed
+        """
+        return self.enabled and ((self.sample_rate >= 1.) or (random.random() < self.sample_rate))
+
+    def count(self, name, n=1):
+        """
+        :param name: (str) name of counter
+        :param n: (int) increment
+        :return: 0
+        """
+        if self.enabled:
+            with self.lock:
+                self.cycle_counters[name] = self.cycle_counters.get(name, 0) + n
+        return
+
+    def add_time(self, name, seconds, sampled=True):
+        """
+        :param name: (str) name of timer
+        :param seconds: (float) measured time in seconds
+        :param sampled: (bool) False if the call was only counted but not timed
+        :return: 0
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            timer = self.cycle_timers.setdefault(name, {"calls": 0, "sampled": 0, "time": 0., "max": 0.})
+            timer["calls"] += 1
+            if sampled:
+                timer["sampled"] += 1
+                timer["time"] += seconds
+                timer["max"] = max(timer["max"], seconds)
+        return
+
+    @contextmanager
+    def timer(self, name):
+        """
+        - context manager that times the enclosed block
+
+        :param name: (str) name of timer, e.g. 'scheduler.qstat'
+        """
+        if not self.enabled:
+            yield
+            return
+        sampled = self.is_sampled()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, sampled=sampled)
+
+    def timed(self, name):
+        """
+        - decorator that times every call of the decorated function
+
+        :param name: (str) name of timer
+        """
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _summarize(timers):
+        summary = {}
+        for name, timer in timers.items():
+            mean = timer["time"] / timer["sampled"] if timer["sampled"] > 0 else 0.
+            summary[name] = {"calls": timer["calls"],
+                             "sampled": timer["sampled"],
+                             "total": mean * timer["calls"],
+                             "mean": mean,
+                             "max": timer["max"]}
+        return summary
+
+    def end_cycle(self, **extra):
+        """
+        - appends the metrics of the current monitoring cycle as one JSON line to the metrics file
+        - accumulates the cycle metrics into the totals and resets the cycle metrics
+
+        :param extra: further entries of the JSON line, e.g. the number of jobs per status
+        :return: 0
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        line = {"cycle": self.cycle,
+                "timestamp": datetime.now().isoformat(),
+                "wall_time": now - self.cycle_start_time,
+                "timers": self._summarize(self.cycle_timers),
+                "counters": self.cycle_counters}
+        line.update(extra)
+        with open(self.fname, "a") as f:
+            f.write(json.dumps(line) + "\n")
+
+        for name, timer in self.cycle_timers.items():
+            total = self.total_timers.setdefault(name, {"calls": 0, "sampled": 0, "time": 0., "max": 0.})
+            total["calls"] += timer["calls"]
+            total["sampled"] += timer["sampled"]
+            total["time"] += timer["time"]
+            total["max"] = max(total["max"], timer["max"])
+        for name, n in self.cycle_counters.items():
+            self.total_counters[name] = self.total_counters.get(name, 0) + n
+        self.cycle_timers = {}
+        self.cycle_counters = {}
+        self.cycle += 1
+        self.cycle_start_time = now
+        return
+
+    def get_summary(self):
+        """
+        :return: (dict) summary of all finished cycles
+        """
+        return {"cycles": self.cycle,
+                "wall_time": time.time() - self.start_time,
+                "sample_rate": self.sample_rate,
+                "timers": self._summarize(self.total_timers),
+                "counters": self.total_counters}
+
+    def write_summary(self):
+        """
+        - closes the current cycle if it recorded anything
+        - writes summary to '<metrics file>.summary.json'
+
+        :return: (str) path to summary file, None if instrumentation is disabled
+        """
+        if (not self.enabled) or self.summary_written:
+            return
+        if (self.cycle_timers != {}) or (self.cycle_counters != {}):
+            self.end_cycle()
+        fname = os.path.splitext(self.fname)[0] + ".summary.json"
+        with open(fname, "w") as f:
+            json.dump(self.get_summary(), f, indent=2)
+        self.summary_written = True
+        return fname
+
+
+METRICS = Instrumentation()
+timer = METRICS.timer
+timed = METRICS.timed
+count = METRICS.count
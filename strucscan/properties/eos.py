@@ -1,7 +1,8 @@
 from ase.eos import EquationOfState
 
+from strucscan.core import archive
+
 import numpy as np
-import os
 
 volume_range = 0.1
 num_of_point = 11
@@ -38,7 +39,7 @@ def get_EOS_properties(calc, absolute_path):
     stress_list = []
     pressure_list = []
     result_filename = calc.get_result_filename()
-    for filename in os.listdir(absolute_path):
+    for filename in archive.listdir(absolute_path):
         if (result_filename in filename):
             final_struct = calc.read_final_structure(absolute_path,
                                                      resultfilename=filename)
@@ -18,7 +18,10 @@ class GENERAL:
                         "verbose": False,
                         "monitor": True,
                         "submit": True,
-                        "collect": True
+                        "collect": True,
+                        "split images": False,
+                        "priority weights": "",
+                        "deduplicate prototypes": False
                         }
 
         self.ALL = deepcopy(self.MANDATORY)
@@ -1,8 +1,20 @@
+from collections import deque
+from xml.etree import ElementTree
+import getpass
+import signal
 import subprocess
+import threading
+import time
 import yaml
 import os
 
 from strucscan.utils import read_configuration
+from strucscan import instrumentation
+
+ACCOUNTING_WINDOW = 7 * 24 * 3600   # seconds searched by sacct for jobs of unknown submission time
+QUEUE_SNAPSHOT_MAX_AGE = 10.        # seconds a queue snapshot is reused by status checks
+# accounting states of jobs that are still known to the scheduler, see Slurm.get_accounting_states
+ACCOUNTING_ACTIVE_STATES = ["PENDING", "RUNNING", "CONFIGURING", "COMPLETING", "REQUEUED", "RESIZING", "SUSPENDED"]
 
 
 class GeneralScheduler:
@@ -21,6 +33,32 @@ class GeneralScheduler:
 
         self.MACHINE_SCRIPT_PATH = "{}/machineconfig/{}/machinescripts". \
             format(self.configurations["RESOURCE_PATH"], self.machinename)
+        # e.g. 'SLURM_CONF=/etc/slurm/cluster2.conf' to address one of several clusters from the same host
+        self.command_prefix = self.machine_configuration_dict.get("command prefix") or ""
+        self.queue_snapshot = None
+        self.queue_snapshot_time = 0.
+        # guards the snapshot, which is shared by the threads that probe job directories
+        self.snapshot_lock = threading.RLock()
+
+    def run_scheduler_command(self, command, cwd=None):
+        """
+        - runs command of the scheduler with the 'command prefix' of config.yaml
+
+        :param command: (str) shell command, e.g. 'sbatch job.slurm'
+        :param cwd: (str) working directory of command. If None, current working directory is used
+        :return: (bytes, bytes) tuple of stdout and stderr
+        """
+        name = os.path.basename(command.split()[0])
+        if self.command_prefix:
+            command = self.command_prefix + " " + command
+        return run_command(command, cwd=cwd, name=name)
+
+    def provides_queue(self, queuename):
+        """
+        :param queuename: (str) name of queue
+        :return: (bool) True if there is a machine script for the queue on this machine
+        """
+        return os.path.exists("{}/{}.{}".format(self.MACHINE_SCRIPT_PATH, queuename, self.suffix))
 
     def get_smallest_queue(self):
         """
@@ -58,16 +96,54 @@ class GeneralScheduler:
         machine_script_fname = jobname + "." + self.suffix
         return machine_script, machine_script_fname
 
-    def submit(self, machinefilename):
+    def submit(self, machinefilename, jobpath):
         """
         Abstract method to submit machine file with 'machine_script_fname'
 
         :param machinefilename: (str) name of machine script
+        :param jobpath: (str) absolute path to job directory that contains the machine script
         :return: id of job in scheduler: on queuing systems, job_id equals queue id,
         on systems without queue, job_id equals process id
         """
         raise NotImplementedError
 
+    def get_queue_snapshot(self):
+        """
+        Abstract method that lists the pending and running jobs with a single call of the scheduler
+
+        :return: (dict) dictionary with the job ids in queue as keys
+        """
+        raise NotImplementedError
+
+    def get_cached_queue_snapshot(self, max_age=QUEUE_SNAPSHOT_MAX_AGE):
+        """
+        - returns the last queue snapshot if it is younger than max_age seconds, so that the status of all jobs
+        of an update cycle is looked up in a single scheduler call
+        - every submission and cancellation discards the snapshot, see discard_queue_snapshot
+        - threads that find the snapshot outdated wait for a single refresh
+
+        :param max_age: (float) maximum age of snapshot in seconds
+        :return: (dict) see get_queue_snapshot
+        """
+        with self.snapshot_lock:
+            snapshot = self.queue_snapshot
+            now = time.time()
+            if (snapshot is None) or (now - self.queue_snapshot_time > max_age):
+                snapshot = self.get_queue_snapshot()
+                self.queue_snapshot = snapshot
+                self.queue_snapshot_time = now
+        return snapshot
+
+    def discard_queue_snapshot(self):
+        """
+        - the next status check asks the scheduler again, e.g. after a submission
+
+        :return: 0
+        """
+        with self.snapshot_lock:
+            self.queue_snapshot = None
+        return
+
     @staticmethod
     def get_queue_ids():
         """
@@ -97,6 +173,26 @@ class GeneralScheduler:
         """
         raise NotImplementedError
 
+    def get_accounting_states(self, job_ids, start=None):
+        """
+        - returns the states of jobs that may have left the queue. Schedulers without accounting know
+        no such jobs
+
+        :param job_ids: (str list) ids of jobs
+        :param start: (float) earliest submission time of the jobs as seconds since the epoch
+        :return: (dict) dictionary in form of {job_id: state}. Jobs unknown to the accounting are missing
+        """
+        return {}
+
+    def cancel(self, job_id):
+        """
+        Abstract method that removes a job from the queue or stops it
+
+        :param job_id: (str) id of job
+        :return: (bool) True if the scheduler accepted the cancellation
+        """
+        raise NotImplementedError
+
     def get_total_number_of_cores(self, machine_script):
         """
         Abstract method that scans the machine_script and returns total number of cores used for calculation
@@ -117,82 +213,120 @@ class SunGridEngine(GeneralScheduler):
         """
         GeneralScheduler.__init__(self, machinename)
         self.suffix = "sge" # file suffix appended to machine_script_fname: script.sge
+        self.workdirs = {}  # working directories of jobs in queue by job id, as reported by 'qstat -j'
 
-    def submit(self, machine_script_fname):
+    def submit(self, machine_script_fname, jobpath):
         """
         SunGridEngine specific method to submit machine file with 'machine_script_fname'
 
         :param machine_script_fname: (str) name of machine script
+        :param jobpath: (str) absolute path to job directory that contains the machine script
         :return: id of job: on queuing systems, job_id equilas queue id,
         on systems without queue, job_id equals process id
         """
-        cmd = subprocess.Popen("qsub " + machine_script_fname,
-                               shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output, err = cmd.communicate()
+        self.discard_queue_snapshot()
+        output, err = self.run_scheduler_command("qsub " + machine_script_fname, cwd=jobpath)
         if output:
-            job_id = str(output).split()[2]
+            job_id = decode(output).split()[2]
             return job_id
         else:
-            if ("error opening" in str(err)) and ("No such file or directory" in str(err)):
-                for file in os.listdir(os.getcwd()):
+            if ("error opening" in decode(err)) and ("No such file or directory" in decode(err)):
+                for file in os.listdir(jobpath):
                     if "." + self.suffix in file:
                         machine_script_fname = file
-                        cmd = subprocess.Popen("qsub " + machine_script_fname,
-                                               shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-                        output, err = cmd.communicate()
+                        output, err = self.run_scheduler_command("qsub " + machine_script_fname, cwd=jobpath)
                         if output:
-                            job_id = str(output).split()[2]
+                            job_id = decode(output).split()[2]
                             return job_id
             else:
                 raise FileNotFoundError(err)
 
-    @staticmethod
-    def get_queue_ids():
+    def get_queue_snapshot(self):
+        """
+        - SunGridEngine specific method that lists the pending and running jobs of the user with a single
+        'qstat -xml' call. The XML is parsed while it is read from the pipe
+
+        :return: (dict) dictionary in form of {job_id: state}, e.g. {'1001': 'r', '1002': 'qw'}
         """
-        SunGridEngine specific method that returns str list of all job ids in queue.
+        with instrumentation.timer("scheduler.qstat"):
+            command = "qstat -xml -u " + getpass.getuser()
+            if self.command_prefix:
+                command = self.command_prefix + " " + command
+            cmd = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            try:
+                snapshot = parse_qstat_xml(cmd.stdout)
+            finally:
+                cmd.stdout.close()
+                cmd.wait()
+        return snapshot
+
+    def get_queue_ids(self):
+        """
+        - SunGridEngine specific method that returns str list of all job ids of the user in queue
+        - looked up in the queue snapshot of the current update cycle, see get_cached_queue_snapshot
 
-        On systems without queue, job_id equals process id
         :return: (str list) str list of all job ids in queue. On systems without queue, job_id equals process id
         """
-        cmd = subprocess.Popen("qstat", shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output, err = cmd.communicate()
-        queue_ids = [line.split()[0] for line in str(output)[2:-1].split("\\n")[2:-1]]
-        return queue_ids
+        return list(self.get_cached_queue_snapshot())
 
     def is_job_id_in_queue(self, job_id):
         """
-        SunGridEngine specific method
+        - SunGridEngine specific method
+        - looked up in the queue snapshot of the current update cycle, see get_cached_queue_snapshot
 
         :param job_id: (str) id of job: on queuing systems, job_id equilas queue id, on systems without queue, job_id equals process id
         :return: (bool) if job id is queue / process list or not
         """
-        queue_ids = self.get_queue_ids()
-        if queue_ids is None:
-            return False
-        else:
-            if job_id in self.get_queue_ids():
-                return True
+        return (job_id is not None) and (job_id in self.get_cached_queue_snapshot())
+
+    def get_workdir(self, job_id):
+        """
+        - SunGridEngine specific method that reads 'sge_o_workdir' from 'qstat -j'. The working directory
+        of a job does not change, so it is asked only once per job
+
+        :param job_id: (str) id of job
+        :return: (str) absolute path to working directory of job. None if the job is unknown to the scheduler
+        """
+        if job_id not in self.workdirs:
+            output, err = self.run_scheduler_command("qstat -j %s" % job_id)
+            workdir = None
+            for line in decode(output).splitlines():
+                if line.startswith("sge_o_workdir:"):
+                    workdir = line.split(":", 1)[1].strip()
+            if workdir is None:
+                return None
+            self.workdirs[job_id] = workdir
+        return self.workdirs[job_id]
 
     def get_job_id_by_jobpath(self, jobpath):
         """
-        SunGridEngine specific method
+        - SunGridEngine specific method
+        - looked up in the queue snapshot of the current update cycle, see get_cached_queue_snapshot.
+        Working directories are asked once per job, see get_workdir
 
         :param jobpath: (str) absolute path to job directory
         :return: (str) id of job: on queuing systems, job_id equals queue id, on systems without queue, job_id equals process id
         """
         queue_ids = self.get_queue_ids()
+        # forget jobs that have left the queue
+        self.workdirs = {id: self.workdirs[id] for id in queue_ids if id in self.workdirs}
         job_id = None
-        if queue_ids is not None:
-            for id in queue_ids:
-                cmd = subprocess.Popen("qstat -j %s | grep sge_o_workdir" % id,
-                                       shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-                output, err = cmd.communicate()
-                if output:
-                    sge_o_workdir = str(output)[2:-3].split()[-1]
-                    if jobpath == sge_o_workdir:
-                        job_id = id
+        for id in queue_ids:
+            if jobpath == self.get_workdir(id):
+                job_id = id
         return job_id
 
+    def cancel(self, job_id):
+        """
+        SunGridEngine specific method that removes a job from the queue or stops it
+
+        :param job_id: (str) id of job
+        :return: (bool) True if the scheduler accepted the cancellation
+        """
+        self.discard_queue_snapshot()
+        output, err = self.run_scheduler_command("qdel %s" % job_id)
+        return decode(err).strip() == ""
+
     def get_total_number_of_cores(self, machine_script):
         """
         SunGridEngine specific method that scans the machine_script and returns total number of cores
@@ -219,75 +353,114 @@ class Slurm(GeneralScheduler):
         GeneralScheduler.__init__(self, machinename)
         self.suffix = "slurm" # file suffix appended to machine_script_fname: script.sge
 
-    @staticmethod
-    def get_queue_ids():
+    def get_queue_snapshot(self):
+        """
+        - Slurm specific method that lists the pending and running jobs of the user with a single
+        'squeue -h -o' call in a machine-readable format
+
+        :return: (dict) dictionary in form of {job_id: (state, workdir)}, e.g. {'1001': ('RUNNING', '/path/to/job')}
         """
-        Slurm specific method that returns str list of all job ids in queue. On systems without queue, job_id equals process id
+        output, err = self.run_scheduler_command("squeue -h -u {} -o '%i|%T|%Z'".format(getpass.getuser()))
+        snapshot = {}
+        for line in decode(output).splitlines():
+            fields = line.split("|", 2)
+            if len(fields) == 3:
+                snapshot[fields[0].strip()] = (fields[1].strip(), fields[2].strip())
+        return snapshot
+
+    def get_queue_ids(self):
+        """
+        - Slurm specific method that returns str list of all job ids of the user in queue
+        - looked up in the queue snapshot of the current update cycle, see get_cached_queue_snapshot
 
         :return: (str list) str list of all job ids in queue. On systems without queue, job_id equals process id
         """
-        cmd = subprocess.Popen("sacct", shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output, err = cmd.communicate()
-        queue_ids = [line.split()[0] for line in str(output)[2:-1].split("\\n")[2:-1]]
-        return queue_ids
+        return list(self.get_cached_queue_snapshot())
 
     def is_job_id_in_queue(self, job_id):
         """
-        Slurm specific method
+        - Slurm specific method
+        - looked up in the queue snapshot of the current update cycle, see get_cached_queue_snapshot
 
         :param job_id: (str) id of job: on queuing systems, job_id equals queue id, on systems without queue, job_id equals process id
         :return: (bool) if job id is queue / process list or not
         """
-        queue_ids = self.get_queue_ids()
-        if queue_ids is None:
-            return False
-        else:
-            if job_id in queue_ids:
-                return True
+        return (job_id is not None) and (job_id in self.get_cached_queue_snapshot())
 
     def get_job_id_by_jobpath(self, jobpath):
         """
-        Slurm specific method
+        - Slurm specific method
+        - looked up in the queue snapshot of the current update cycle, see get_cached_queue_snapshot
 
         :param jobpath: (str) absolute path to job directory
         :return: (str) id of job: on queuing systems, job_id equals queue id,
         on systems without queue, job_id equals process id
         """
-        queue_ids = self.get_queue_ids()
         job_id = None
-        if queue_ids is not None:
-            for id in queue_ids:
-                cmd = subprocess.Popen("scontrol show job %s | grep WorkDir" % id, shell=True, stderr=subprocess.PIPE,
-                                       stdout=subprocess.PIPE)
-                output, err = cmd.communicate()
-                if output:
-                    workdir = str(output)[2:-3].split()[-1].split("WorkDir=")[-1]
-                    if jobpath == workdir:
-                        job_id = id
+        for id, (state, workdir) in self.get_cached_queue_snapshot().items():
+            if jobpath == workdir:
+                job_id = id
         return job_id
 
-    def submit(self, machine_script_fname):
+    def get_accounting_states(self, job_ids, start=None):
+        """
+        - Slurm specific method that returns the states of jobs that may have left the queue, e.g. COMPLETED,
+        FAILED, TIMEOUT or CANCELLED
+        - 'sacct' is restricted to the given jobs, their allocations (no job steps) and jobs started after 'start',
+        so the cost does not grow with the history of the cluster
+
+        :param job_ids: (str list) ids of jobs
+        :param start: (float) earliest submission time of the jobs as seconds since the epoch.
+        If None, the last ACCOUNTING_WINDOW seconds are searched
+        :return: (dict) dictionary in form of {job_id: state}. Jobs unknown to the accounting are missing
+        """
+        if not job_ids:
+            return {}
+        if start is None:
+            start = time.time() - ACCOUNTING_WINDOW
+        command = "sacct --parsable2 -n -X -S {} -j {} -o JobID,State". \
+            format(time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start)), ",".join(job_ids))
+        output, err = self.run_scheduler_command(command)
+        states = {}
+        for line in decode(output).splitlines():
+            fields = line.split("|")
+            if (len(fields) == 2) and fields[1]:
+                # e.g. 'CANCELLED by 1000'
+                states[fields[0]] = fields[1].split()[0]
+        return states
+
+    def submit(self, machine_script_fname, jobpath):
         """
         Slurm specific method to submit machine file with 'machine_script_fname'
 
         :param machine_script_fname: (str) name of machine script
+        :param jobpath: (str) absolute path to job directory that contains the machine script
         :return: id of job: on queuing systems, job_id equals queue id, on systems without queue, job_id equals process id
         """
-        cmd = subprocess.Popen("sbatch " + machine_script_fname, shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output, err = cmd.communicate()
+        self.discard_queue_snapshot()
+        output, err = self.run_scheduler_command("sbatch " + machine_script_fname, cwd=jobpath)
         if output:
-            jobID = str(output).split()[3][:-3]
+            jobID = decode(output).split()[3]
             return jobID
         else:
-            cmd = subprocess.Popen("machinename", shell=True, stderr=subprocess.PIPE,
-                                   stdout=subprocess.PIPE)
-            output, err = cmd.communicate()
+            output, err = run_command("machinename")
             if output:
-                hostname = str(output)[2:-3]
+                hostname = decode(output).strip()
             else:
                 hostname = "unknown host"
             raise AttributeError("{} has no queueing system.".format(hostname))
 
+    def cancel(self, job_id):
+        """
+        Slurm specific method that removes a job from the queue or stops it
+
+        :param job_id: (str) id of job
+        :return: (bool) True if the scheduler accepted the cancellation
+        """
+        self.discard_queue_snapshot()
+        output, err = self.run_scheduler_command("scancel %s" % job_id)
+        return decode(err).strip() == ""
+
     def get_total_number_of_cores(self, machine_script):
         """
         Slurm specific method that scans the machine_script and returns total number of cores
@@ -325,20 +498,17 @@ class NoQueue(GeneralScheduler):
         machine_script_fname = jobname + "." + self.suffix
         return machine_script, machine_script_fname
 
-    def submit(self, machine_script_fname):
+    def submit(self, machine_script_fname, jobpath):
         """
         Method to submit machine file with 'machine_script_fname'
 
         :param machine_script_fname: (str) name of machine script
+        :param jobpath: (str) absolute path to job directory that contains the machine script
         :return: id of job: on queuing systems, job_id equals queue id,
         on systems without queue, job_id equals process id
         """
-        cmd = subprocess.Popen("chmod +x %s" % machine_script_fname,
-                               shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output, err = cmd.communicate()
-        cmd = subprocess.Popen("./%s &" % machine_script_fname,
-                               shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output, err = cmd.communicate()
+        output, err = run_command("chmod +x %s" % machine_script_fname, cwd=jobpath)
+        output, err = run_command("./%s &" % machine_script_fname, cwd=jobpath, name="launch")
         return None
 
     def get_job_id_by_jobpath(self, jobpath):
@@ -359,8 +529,491 @@ class NoQueue(GeneralScheduler):
         return 1
 
 
+class LocalJob:
+    def __init__(self, job_id, machinefilename, jobpath, ncores):
+        """
+        - job of strucscan.scheduler.LocalPool
+
+        :param job_id: (str) id of job in the pool
+        :param machinefilename: (str) name of machine script
+        :param jobpath: (str) absolute path to job directory that contains the machine script
+        :param ncores: (int) number of cores the job occupies in the pool
+        """
+        self.job_id = job_id
+        self.machinefilename = machinefilename
+        self.jobpath = jobpath
+        self.ncores = ncores
+        self.process = None
+        self.returncode = None
+
+
+class LocalPool(GeneralScheduler):
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"   # exit code 0
+    FAILED = "failed"       # exit code != 0
+
+    def __init__(self, machinename):
+        """
+        Scheduler class for a pool of local processes, e.g. on a workstation or a single large node
+
+        - jobs are started in order of submission as soon as enough of the 'max cores' cores given
+        in config.yaml (default: all cores of the host) are free
+        - child processes are tracked by a background thread, so the state and exit code of every job
+        submitted by this strucscan instance are known exactly
+
+        :param machinename: (str) name of machine. This is equals to the directory name
+        containing the config.yaml and machinescripts for the specific machine.
+        """
+        GeneralScheduler.__init__(self, machinename)
+        self.max_cores = int(self.machine_configuration_dict.get("max cores") or os.cpu_count() or 1)
+        self.poll_interval = float(self.machine_configuration_dict.get("poll interval", 1.))
+        self.jobs = {}              # {job_id: LocalJob}
+        self.job_ids = {}           # {jobpath: job_id of last job submitted in jobpath}
+        self.pending = deque()
+        self.running = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.counter = 0
+
+    def provides_queue(self, queuename):
+        """
+        :param queuename: (str) name of queue
+        :return: (bool) always True, the pool has no queues
+        """
+        return True
+
+    def configure_machine_script(self, machine_info, jobname="noname"):
+        """
+        LocalPool specific method to configure machine script.
+
+        :param machine_info: (dict) machine information about queue, nnodes, ncores provided by user in input.yaml
+        :param jobname: (str) name of job
+        :return: (str list, str) tuple of (machine file lines, machine file name)
+        """
+        ntotalcores = int(machine_info["ncores"]) * int(machine_info["nnodes"])
+        machine_script = ["#!/bin/bash\n", "#LOCALPOOL -n %i\n" % ntotalcores]
+        machine_script_fname = jobname + "." + self.suffix
+        return machine_script, machine_script_fname
+
+    def get_total_number_of_cores(self, machine_script):
+        """
+        LocalPool specific method that scans the machine_script and returns total number of cores
+        used for calculation
+
+        :param machine_script: (str) machine script lines
+        :return: (int) total number of cores
+        """
+        ntotalcores = 1
+        for line in machine_script:
+            if "#LOCALPOOL -n" in line:
+                ntotalcores = int(line.split()[-1])
+        return ntotalcores
+
+    def submit(self, machine_script_fname, jobpath):
+        """
+        - queues machine script in the pool
+
+        :param machine_script_fname: (str) name of machine script
+        :param jobpath: (str) absolute path to job directory that contains the machine script
+        :return: (str) id of job in the pool
+        """
+        with open(jobpath + "/" + machine_script_fname, "r") as f:
+            ncores = self.get_total_number_of_cores(f.readlines())
+        self.discard_queue_snapshot()
+        with self.lock:
+            self.counter += 1
+            # unique across strucscan instances, since ids are recorded in the job directories
+            job_id = "{}-{}".format(os.getpid(), self.counter)
+            job = LocalJob(job_id, machine_script_fname, jobpath, min(ncores, self.max_cores))
+            self.jobs[job_id] = job
+            self.job_ids[jobpath] = job_id
+            self.pending.append(job)
+            self.update()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        return job_id
+
+    def update(self):
+        """
+        - collects exit codes of finished processes and starts queued jobs in order of submission
+        while enough cores are free. Has to be called with self.lock acquired
+
+        :return: 0
+        """
+        for job in list(self.running):
+            returncode = job.process.poll()
+            if returncode is not None:
+                job.returncode = returncode
+                self.running.remove(job)
+        free_cores = self.max_cores - sum([job.ncores for job in self.running])
+        while self.pending and (self.pending[0].ncores <= free_cores):
+            job = self.pending.popleft()
+            with instrumentation.timer("scheduler.localpool_start"):
+                job.process = subprocess.Popen(["bash", job.machinefilename], cwd=job.jobpath,
+                                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                               start_new_session=True)
+            self.running.append(job)
+            free_cores -= job.ncores
+        return
+
+    def run(self):
+        """
+        - target of the background thread that tracks the pool until all jobs have exited
+
+        :return: 0
+        """
+        while True:
+            time.sleep(self.poll_interval)
+            with self.lock:
+                self.update()
+                if not (self.pending or self.running):
+                    self.thread = None
+                    return
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: (float) maximum time in seconds to wait. If None, waits until all jobs have exited
+        :return: (bool) True if all jobs have exited
+        """
+        start = time.time()
+        while True:
+            with self.lock:
+                self.update()
+                if not (self.pending or self.running):
+                    return True
+            if (timeout is not None) and (time.time() - start > timeout):
+                return False
+            time.sleep(min(self.poll_interval, 0.1))
+
+    def get_state(self, job_id):
+        """
+        :param job_id: (str) id of job in the pool
+        :return: (str) 'queued', 'running', 'finished' or 'failed'. None if job was not submitted to this pool
+        """
+        with self.lock:
+            self.update()
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.returncode is not None:
+                return self.FINISHED if job.returncode == 0 else self.FAILED
+            if job.process is None:
+                return self.QUEUED
+            return self.RUNNING
+
+    def get_exit_code(self, job_id):
+        """
+        :param job_id: (str) id of job in the pool
+        :return: (int) exit code of machine script. None if job has not exited
+        """
+        with self.lock:
+            self.update()
+            job = self.jobs.get(job_id)
+            return None if job is None else job.returncode
+
+    def cancel(self, job_id):
+        """
+        - removes a queued job from the pool or terminates the process group of a running job
+
+        :param job_id: (str) id of job in the pool
+        :return: (bool) True if the job was queued or running
+        """
+        self.discard_queue_snapshot()
+        with self.lock:
+            self.update()
+            job = self.jobs.get(job_id)
+            if (job is None) or (job.returncode is not None):
+                return False
+            if job.process is None:
+                self.pending.remove(job)
+                job.returncode = -signal.SIGTERM
+            else:
+                try:
+                    os.killpg(job.process.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            return True
+
+    def get_queue_snapshot(self):
+        """
+        :return: (dict) dictionary in form of {job_id: state} of queued and running jobs in the pool
+        """
+        with self.lock:
+            self.update()
+            snapshot = {job.job_id: self.RUNNING for job in self.running}
+            snapshot.update({job.job_id: self.QUEUED for job in self.pending})
+            return snapshot
+
+    def get_queue_ids(self):
+        """
+        :return: (str list) ids of queued and running jobs in the pool
+        """
+        with self.lock:
+            self.update()
+            return [job.job_id for job in self.running + list(self.pending)]
+
+    def is_job_id_in_queue(self, job_id):
+        """
+        :param job_id: (str) id of job in the pool
+        :return: (bool) True if job is queued or running
+        """
+        return self.get_state(job_id) in [self.QUEUED, self.RUNNING]
+
+    def get_job_id_by_jobpath(self, jobpath):
+        """
+        :param jobpath: (str) absolute path to job directory
+        :return: (str) id of the last job submitted in jobpath. None if no job was submitted to this pool
+        """
+        with self.lock:
+            return self.job_ids.get(jobpath)
+
+
+class Federation(GeneralScheduler):
+    SITE_MARKER = "#FEDERATION site="
+
+    def __init__(self, machinename):
+        """
+        Scheduler class that distributes the jobs of one scan over several machines ('sites'), e.g. clusters
+        with a shared file system and a large local node
+
+        - every site is a machine with its own config.yaml and machinescripts. The config.yaml of the federation
+        lists the sites with their capacity, i.e. the number of jobs they should hold in queue at the same time
+        - a job is routed to the site with the lowest load, that is the number of jobs in queue per capacity,
+        among the sites that provide a machine script for the queue of the job
+        - the site is written to the machine script, so restarts of a job are submitted to the same site
+        - job ids are prefixed by the name of the site, e.g. 'cluster1:1234'
+
+        :param machinename: (str) name of machine. This is equals to the directory name
+        containing the config.yaml and machinescripts for the specific machine.
+        """
+        GeneralScheduler.__init__(self, machinename)
+        self.sites = {}             # {sitename: GeneralScheduler}
+        self.capacities = {}        # {sitename: capacity}
+        self.routed = {}            # {sitename: number of jobs routed to site since its last queue snapshot}
+        self.snapshot_times = {}    # {sitename: time of queue snapshot of site}
+        for sitename, options in (self.machine_configuration_dict.get("sites") or {}).items():
+            site = get_scheduler(sitename)
+            if isinstance(site, (NoQueue, Federation)):
+                raise ValueError("Site {} of {} has to be a queuing system or a local pool.".format(sitename,
+                                                                                                  machinename))
+            self.sites[sitename] = site
+            self.capacities[sitename] = float((options or {}).get("capacity", 1))
+            self.routed[sitename] = 0
+        if not self.sites:
+            raise KeyError("No sites set in config.yaml of {}.".format(machinename))
+
+    def get_load(self, sitename):
+        """
+        :param sitename: (str) name of site
+        :return: (float) number of jobs in queue and routed since the last queue snapshot per capacity of the site
+        """
+        site = self.sites[sitename]
+        snapshot = site.get_cached_queue_snapshot()
+        if self.snapshot_times.get(sitename) != site.queue_snapshot_time:
+            # routed jobs that have been submitted are part of the new snapshot
+            self.snapshot_times[sitename] = site.queue_snapshot_time
+            self.routed[sitename] = 0
+        return (len(snapshot) + self.routed[sitename]) / self.capacities[sitename]
+
+    def route(self, queuename):
+        """
+        :param queuename: (str) name of queue
+        :return: (str) name of least loaded site that provides the queue. Ties go to the site listed first
+        """
+        sitenames = [sitename for sitename in self.sites if self.sites[sitename].provides_queue(queuename)]
+        if not sitenames:
+            raise FileNotFoundError("No site of {} provides queue {}.".format(self.machinename, queuename))
+        sitename = min(sitenames, key=lambda sitename: self.get_load(sitename))
+        self.routed[sitename] += 1
+        return sitename
+
+    def get_site(self, machine_script):
+        """
+        :param machine_script: (str list) machine script lines
+        :return: (str) name of site the machine script has been configured for. None if it has no site
+        """
+        for line in machine_script:
+            if line.startswith(self.SITE_MARKER):
+                sitename = line[len(self.SITE_MARKER):].strip()
+                if sitename in self.sites:
+                    return sitename
+        return None
+
+    def provides_queue(self, queuename):
+        """
+        :param queuename: (str) name of queue
+        :return: (bool) True if any site provides the queue
+        """
+        return any(site.provides_queue(queuename) for site in self.sites.values())
+
+    def configure_machine_script(self, machine_info, jobname="noname"):
+        """
+        Federation specific method to configure machine script: the machine script of the least loaded site
+
+        :param machine_info: (dict) machine information about queue, nnodes, ncores provided by user in input.yaml
+        :param jobname: (str) name of job
+        :return: (str list, str) tuple of (machine file lines, machine file name)
+        """
+        sitename = self.route(machine_info["queuename"])
+        machine_script, _ = self.sites[sitename].configure_machine_script(machine_info, jobname=jobname)
+        # behind the shebang
+        machine_script.insert(1, "{}{}\n".format(self.SITE_MARKER, sitename))
+        machine_script_fname = jobname + "." + self.suffix
+        return machine_script, machine_script_fname
+
+    def submit(self, machine_script_fname, jobpath):
+        """
+        - submits machine script to the site it has been configured for. Machine scripts without site
+        are submitted to the first site
+
+        :param machine_script_fname: (str) name of machine script
+        :param jobpath: (str) absolute path to job directory that contains the machine script
+        :return: (str) id of job in form of 'sitename:job_id'
+        """
+        with open(jobpath + "/" + machine_script_fname, "r") as f:
+            sitename = self.get_site(f.readlines()) or list(self.sites)[0]
+        self.discard_queue_snapshot()
+        job_id = self.sites[sitename].submit(machine_script_fname, jobpath)
+        if job_id is None:
+            return None
+        return "{}:{}".format(sitename, job_id)
+
+    def get_queue_snapshot(self):
+        """
+        :return: (dict) dictionary in form of {'sitename:job_id': state} of the jobs in queue of all sites
+        """
+        snapshot = {}
+        for sitename, site in self.sites.items():
+            for job_id, state in site.get_cached_queue_snapshot(max_age=0.).items():
+                snapshot["{}:{}".format(sitename, job_id)] = state
+        return snapshot
+
+    def get_queue_ids(self):
+        """
+        :return: (str list) ids of jobs in queue of all sites in form of 'sitename:job_id'
+        """
+        return list(self.get_queue_snapshot())
+
+    def is_job_id_in_queue(self, job_id):
+        """
+        :param job_id: (str) id of job in form of 'sitename:job_id'
+        :return: (bool) if job id is in queue of its site
+        """
+        if job_id is None:
+            return False
+        sitename, _, site_job_id = job_id.partition(":")
+        return (sitename in self.sites) and self.sites[sitename].is_job_id_in_queue(site_job_id)
+
+    def get_job_id_by_jobpath(self, jobpath):
+        """
+        :param jobpath: (str) absolute path to job directory
+        :return: (str) id of job in form of 'sitename:job_id'. None if no site has a job in jobpath
+        """
+        for sitename, site in self.sites.items():
+            job_id = site.get_job_id_by_jobpath(jobpath)
+            if job_id is not None:
+                return "{}:{}".format(sitename, job_id)
+        return None
+
+    def cancel(self, job_id):
+        """
+        :param job_id: (str) id of job in form of 'sitename:job_id'
+        :return: (bool) True if the scheduler of the site accepted the cancellation
+        """
+        sitename, _, site_job_id = job_id.partition(":")
+        if sitename not in self.sites:
+            return False
+        self.discard_queue_snapshot()
+        return self.sites[sitename].cancel(site_job_id)
+
+    def get_total_number_of_cores(self, machine_script):
+        """
+        Federation specific method that scans the machine_script and returns total number of cores
+        used for calculation
+
+        :param machine_script: (str) machine script lines
+        :return: (int) total number of cores
+        """
+        sitename = self.get_site(machine_script)
+        if sitename is None:
+            return 1
+        return self.sites[sitename].get_total_number_of_cores(machine_script)
+
+
+def decode(output):
+    """
+    :param output: (bytes) output of a shell command
+    :return: (str) decoded output
+    """
+    return output.decode(errors="replace") if output else ""
+
+
+def parse_qstat_xml(stream):
+    """
+    - parses the output of 'qstat -xml' incrementally, every job element is discarded once it has been read
+
+    :param stream: (file object) binary stream, e.g. stdout of 'qstat -xml'
+    :return: (dict) dictionary in form of {job_id: state}. Empty if the output is not valid XML, e.g. if qstat is missing
+    """
+    snapshot = {}
+    try:
+        for event, element in ElementTree.iterparse(stream):
+            if element.tag == "job_list":
+                job_id = element.findtext("JB_job_number")
+                if job_id:
+                    snapshot[job_id.strip()] = (element.findtext("state") or "").strip()
+                element.clear()
+    except ElementTree.ParseError:
+        pass
+    return snapshot
+
+
+def run_command(command, cwd=None, name=None):
+    """
+    - runs shell command, e.g. of the scheduler, and times it if instrumentation is enabled
+
+    :param command: (str) shell command
+    :param cwd: (str) working directory of command. If None, current working directory is used
+    :param name: (str) name of timer. If None, the name of the executable is used
+    :return: (bytes, bytes) tuple of stdout and stderr
+    """
+    if name is None:
+        name = os.path.basename(command.split()[0])
+    with instrumentation.timer("scheduler." + name):
+        cmd = subprocess.Popen(command, shell=True, cwd=cwd, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+        output, err = cmd.communicate()
+    return output, err
+
+
+def get_scheduler(machinename):
+    """
+    :param machinename: (str) name of machine, i.e. directory name of its config.yaml and machinescripts
+    :return: (strucscan.scheduler.GeneralScheduler object) scheduler given by 'scheduler' in config.yaml
+    """
+    try:
+        scheduler_name = get_machine_configuration_dict(machinename)["scheduler"].lower()
+    except KeyError:
+        raise KeyError("Scheduler name not set in config.yaml.")
+    if (scheduler_name == "sge") or (scheduler_name == "sungridengine"):
+        return SunGridEngine(machinename)
+    elif scheduler_name == "slurm":
+        return Slurm(machinename)
+    elif scheduler_name == "noqueue":
+        return NoQueue(machinename)
+    elif (scheduler_name == "localpool") or (scheduler_name == "local pool"):
+        return LocalPool(machinename)
+    elif scheduler_name == "federation":
+        return Federation(machinename)
+    return None
+
+
 def get_machine_configuration_dict(machinename):
     """
+    - if the config.yaml contains a 'fake scheduler' entry, the commands of the scheduler are replaced
+    by the stand-ins of strucscan.fakescheduler
+
     :return: (dict) machine configuration dictionary
     """
     try:
@@ -368,6 +1021,9 @@ def get_machine_configuration_dict(machinename):
         MACHINE_CONFIGURATION_PATH = "{}/machineconfig/{}".format(configurations["RESOURCE_PATH"], machinename)
         with open(MACHINE_CONFIGURATION_PATH + "/config.yaml", "r") as stream:
             machine_configuration_dict = yaml.safe_load(stream)
+        if "fake scheduler" in machine_configuration_dict:
+            from strucscan import fakescheduler
+            fakescheduler.install(machine_configuration_dict["fake scheduler"])
         return machine_configuration_dict
     except Exception as err:
         raise err
@@ -0,0 +1,360 @@
+from collections import namedtuple
+from itertools import chain
+import os
+
+from ase import Atoms, io
+from ase.data import atomic_masses
+from ase.io.cfg import cfg_default_fields
+
+import numpy as np
+
+FORMATS = ["vasp", "cfg"]
+
+# content of an extended CFG file as read by parse_cfg
+CfgData = namedtuple("CfgData", ["cell", "masses", "symbols", "entries", "velocities", "auxiliary"])
+
+# {(path, size, modification time): CfgData}
+structure_cache = {}
+
+
+def get_symbol_count(symbols):
+    """
+    :param symbols: (str list) chemical symbols of atoms
+    :return: (list) of (str, int) tuples of consecutive chemical symbols and their number, e.g. [('Ni', 3), ('Al', 1)]
+    """
+    symbol_count = []
+    for symbol in symbols:
+        if symbol_count and (symbol_count[-1][0] == symbol):
+            symbol_count[-1] = (symbol, symbol_count[-1][1] + 1)
+        else:
+            symbol_count.append((symbol, 1))
+    return symbol_count
+
+
+def format_poscar(atoms, species_lines=None):
+    """
+    - POSCAR in the layout of ase.io.write(..., format='vasp'): VASP 5 species line, scaling factor 1,
+    cartesian coordinates
+    - the positions of all atoms are formatted in one call
+
+    :param atoms: (ASE atoms object)
+    :param species_lines: (str, str) label line and species-and-count lines, see get_poscar_species_lines.
+    If None, they are determined from atoms
+    :return: (str) content of POSCAR. None if atoms has constraints or momenta, which are left to ase.io.write
+    """
+    if atoms.constraints or atoms.has("momenta"):
+        return None
+    if atoms.cell.rank < 3:
+        raise RuntimeError("Lattice vectors must be finite and non-parallel. At least one lattice length or angle "
+                           "is zero.")
+    if species_lines is None:
+        species_lines = get_poscar_species_lines(atoms)
+    label, counts = species_lines
+    return "".join([label,
+                    "{:19.16f}\n".format(1.0),
+                    "  %21.16f %21.16f %21.16f\n" * 3 % tuple(atoms.cell.array.ravel().tolist()),
+                    counts,
+                    "Cartesian\n",
+                    " %19.16f %19.16f %19.16f\n" * len(atoms) % tuple(atoms.positions.ravel().tolist())])
+
+
+def get_poscar_species_lines(atoms):
+    """
+    :param atoms: (ASE atoms object)
+    :return: (str, str) label line and species-and-count lines of POSCAR
+    """
+    symbol_count = get_symbol_count(atoms.get_chemical_symbols())
+    label = " ".join(["{:2s}".format(symbol) for symbol, count in symbol_count]) + "\n"
+    counts = " " + " ".join(["{:3s}".format(symbol) for symbol, count in symbol_count]) + "\n " + \
+             " ".join(["{:3d}".format(count) for symbol, count in symbol_count]) + "\n"
+    return label, counts
+
+
+def format_cfg(atoms, species_columns=None):
+    """
+    - extended AtomEye CFG in the layout of ase.io.write(..., format='cfg'), including velocities and per-atom
+    arrays such as initial magnetic moments as auxiliary entries
+    - the entries of all atoms are formatted in one call
+
+    :param atoms: (ASE atoms object)
+    :param species_columns: (list, list) atomic masses and chemical symbols of all atoms. If None,
+    they are determined from atoms
+    :return: (str) content of CFG file
+    """
+    if species_columns is None:
+        species_columns = get_cfg_species_columns(atoms)
+    masses, symbols = species_columns
+
+    lines = ["Number of particles = %i\n" % len(atoms),
+             "A = 1.0 Angstrom\n"]
+    cell = atoms.get_cell(complete=True)
+    for i in range(3):
+        for j in range(3):
+            lines.append("H0(%1.1i,%1.1i) = %f A\n" % (i + 1, j + 1, cell[i, j]))
+
+    columns = list(atoms.get_scaled_positions().T)
+    template = "%f\n%s\n%e %e %e "
+    velocities = atoms.get_velocities()
+    if isinstance(velocities, np.ndarray):
+        # ASE returns zero velocities if atoms has no momenta
+        columns += list(velocities.T)
+        template += " %e %e %e "
+    else:
+        lines.append(".NO_VELOCITY.\n")
+    auxiliary = []
+    for name, aux in atoms.arrays.items():
+        if name in cfg_default_fields:
+            continue
+        if len(aux.shape) == 1:
+            auxiliary.append("auxiliary[%i] = %s [a.u.]\n" % (len(auxiliary), name))
+            columns.append(aux)
+        else:
+            for j in range(aux.shape[1]):
+                if aux.shape[1] == 3:
+                    suffix = chr(ord("x") + j)
+                else:
+                    suffix = "%1.1i" % j
+                auxiliary.append("auxiliary[%i] = %s_%s [a.u.]\n" % (len(auxiliary), name, suffix))
+                columns.append(aux[:, j])
+    lines.append("entry_count = %i\n" % len(columns))
+    lines += auxiliary
+
+    template += " %e" * len(auxiliary) + "\n"
+    values = chain.from_iterable(zip(masses, symbols, *[np.asarray(column).tolist() for column in columns]))
+    lines.append(template * len(atoms) % tuple(values))
+    return "".join(lines)
+
+
+def get_cfg_species_columns(atoms):
+    """
+    :param atoms: (ASE atoms object)
+    :return: (list, list) atomic masses and chemical symbols of all atoms in CFG file
+    """
+    return atomic_masses[atoms.numbers].tolist(), atoms.get_chemical_symbols()
+
+
+def write_structures(images, fnames, _format):
+    """
+    - writes structure files identical to those of ase.io.write, see format_poscar and format_cfg
+    - the species lines are determined once for all images with the same chemical symbols,
+    e.g. the images of an E-V curve
+
+    :param images: (list) ASE atoms objects
+    :param fnames: (str list) paths of structure files, one per image
+    :param _format: (str) 'vasp' or 'cfg'. Other ase.io file formats are written by ase.io.write
+    :return: 0
+    """
+    species = {}
+    for atoms, fname in zip(images, fnames):
+        content = None
+        if _format in FORMATS:
+            key = atoms.numbers.tobytes()
+            if key not in species:
+                if _format == "vasp":
+                    species[key] = get_poscar_species_lines(atoms)
+                else:
+                    species[key] = get_cfg_species_columns(atoms)
+            if _format == "vasp":
+                content = format_poscar(atoms, species_lines=species[key])
+            else:
+                content = format_cfg(atoms, species_columns=species[key])
+        if content is None:
+            io.write(fname, atoms, format=_format)
+        else:
+            with open(fname, "w") as f:
+                f.write(content)
+    return
+
+
+def write_structure(atoms, fname, _format):
+    """
+    - see write_structures
+
+    :param atoms: (ASE atoms object)
+    :param fname: (str) path of structure file
+    :param _format: (str) 'vasp' or 'cfg'. Other ase.io file formats are written by ase.io.write
+    :return: 0
+    """
+    write_structures([atoms], [fname], _format)
+    return
+
+
+def tokenize_cfg(text):
+    """
+    - splits an extended CFG file into header values, species columns and entry lines. The entry lines are
+    converted to numbers by the caller, see load_cfgs
+
+    :param text: (str) content of CFG file
+    :return: (tuple) cell (3x3 array), masses (float list), symbols (str list), entry lines (str list),
+    velocities (bool), auxiliary names (str list) and number of entries per atom.
+    None if file is not in extended CFG format or uses keys that are left to ase.io.read, e.g. 'Transform'
+    """
+    lines = text.splitlines()
+    nat = None
+    entry_count = None
+    velocities = True
+    auxiliary = {}
+    cell = np.zeros((3, 3))
+    start = len(lines)
+    for ind, line in enumerate(lines):
+        line = line.strip()
+        if (not line) or line.startswith("#"):
+            continue
+        if line == ".NO_VELOCITY.":
+            velocities = False
+            continue
+        if "=" not in line:
+            start = ind
+            break
+        key, value = [s.strip() for s in line.split("=", 1)]
+        if key == "Number of particles":
+            nat = int(value.split()[0])
+        elif key == "entry_count":
+            entry_count = int(value.split()[0])
+        elif key.startswith("H0("):
+            i, j = [int(x) for x in key[3:-1].split(",")]
+            cell[i - 1, j - 1] = float(value.split()[0])
+        elif key.startswith("auxiliary["):
+            auxiliary[int(key[10:-1])] = value.split()[0]
+        elif key != "A":
+            return None
+    if (nat is None) or (entry_count is None):
+        return None
+
+    masses = []
+    symbols = []
+    entries = []
+    mass = None
+    symbol = None
+    for line in lines[start:]:
+        line = line.strip()
+        if (not line) or line.startswith("#"):
+            continue
+        if len(line.split(None, 1)) > 1:
+            if (mass is None) or (symbol is None):
+                # standard CFG format with mass and symbol in every line
+                return None
+            masses.append(mass)
+            symbols.append(symbol)
+            entries.append(line)
+        elif line[0].isalpha():
+            symbol = line
+        else:
+            mass = float(line)
+    if len(entries) != nat:
+        return None
+    return cell, masses, symbols, entries, velocities, [auxiliary.get(i, "") for i in range(len(auxiliary))], \
+           entry_count
+
+
+def get_cache_key(fname):
+    """
+    :param fname: (str) path of structure file
+    :return: (tuple) path, size and modification time of file
+    """
+    stat = os.stat(fname)
+    return os.path.abspath(fname), stat.st_size, stat.st_mtime_ns
+
+
+def load_cfgs(fnames):
+    """
+    - reads extended CFG files into the structure cache, so they are parsed only once per run,
+    e.g. when the same prototype is decorated for several properties
+    - each file is tokenized once. The entries of all files that are not cached yet are converted to numbers
+    in one call, so many small prototype files are loaded in one batch
+    - files that cannot be parsed are skipped. They are left to ase.io.read, see read_cfg
+
+    :param fnames: (str list) paths of CFG files
+    :return: (list) strucscan.structio.CfgData for every file, None for files that cannot be parsed
+    """
+    keys = []
+    pending = {}
+    for fname in fnames:
+        try:
+            key = get_cache_key(fname)
+        except OSError:
+            keys.append(None)
+            continue
+        keys.append(key)
+        if (key in structure_cache) or (key in pending):
+            continue
+        try:
+            with open(fname, "r") as f:
+                tokens = tokenize_cfg(f.read())
+        except (OSError, ValueError, IndexError):
+            tokens = None
+        if tokens is not None:
+            pending[key] = tokens
+
+    entries = [line for tokens in pending.values() for line in tokens[3]]
+    values = None
+    if entries:
+        try:
+            values = np.loadtxt(entries, ndmin=2)
+        except ValueError:
+            # rows of different length: files are converted one by one
+            pass
+    offset = 0
+    for key, (cell, masses, symbols, lines, velocities, auxiliary, entry_count) in pending.items():
+        if not lines:
+            array = np.zeros((0, entry_count))
+        elif values is not None:
+            array = values[offset:offset + len(lines)]
+        else:
+            try:
+                array = np.loadtxt(lines, ndmin=2)
+            except ValueError:
+                array = None
+        offset += len(lines)
+        if (array is None) or (array.shape[1] != entry_count):
+            continue
+        structure_cache[key] = CfgData(cell, np.array(masses), symbols, array, velocities, auxiliary)
+    return [structure_cache.get(key) for key in keys]
+
+
+def read_cfg(fname):
+    """
+    - reads an extended CFG file via the structure cache, see load_cfgs
+    - returns the same atoms object as ase.io.read(..., format='cfg'), which is used for files that
+    cannot be parsed
+
+    :param fname: (str) path of CFG file
+    :return: (ASE atoms object)
+    """
+    data = load_cfgs([fname])[0]
+    if data is None:
+        return io.read(fname, format="cfg")
+    return get_atoms_from_cfg_data(data)
+
+
+def get_atoms_from_cfg_data(data):
+    """
+    :param data: (strucscan.structio.CfgData) content of CFG file
+    :return: (ASE atoms object) new atoms object
+    """
+    kwargs = {}
+    offset = 3
+    if data.velocities:
+        kwargs["momenta"] = data.masses.reshape(-1, 1) * data.entries[:, 3:6]
+        offset = 6
+    atoms = Atoms(symbols=data.symbols, masses=data.masses, scaled_positions=data.entries[:, :3],
+                  cell=data.cell, pbc=True, **kwargs)
+    aux = data.entries[:, offset:]
+    i = 0
+    while i < len(data.auxiliary):
+        name = data.auxiliary[i]
+        if name[-2:] == "_x":
+            atoms.set_array(name[:-2], aux[:, i:i + 3].copy())
+            i += 3
+        else:
+            atoms.set_array(name, aux[:, i].copy())
+            i += 1
+    return atoms
+
+
+def clear_structure_cache():
+    """
+    :return: 0
+    """
+    structure_cache.clear()
+    return
@@ -1,3 +1,4 @@
+import base64
 import json
 import yaml
 import numpy as np
@@ -10,6 +11,7 @@ from ase import Atoms
 from ase import io
 
 from strucscan.resources import atomicdata
+from strucscan import structio
 
 
 SEPERATOR = "__"
@@ -18,19 +20,62 @@ alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
 
 class NumpyEncoder(json.JSONEncoder):
+    """
+    - encodes numpy arrays as base64 binary blocks in form of {"__ndarray_b64__": [shape, dtype, data]},
+    so shape and dtype are kept and no Python object is created per array element
+    - decode with strucscan.utils.decode
+    """
     def default(self, obj):
         if isinstance(obj, np.ndarray):
-            flatobj = obj.ravel()
-            if np.iscomplexobj(obj):
-                flatobj.dtype = obj.real.dtype
-            return flatobj.tolist()
+            if obj.dtype.hasobject:
+                return obj.tolist()
+            obj = np.ascontiguousarray(obj)
+            return {"__ndarray_b64__": [list(obj.shape),
+                                        obj.dtype.str,
+                                        base64.b64encode(obj.tobytes()).decode("ascii")]}
         if isinstance(obj, np.integer):
             return int(obj)
-        if isinstance(obj, np.float):
+        if isinstance(obj, np.floating):
             return float(obj)
+        if isinstance(obj, np.bool_):
+            return bool(obj)
         return json.JSONEncoder.default(self, obj)
 
 
+def _decode_object(dct):
+    if "__ndarray_b64__" in dct:
+        shape, dtype, data = dct["__ndarray_b64__"]
+        return np.frombuffer(base64.b64decode(data), dtype=dtype).reshape(shape).copy()
+    if "__ndarray__" in dct:
+        # format of ase.io.jsonio, used by output dicts of earlier strucscan versions
+        shape, dtype, data = dct["__ndarray__"]
+        array = np.empty(shape, dtype=dtype)
+        flatbuf = array.ravel()
+        if np.iscomplexobj(array):
+            flatbuf.dtype = array.real.dtype
+        flatbuf[:] = data
+        return array
+    return dct
+
+
+def encode(obj):
+    """
+    :param obj: (dict) e.g. result dict with numpy arrays
+    :return: (str) JSON string, numpy arrays are stored as base64 binary blocks
+    """
+    return json.dumps(obj, cls=NumpyEncoder)
+
+
+def decode(text):
+    """
+    - decodes JSON strings written by strucscan.utils.encode or ase.io.jsonio.encode
+
+    :param text: (str) JSON string
+    :return: (dict) e.g. result dict with numpy arrays
+    """
+    return json.loads(text, object_hook=_decode_object)
+
+
 def get_resource_file_path():
     return os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
 
@@ -92,6 +137,152 @@ def SLEEP_TIME():
         return 60
 
 
+def DATA_TREE_SHARDING():
+    """
+    :return: (int) number of hexadecimal characters of the hash prefix directory that is inserted
+    between composition and job directory. 0 means flat data tree.
+    """
+    try:
+        return max(int(read_configuration()["DATA_TREE_SHARDING"]), 0)
+    except:
+        return 0
+
+
+def ARCHIVE_JOBS():
+    """
+    :return: (bool) True if finished job directories are packed into archives after their results were collected
+    """
+    try:
+        if read_configuration()["ARCHIVE_JOBS"] == True:
+            return True
+        return False
+    except:
+        return False
+
+
+def NPROCS_COLLECT():
+    """
+    :return: (int) number of processes that collect results of compositions in parallel. 1 means serial execution.
+    """
+    try:
+        return max(int(read_configuration()["NPROCS_COLLECT"]), 1)
+    except:
+        return 1
+
+
+def NTHREADS():
+    """
+    :return: (int) number of threads used to probe job directories and to create job files.
+    1 means serial execution.
+    """
+    try:
+        return max(int(read_configuration()["NTHREADS"]), 1)
+    except:
+        return 1
+
+
+def KEEP_CHGCAR():
+    """
+    :return: (bool) True if VASP jobs with a single structure keep their compressed CHGCAR, so dependent jobs start
+    from its charge density
+    """
+    try:
+        if read_configuration()["KEEP_CHGCAR"] == True:
+            return True
+        return False
+    except:
+        return False
+
+
+def KEEP_WAVECAR():
+    """
+    :return: (bool) True if VASP jobs keep their compressed WAVECAR, so dependent jobs start from its wave functions
+    """
+    try:
+        if read_configuration()["KEEP_WAVECAR"] == True:
+            return True
+        return False
+    except:
+        return False
+
+
+def PARALLEL_RESTARTS():
+    """
+    :return: (bool) True if the missing images of failed jobs with multiple structures are restarted
+    as independent sub-jobs
+    """
+    try:
+        if read_configuration()["PARALLEL_RESTARTS"] == True:
+            return True
+        return False
+    except:
+        return False
+
+
+def JOURNAL_COMPACT_SIZE():
+    """
+    :return: (int) number of collected results in the results journal of a composition
+    after which the journal is compacted into the output dict
+    """
+    try:
+        return max(int(read_configuration()["JOURNAL_COMPACT_SIZE"]), 1)
+    except:
+        return 50
+
+
+def RESOURCE_PLANNER():
+    """
+    :return: (str or bool) 'core-hours' or 'turnaround' if queue, number of cores and number of nodes of new jobs
+    are chosen from the runtimes of finished jobs, see strucscan.core.planner. False if disabled
+    """
+    try:
+        objective = str(read_configuration()["RESOURCE_PLANNER"]).lower()
+        if objective in ["core-hours", "turnaround"]:
+            return objective
+        return False
+    except:
+        return False
+
+
+def METRICS_FILE():
+    """
+    :return: (str or bool) path of JSON-lines file the monitoring metrics are written to.
+    False if instrumentation is disabled, True if default file name should be used.
+    """
+    try:
+        return read_configuration()["METRICS_FILE"]
+    except:
+        return False
+
+
+def METRICS_SAMPLE_RATE():
+    try:
+        return float(read_configuration()["METRICS_SAMPLE_RATE"])
+    except:
+        return 1.
+
+
+def DAEMON_SOCKET():
+    """
+    :return: (str) path of the Unix socket of the strucscan daemon, see strucscan.core.daemon
+    """
+    try:
+        return os.path.expanduser(str(read_configuration()["DAEMON_SOCKET"]))
+    except:
+        return os.path.expanduser("~/.strucscan.sock")
+
+
+def STATUS_FILE():
+    """
+    :return: (str or bool) path of JSON-lines file the status transitions of the jobs are written to.
+    False if no file is written, True if default file name should be used
+    """
+    try:
+        return read_configuration()["STATUS_FILE"]
+    except:
+        return False
+
+
 def get_calc(engine_name, input_dict):
     """
     - assigns 'engine_name' to strucscan.core.engine.GeneralEngine object
@@ -108,7 +299,7 @@ def get_calc(engine_name, input_dict):
         from strucscan.engine.vasp import Vasp
         calc = Vasp(input_dict)
     else:
-        raise("Engine not known. Exiting.")
+        raise KeyError("Engine {} not known.".format(engine_name))
     return calc
 
 
@@ -130,10 +321,22 @@ def get_structpath(prototype_name):
 
 def parse_prototypefile(structpath):
     """
+    - read via the structure cache, see strucscan.structio.load_cfgs
+
     :param structpath: (str) absolute path to structure file in prototype cfg format (contains 'eleA, eleB', ...)
     :return: tuple of structure cell (3x3 list) and position dictionary
     in form {elmA: list(atomA1, atomA2, ...),  elmB: list(atomB1, atomB2, ...)}
     """
+    data = structio.load_cfgs([structpath])[0]
+    if data is not None:
+        positions_dict = {}
+        for symbol, position in zip(data.symbols, data.entries[:, :3].tolist()):
+            if symbol.lower()[:3] == "ele":
+                positions_dict.setdefault(symbol[3].upper(), []).append(position)
+        if positions_dict == {}:
+            raise ValueError("Could not parse structure from file. File not in cfg format?")
+        return data.cell.tolist(), positions_dict
+
     with open(structpath, "r") as f:
         lines = f.readlines()
     positions_dict = {}
@@ -205,6 +408,9 @@ def get_positions_dict_from_structure_file(structpath, _format):
     """
     if _format == "prototype":
         cell, positions_dict = parse_prototypefile(structpath)
+    elif _format == "cfg":
+        atoms = structio.read_cfg(structpath)
+        positions_dict = get_positions_dict_from_atoms(atoms)
     else:
         atoms = io.read(structpath, format=_format)
         positions_dict = get_positions_dict_from_atoms(atoms)
@@ -305,6 +511,8 @@ def get_new_chemical_formula(positions_dict, species):
 
 def read_structure_from_file(structpath, species, _format):
     """
+    - cfg and prototype files are read only once per run, see strucscan.structio.load_cfgs
+
     :param structpath: (str) absolute path to structure file
     :param species: (str) chemical species, e.g. 'Ni Al'
     :param _format: (str) ase.io file format or 'prototype' format
@@ -314,11 +522,14 @@ def read_structure_from_file(structpath, species, _format):
     if _format == "prototype":
         cell, positions_dict = parse_prototypefile(structpath)
         positions = [p for elm in positions_dict for p in positions_dict[elm]]
-        formula = get_new_chemical_formula_from_stucture_file(structpath, species, _format)
+        formula = get_new_chemical_formula(positions_dict, species)
         atoms = Atoms(formula, positions=positions, cell=cell)
     else:
-        atoms = io.read(structpath, format=_format)
-        formula = get_new_chemical_formula_from_stucture_file(structpath, species, _format)
+        if _format == "cfg":
+            atoms = structio.read_cfg(structpath)
+        else:
+            atoms = io.read(structpath, format=_format)
+        formula = get_new_chemical_formula_from_atoms(atoms, species)
         numbers = re.findall(r'\d+', formula)
         symbols = [s for s in re.split(r'(\d+)', formula) if not s.isdigit()]
         new_chemical_symbols = [symbol for number, symbol in zip(numbers, symbols) for n in range(int(number))]
@@ -352,11 +563,15 @@ def get_nspecies(atoms):
     return nspecies
 
 
-def get_initial_atvolume(atoms, initial_atvolumes):
+def get_initial_atvolume(atoms, initial_atvolumes, prototype=None, engine=None):
     """
     :param atoms: (ASE atoms object)
     :param initial_atvolumes: (str) initial atomic volume per specie given by user, e.g. "11.2 13.4".
     Type "default" or "d" in order to user default atomic volumes.
+    Type "learned" or "l" in order to use atomic volumes learned from collected results,
+    see strucscan.core.volumecache
+    :param prototype: (str) name of prototype, used to look up learned atomic volumes
+    :param engine: (str) name of engine, used to look up learned atomic volumes
     :return: (float) initial atomic volume determined by sum([n_i * V_i])
     where n_i is the number of atoms of specie i and V_i is the initial atomic volume for specie i
     """
@@ -366,7 +581,10 @@ def get_initial_atvolume(atoms, initial_atvolumes):
         # do not scale structures
         return False
     elif isinstance(initial_atvolumes, str):
-        if initial_atvolumes.split()[0][0].lower() == "d":
+        if initial_atvolumes.split()[0][0].lower() == "l":
+            from strucscan.core import volumecache
+            return volumecache.get_initial_atvolume(atoms, prototype=prototype, engine=engine)
+        elif initial_atvolumes.split()[0][0].lower() == "d":
             symbols = get_symbol_dict(atoms)
             initial_atvolumes = []
             for symbol in symbols:
@@ -387,17 +605,20 @@ def get_initial_atvolume(atoms, initial_atvolumes):
         return init_atvolume
 
 
-def scale_by_atvolume(atoms, initial_atvolumes, structpath=""):
+def scale_by_atvolume(atoms, initial_atvolumes, structpath="", prototype=None, engine=None):
     """
     :param atoms: (ASE atoms object)
     :param structpath: (str) absolute path of structure file
     :param initial_atvolumes: (str) initial atomic volume per specie given by user, e.g. "11.2 13.4".
-    Type "default" or "d" in order to user default atomic volumes.
+    Type "default" or "d" in order to user default atomic volumes, "learned" or "l" in order to use
+    atomic volumes learned from collected results.
+    :param prototype: (str) name of prototype, used to look up learned atomic volumes
+    :param engine: (str) name of engine, used to look up learned atomic volumes
     :return: (ASE atoms object) position scaled atoms object
     """
     cell = atoms.get_cell()
     n_at = len(atoms)
-    _initial_atvolumes = get_initial_atvolume(atoms, initial_atvolumes)
+    _initial_atvolumes = get_initial_atvolume(atoms, initial_atvolumes, prototype=prototype, engine=engine)
     if not _initial_atvolumes:
         return atoms
     else:
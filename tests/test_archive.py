@@ -0,0 +1,49 @@
+import gzip
+import io
+import os
+import shutil
+
+from ase.build import bulk
+
+from strucscan.core import archive
+
+
+def test_archive_jobdir(tmp_path):
+    jobpath = str(tmp_path / "static__fcc__Al")
+    os.makedirs(jobpath + "/image-0")
+    contents = {"end.dat": b"stop\n",
+                "log.out": b"This is a dummy log file.\n" * 500,
+                "image-0/log.out": b"image\n"}
+    for name, content in contents.items():
+        with open(jobpath + "/" + name, "wb") as f:
+            f.write(content)
+    with gzip.open(jobpath + "/OUTCAR.gz", "wb") as f:
+        f.write(b"Total CPU time used (sec): 1.0\n")
+    bulk("Al", "fcc", a=4.05).write(jobpath + "/final.cfg", format="cfg")
+    with open(jobpath + "/final.cfg", "rb") as f:
+        contents["final.cfg"] = f.read()
+
+    archive.archive_jobdir(jobpath)
+    assert not os.path.exists(jobpath)
+    assert archive.is_archived(jobpath)
+    assert sorted(archive.listdir(jobpath)) == ["OUTCAR.gz", "end.dat", "final.cfg", "log.out"]
+
+    for name, content in contents.items():
+        assert archive.read_member(jobpath, name) == content
+    assert archive.read_index(jobpath)["log.out"][2] == True
+    with archive.open_file(jobpath + "/OUTCAR.gz") as f:
+        assert "Total CPU time used" in f.read()
+
+    # members are streamed, e.g. to restore restart files
+    stream = io.BytesIO()
+    with archive.open_file(jobpath + "/log.out", binary=True) as f:
+        shutil.copyfileobj(f, stream, 1000)
+    assert f.closed
+    assert stream.getvalue() == contents["log.out"]
+    with archive.open_file(jobpath + "/image-0/log.out") as f:
+        assert f.readline() == "image\n"
+        assert f.readline() == ""
+
+    atoms = archive.read_structure(jobpath + "/final.cfg", format="cfg")
+    assert len(atoms) == 1
+    assert abs(atoms.get_volume() - 4.05 ** 3 / 4) < 1e-6
@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+
+from strucscan.core import statusmanager
+from strucscan.core.daemon import Daemon, send_request, FINISHED, CANCELLED
+from strucscan.resources.inputyaml import DUMMY
+from strucscan.utils import PROJECT_PATH
+
+
+def wait_for_state(socket_path, scan_id, timeout=60):
+    start = time.time()
+    while time.time() - start < timeout:
+        response = send_request({"command": "status", "scan": scan_id}, socket_path=socket_path)
+        if response["scan"]["state"] != "active":
+            return response
+        time.sleep(0.2)
+    return None
+
+
+def test_daemon(tmp_path):
+    socket_path = str(tmp_path / "strucscan.sock")
+    daemon = Daemon(socket_path=socket_path, sleep_time=0.2)
+    thread = threading.Thread(target=daemon.serve, daemon=True)
+    thread.start()
+    start = time.time()
+    while (not os.path.exists(socket_path)) and (time.time() - start < 10):
+        time.sleep(0.05)
+
+    input_dict = DUMMY().EXAMPLE
+    input_dict.update({"species": "Cu", "machine": "localpool", "properties": "static"})
+    response = send_request({"command": "submit", "input": input_dict, "name": "static.yaml"}, socket_path=socket_path)
+    assert response == {"ok": True, "scan": "1"}
+    input_dict.update({"properties": "static atomic total"})
+    assert send_request({"command": "submit", "input": input_dict}, socket_path=socket_path)["scan"] == "2"
+    # both scans share the pool of local processes
+    assert list(daemon.schedulers) == ["localpool"]
+    assert daemon.scans["1"].jobmanager.calc.get_scheduler() is daemon.scans["2"].jobmanager.calc.get_scheduler()
+
+    response = wait_for_state(socket_path, "1")
+    assert response["scan"]["state"] == FINISHED
+    assert response["jobs"] == [{"jobpath": PROJECT_PATH() + "/DUMMY/Cu/static__fcc__Cu",
+                                 "status": statusmanager.FINISHED, "job_id": None}]
+
+    # the second scan is stopped and its running job is terminated
+    response = send_request({"command": "cancel", "scan": "2"}, socket_path=socket_path)
+    assert response["ok"]
+    assert send_request({"command": "status"}, socket_path=socket_path)["scans"][1]["state"] == CANCELLED
+    assert send_request({"command": "cancel", "scan": "3"}, socket_path=socket_path) == \
+           {"ok": False, "error": "Unknown scan 3."}
+
+    assert send_request({"command": "shutdown"}, socket_path=socket_path) == {"ok": True}
+    thread.join(timeout=10)
+    assert not os.path.exists(socket_path)
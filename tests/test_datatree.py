@@ -0,0 +1,29 @@
+import os
+
+from strucscan.core import datatree
+
+
+def test_migrate_data_tree(tmp_path):
+    data_tree_path = str(tmp_path)
+    composition_path = data_tree_path + "/DUMMY/Al"
+    for dirname in ["static__fcc__Al", "atomic__fcc__Al"]:
+        os.makedirs(composition_path + "/" + dirname)
+
+    assert datatree.migrate_data_tree(data_tree_path, width=2) == 2
+    for dirname in ["static__fcc__Al", "atomic__fcc__Al"]:
+        shard = datatree.get_shard(dirname, width=2)
+        assert datatree.is_shard(shard)
+        assert os.path.isdir(composition_path + "/" + shard + "/" + dirname)
+        assert datatree.get_composition_path(composition_path + "/" + shard + "/" + dirname) == composition_path
+    assert sorted(name for name, path in datatree.iter_jobdirs(composition_path)) == \
+           ["atomic__fcc__Al", "static__fcc__Al"]
+
+    assert datatree.migrate_data_tree(data_tree_path, width=0) == 2
+    assert sorted(os.listdir(composition_path)) == ["atomic__fcc__Al", "static__fcc__Al"]
+
+
+def test_parse_absolute_path():
+    for jobpath in ["/somewhere/data/DUMMY/AlNi/static__fcc__AlNi",
+                    "/somewhere/data/DUMMY/AlNi/3f/static__fcc__AlNi/"]:
+        assert datatree.parse_absolute_path(jobpath) == ("DUMMY", "AlNi", "static", "fcc", "AlNi")
+    assert datatree.get_jobname("eos_total__fcc__L12__Al3Ni.tar") == "eos_total__fcc_L12__Al3Ni"
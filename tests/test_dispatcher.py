@@ -0,0 +1,67 @@
+from ase.build import bulk
+
+from strucscan.core import dispatcher, statusmanager
+from strucscan.core.jobobject import JobObject
+from strucscan.engine.dummy import DummyEngine
+from strucscan.resources.inputyaml import DUMMY
+
+
+def get_jobobject(tmp_path, composition, dirname, status=statusmanager.NOT_EXISTING, conditional_files="", natoms=1):
+    jobobject = JobObject("Al", dirname.split("__")[0], jobpath=str(tmp_path / "DUMMY" / composition / dirname),
+                          basis_ref_atoms=bulk("Al").repeat((natoms, 1, 1)), stochio=dirname.split("__")[-1],
+                          status_index=0, status=status, conditional_files=conditional_files)
+    return jobobject
+
+
+def get_dispatcher(**kwargs):
+    calc = DummyEngine(DUMMY().EXAMPLE)
+    calc.set_scheduler()
+    return dispatcher.Dispatcher(calc, "serial", **kwargs)
+
+
+def select(_dispatcher, job_list, ready, get_queuename=lambda jobobject: "serial"):
+    for jobobject in ready:
+        _dispatcher.add_ready(jobobject)
+    return [jobobject.get_jobpath().split("/")[-1] for jobobject in _dispatcher.select(job_list, get_queuename)]
+
+
+def test_submission_limits():
+    machine_configuration_dict = {"max submitted jobs": 10,
+                                  "queues": {"parallel12": {"ncores": 12, "max submitted jobs": 2}, "serial": None}}
+    assert dispatcher.get_submission_limits(machine_configuration_dict) == (10, {"parallel12": 2})
+    assert dispatcher.get_submission_limits({}) == (None, {})
+    assert dispatcher.parse_priority_weights("eos_total=2 fcc=0.5") == {"eos_total": 2., "fcc": 0.5}
+
+
+def test_critical_path_and_fair_share(tmp_path):
+    running = get_jobobject(tmp_path, "Al", "atomic__bcc__Al", status=statusmanager.RUNNING)
+    # static__fcc__Al starts a chain of three jobs, static__hcp__Al2 is larger but has no dependent jobs
+    chain = get_jobobject(tmp_path, "Al", "static__fcc__Al")
+    total = get_jobobject(tmp_path, "Al", "total__fcc__Al", conditional_files=chain.get_jobpath())
+    eos = get_jobobject(tmp_path, "Al", "eos_total__fcc__Al", conditional_files=total.get_jobpath())
+    large = get_jobobject(tmp_path, "Al", "static__hcp__Al2", natoms=2)
+    other = get_jobobject(tmp_path, "Ni", "static__fcc__Ni")
+    job_list = [running, chain, total, eos, large, other]
+
+    # one slot left: longest chain first
+    assert select(get_dispatcher(max_jobs=2), job_list, [chain, large, other]) == ["static__fcc__Al"]
+    # two slots left: composition Ni has no job in flight and is preferred over the second job of Al
+    assert select(get_dispatcher(max_jobs=3), job_list, [chain, large, other]) == \
+           ["static__fcc__Al", "static__fcc__Ni"]
+    # user weights
+    assert select(get_dispatcher(max_jobs=2, weights={"hcp": 100.}), job_list, [chain, large, other]) == \
+           ["static__hcp__Al2"]
+
+
+def test_queue_limits(tmp_path):
+    running = get_jobobject(tmp_path, "Al", "atomic__bcc__Al", status=statusmanager.QUEUED)
+    ready = [get_jobobject(tmp_path, "Al", "static__fcc__Al"), get_jobobject(tmp_path, "Al", "static__hcp__Al2")]
+    get_queuename = lambda jobobject: "parallel12" if "hcp" in jobobject.get_jobpath() else "serial"
+    _dispatcher = get_dispatcher(max_jobs_per_queue={"serial": 1})
+    assert select(_dispatcher, [running] + ready, ready, get_queuename) == ["static__hcp__Al2"]
+
+    # submitted jobs that have not started yet are in flight and are not submitted again in the next cycle
+    assert select(_dispatcher, [running] + ready, ready, get_queuename) == []
+    running.set_status_index_job_id(1, statusmanager.FINISHED, None)
+    ready[1].set_status_index_job_id(0, statusmanager.QUEUED, None)
+    assert select(_dispatcher, [running] + ready, ready, get_queuename) == ["static__fcc__Al"]
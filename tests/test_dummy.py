@@ -23,4 +23,4 @@ def test_dummy():
     assert len(os.listdir(PROJECT_PATH() + "/DUMMY/Al/total__fcc__Al")) == 8
 
     assert os.path.exists(PROJECT_PATH() + "/DUMMY/Al/eos_total__fcc__Al") == True
-    assert len(os.listdir(PROJECT_PATH() + "/DUMMY/Al/eos_total__fcc__Al")) == 27
+    assert len(os.listdir(PROJECT_PATH() + "/DUMMY/Al/eos_total__fcc__Al")) == 28  # including image ledger
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import time
+
+from strucscan import fakescheduler
+from strucscan.scheduler import Slurm, SunGridEngine
+
+
+def wait_for(scheduler, job_id, timeout=20):
+    start = time.time()
+    while time.time() - start < timeout:
+        states = {job["id"]: job["state"] for job in scheduler.get_jobs()}
+        if states[job_id] not in fakescheduler.ACTIVE_STATES:
+            return states[job_id]
+        time.sleep(0.1)
+    return None
+
+
+def test_job_transitions(tmp_path):
+    settings = {"queue latency": 100., "run time": 1., "run scripts": False, "failure rate": 0.5}
+    scheduler = fakescheduler.FakeScheduler(str(tmp_path / "state"), settings=settings)
+    job_ids = [scheduler.submit("job.sh", str(tmp_path), name="job%i" % i) for i in range(20)]
+    assert [job["state"] for job in scheduler.get_jobs()] == 20 * [fakescheduler.PENDING]
+
+    # simulated clock: all jobs have left the queue after queue latency and run time
+    state = scheduler.load()
+    now = time.time()
+    scheduler.advance(state, now=now + 100.)
+    assert {job["state"] for job in state["jobs"].values()} == {fakescheduler.RUNNING}
+    scheduler.advance(state, now=now + 101.)
+    states = [state["jobs"][job_id]["state"] for job_id in job_ids]
+    assert set(states) == {fakescheduler.COMPLETED, fakescheduler.FAILED}
+    # failures are reproducible
+    assert [scheduler.is_failing(job_id) for job_id in job_ids] == [state == fakescheduler.FAILED for state in states]
+
+    output, exit_code = scheduler.squeue(["-h", "-o", "%i %T %Z"], str(tmp_path))
+    assert output.split("\n")[0] == "{} PENDING {}".format(job_ids[0], tmp_path)
+    output, exit_code = scheduler.sacct(["--parsable2", "-j", job_ids[0], "--format=JobID,State"], str(tmp_path))
+    assert output == "JobID|State\n{}|PENDING\n".format(job_ids[0])
+    assert scheduler.cancel(job_ids[:2]) == job_ids[:2]
+    assert len(scheduler.qstat([], str(tmp_path))[0].split("\n")) == 2 + 18 + 1
+
+
+def test_slurm(tmp_path, monkeypatch):
+    # PATH is restored after the test
+    monkeypatch.setenv("PATH", os.environ["PATH"])
+    monkeypatch.setenv(fakescheduler.STATE_DIR_VARIABLE, str(tmp_path / "state"))
+    slurm = Slurm("fakeslurm")
+    scheduler = fakescheduler.FakeScheduler(str(tmp_path / "state"))
+    assert subprocess.run(["which", "sbatch"], capture_output=True, text=True).stdout.startswith(str(tmp_path))
+
+    jobpath = tmp_path / "static__fcc__Al"
+    jobpath.mkdir()
+    machine_info = {"queuename": "serial", "ncores": 1, "nnodes": 1}
+    machine_script, fname = slurm.configure_machine_script(machine_info, jobname="static__fcc__Al")
+    with open(str(jobpath / fname), "w") as f:
+        f.writelines(machine_script + ["sleep 5\n", "echo done > end.dat\n"])
+
+    job_id = slurm.submit(fname, str(jobpath))
+    assert slurm.get_queue_snapshot()[job_id][1] == str(jobpath)
+    assert slurm.is_job_id_in_queue(job_id)
+    assert slurm.get_job_id_by_jobpath(str(jobpath)) == job_id
+    assert wait_for(scheduler, job_id) == fakescheduler.COMPLETED
+    assert (jobpath / "end.dat").exists()
+    # status checks of an update cycle share one snapshot, which is refreshed here
+    slurm.get_cached_queue_snapshot(max_age=0.)
+    assert not slurm.is_job_id_in_queue(job_id)
+    assert slurm.get_job_id_by_jobpath(str(jobpath)) is None
+    assert slurm.get_accounting_states([job_id, "999"]) == {job_id: "COMPLETED"}
+
+
+def test_sge(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", os.environ["PATH"])
+    monkeypatch.setenv(fakescheduler.STATE_DIR_VARIABLE, str(tmp_path / "state"))
+    sge = SunGridEngine("fakesge")
+    scheduler = fakescheduler.FakeScheduler(str(tmp_path / "state"))
+
+    jobpath = tmp_path / "static__fcc__Al"
+    jobpath.mkdir()
+    machine_info = {"queuename": "serial", "ncores": 1, "nnodes": 1}
+    machine_script, fname = sge.configure_machine_script(machine_info, jobname="static__fcc__Al")
+    with open(str(jobpath / fname), "w") as f:
+        f.writelines(machine_script + ["sleep 5\n"])
+
+    job_id = sge.submit(fname, str(jobpath))
+    assert sge.get_queue_snapshot()[job_id] in ["qw", "r"]
+    # status checks of an update cycle share one 'qstat -xml' call
+    calls = []
+    get_queue_snapshot = sge.get_queue_snapshot
+    monkeypatch.setattr(sge, "get_queue_snapshot", lambda: calls.append(1) or get_queue_snapshot())
+    assert sge.get_queue_ids() == [job_id]
+    assert sge.is_job_id_in_queue(job_id)
+    assert sge.get_job_id_by_jobpath(str(jobpath)) == job_id
+    assert len(calls) == 1
+    assert wait_for(scheduler, job_id) == fakescheduler.COMPLETED
+    sge.get_cached_queue_snapshot(max_age=0.)
+    assert sge.get_queue_ids() == []
+    assert sge.workdirs == {job_id: str(jobpath)}
@@ -0,0 +1,48 @@
+import os
+
+from strucscan import fakescheduler
+from strucscan.core import statusmanager
+from strucscan.engine.dummy import DummyEngine
+from strucscan.resources.inputyaml import DUMMY
+from strucscan.scheduler import Federation
+
+
+def test_federation(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", os.environ["PATH"])
+    monkeypatch.setenv(fakescheduler.STATE_DIR_VARIABLE, str(tmp_path / "state"))
+    input_dict = DUMMY().EXAMPLE
+    input_dict["machine"] = "fakefederation"
+    calc = DummyEngine(input_dict)
+    calc.set_scheduler()
+    federation = calc.get_scheduler()
+    assert isinstance(federation, Federation)
+    assert list(federation.sites) == ["fakeslurm", "localpool"]
+    # second cluster addressed by the command prefix of its site
+    federation.sites["fakeslurm"].command_prefix = "{}={}".format(fakescheduler.STATE_DIR_VARIABLE,
+                                                                  tmp_path / "cluster2")
+
+    # capacities 2 and 4: routed by number of jobs per capacity, ties go to the site listed first
+    machine_info = {"queuename": "serial", "ncores": 1, "nnodes": 1}
+    jobpaths = []
+    sitenames = []
+    for i in range(6):
+        jobpath = str(tmp_path / "Al" / ("static__fcc{}__Al".format(i)))
+        os.makedirs(jobpath)
+        machine_script, fname = federation.configure_machine_script(machine_info, jobname="Al__static")
+        with open(jobpath + "/" + fname, "w") as f:
+            f.writelines(machine_script + ["sleep 3\n"])
+        jobpaths.append(jobpath)
+        sitenames.append(federation.get_site(machine_script))
+    assert sitenames == ["fakeslurm", "localpool", "localpool", "fakeslurm", "localpool", "localpool"]
+    assert federation.get_total_number_of_cores(machine_script) == 1
+
+    job_ids = [calc.submit_job(fname, jobpath) for jobpath in jobpaths]
+    assert [job_id.split(":")[0] for job_id in job_ids] == sitenames
+    cluster2_ids = [job["id"] for job in fakescheduler.FakeScheduler(str(tmp_path / "cluster2")).get_jobs()]
+    assert ["fakeslurm:" + job_id for job_id in cluster2_ids] == [job_ids[0], job_ids[3]]
+
+    assert sorted(federation.get_queue_ids()) == sorted(job_ids)
+    statuses = [statusmanager.determine_status__job_id(calc, jobpath, [])[1:] for jobpath in jobpaths]
+    assert statuses == [(statusmanager.QUEUED, job_id) for job_id in job_ids]
+    assert federation.sites["localpool"].wait(timeout=20)
+    assert not federation.is_job_id_in_queue(job_ids[1])
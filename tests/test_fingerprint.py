@@ -0,0 +1,43 @@
+from ase import io
+from ase.build import bulk
+
+from strucscan.core.fingerprint import get_fingerprint, deduplicate_structpaths
+
+
+def test_fingerprint():
+    fcc = bulk("Al", "fcc", a=4.05)
+    cubic = bulk("Al", "fcc", a=4.05, cubic=True)
+    l12 = cubic.copy()
+    l12.symbols[0] = "Ni"
+    other_l12 = cubic.copy()[[3, 1, 2, 0]]
+    other_l12.symbols[1] = "Ni"
+    other_l12.translate([0.3, 0.1, 0.7])
+    other_l12.wrap()
+
+    # independent of cell, order of atoms and origin
+    assert get_fingerprint(fcc) == get_fingerprint(cubic) == get_fingerprint(cubic * (2, 2, 2))
+    assert get_fingerprint(l12) == get_fingerprint(other_l12)
+    assert get_fingerprint(l12) != get_fingerprint(cubic)
+    assert get_fingerprint(fcc) != get_fingerprint(bulk("Al", "fcc", a=4.1))
+    assert get_fingerprint(fcc) != get_fingerprint(bulk("Al", "bcc", a=3.2))
+
+
+def test_deduplicate_structpaths(tmp_path):
+    # prototypes with two sublattices that become fcc if decorated with a single species
+    l12 = bulk("Ni", "fcc", a=3.6, cubic=True)
+    l12.symbols[0] = "Al"
+    l10 = bulk("Ni", "fcc", a=3.6, cubic=True)
+    l10.symbols[[0, 1]] = "Al"
+    structpaths = []
+    for name, atoms in [("fcc", bulk("Ni", "fcc", a=3.6)), ("L1_2", l12), ("L1_0", l10),
+                        ("bcc", bulk("Ni", "bcc", a=2.9))]:
+        structpaths.append(str(tmp_path / (name + ".cfg")))
+        io.write(structpaths[-1], atoms, format="cfg")
+
+    unique, aliases = deduplicate_structpaths(structpaths, "Al", "cfg")
+    assert unique == [structpaths[0], structpaths[3]]
+    assert aliases == {structpaths[1]: structpaths[0], structpaths[2]: structpaths[0]}
+
+    unique, aliases = deduplicate_structpaths(structpaths, "Al Ni", "cfg")
+    assert unique == structpaths
+    assert aliases == {}
@@ -0,0 +1,56 @@
+import atexit
+import json
+import os
+
+from strucscan.instrumentation import Instrumentation
+
+
+def test_instrumentation(tmp_path):
+    fname = str(tmp_path / "metrics.jsonl")
+    metrics = Instrumentation()
+    assert metrics.configure(fname=fname, sample_rate=1.) == True
+
+    @metrics.timed("probe")
+    def probe():
+        return 1
+
+    for cycle in range(2):
+        for i in range(3):
+            probe()
+        metrics.count("submitted", 2)
+        metrics.end_cycle(njobs=3)
+
+    with open(fname) as stream:
+        lines = [json.loads(line) for line in stream]
+    assert len(lines) == 2
+    assert lines[0]["timers"]["probe"]["calls"] == 3
+    assert lines[1]["counters"]["submitted"] == 2
+    assert lines[1]["njobs"] == 3
+
+    summary_fname = metrics.write_summary()
+    assert os.path.exists(summary_fname)
+    with open(summary_fname) as stream:
+        summary = json.load(stream)
+    assert summary["cycles"] == 2
+    assert summary["timers"]["probe"]["calls"] == 6
+    assert summary["counters"]["submitted"] == 4
+
+
+def test_instrumentation_disabled(tmp_path):
+    metrics = Instrumentation()
+    assert metrics.configure(fname=False) == False
+    with metrics.timer("probe"):
+        pass
+    metrics.end_cycle()
+    assert metrics.write_summary() is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_instrumentation_reconfigured(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    metrics = Instrumentation()
+    # e.g. once per scan of the daemon
+    for i in range(3):
+        assert metrics.configure(fname=str(tmp_path / "metrics-{:d}.jsonl".format(i)), sample_rate=1.) == True
+    assert registered == [metrics.write_summary]
@@ -0,0 +1,65 @@
+import subprocess
+
+from ase.build import bulk
+
+from strucscan.core import ledger
+from strucscan.engine.dummy import DummyEngine
+from strucscan.error.errorhandler import determine_missing_images
+from strucscan.resources.inputyaml import DUMMY
+
+
+def test_determine_missing_images(tmp_path):
+    jobpath = str(tmp_path)
+    files = ["POSCAR-%i" % i for i in range(11)] + ["OUTCAR-0.gz", "OUTCAR-1.gz", "OUTCAR-2.gz"]
+    # job directory without ledger
+    assert determine_missing_images(jobpath, files, r"OUTCAR-(\d+)\.gz", r"POSCAR-(\d+)") == (11, list(range(3, 11)))
+    assert determine_missing_images(jobpath, ["POSCAR"], r"OUTCAR-(\d+)\.gz", r"POSCAR-(\d+)") == (0, [])
+
+    ledger.write_ledger(jobpath, 11)
+    with open(jobpath + "/" + ledger.LEDGER_FNAME, "a") as f:
+        f.write("image: 0\nimage: 5\nimage: 5\nimag")
+    assert ledger.read_ledger(jobpath) == (11, {0, 5})
+    assert determine_missing_images(jobpath, files, r"OUTCAR-(\d+)\.gz", r"POSCAR-(\d+)")[1] == \
+           [1, 2, 3, 4, 6, 7, 8, 9, 10]
+
+
+def test_image_subjobs(tmp_path):
+    calc = DummyEngine(DUMMY().EXAMPLE)
+    jobpath = str(tmp_path)
+    nimages = 2
+    for fname in ["infile.in", "potfile.pot"]:
+        with open(jobpath + "/" + fname, "w") as f:
+            f.write("\n")
+    for index in range(nimages):
+        calc.write_structure(bulk("Al", "fcc", a=4.05), jobpath, structfilename="structure-%i.cfg" % index)
+    ledger.write_ledger(jobpath, nimages)
+
+    footer = ["STOP=`date`\n", "echo \"stop: $STOP  $HOSTNAME\" >> end.dat "]
+    call = calc.machine_configuration_dict["DUMMY"]["serial"].split("\n")[-2]
+    for index in range(nimages):
+        image_path = ledger.make_image_dir(jobpath, index, calc.get_image_input_files(index))
+        script = calc.make_image_lines(call, index, subdir=True) + ledger.get_completion_lines(nimages, footer)
+        subprocess.run(["bash", "-c", "".join(script)], cwd=image_path, check=True)
+        assert ledger.read_ledger(jobpath) == (nimages, set(range(index + 1)))
+        assert (tmp_path / "end.dat").exists() == (index == nimages - 1)
+
+    assert (tmp_path / "final-0.cfg").exists() and (tmp_path / "log-1.out").exists()
+    assert (tmp_path / "end.dat").exists()
+    assert ledger.get_image_paths(jobpath, ["image-0", "image-1"], nimages, {0, 1}) == []
+
+
+def test_write_image_subjobs(tmp_path):
+    input_dict = DUMMY().EXAMPLE
+    input_dict["split images"] = True
+    calc = DummyEngine(input_dict)
+    calc.set_scheduler()
+    machine_info = {"queuename": "none", "ncores": 1, "nnodes": 1}
+    image_paths = calc.write_image_subjobs(machine_info, str(tmp_path), "Al__eos", 1, "eos_total", 3)
+
+    assert image_paths == [str(tmp_path / ("image-%i" % index)) for index in range(3)]
+    with open(image_paths[1] + "/Al__eos.sh") as f:
+        script = f.read()
+    assert "cp structure-1.cfg structure.cfg" in script
+    assert "structure-0.cfg" not in script
+    assert ">> ../start.dat" in script
+    assert "-ge 3 ]" in script
@@ -0,0 +1,71 @@
+import os
+
+from strucscan.core import statusmanager
+from strucscan.core.jobmanager import JobManager
+from strucscan.engine.dummy import DummyEngine
+from strucscan.resources.inputyaml import DUMMY
+from strucscan.scheduler import LocalPool
+from strucscan.utils import PROJECT_PATH
+
+
+def write_script(scheduler, jobpath, ntotalcores, lines):
+    machine_info = {"queuename": "none", "ncores": ntotalcores, "nnodes": 1}
+    machine_script, machine_script_fname = scheduler.configure_machine_script(machine_info, jobname="job")
+    jobpath.mkdir()
+    with open(str(jobpath / machine_script_fname), "w") as f:
+        f.writelines(machine_script + lines)
+    return machine_script_fname
+
+
+def test_localpool(tmp_path):
+    scheduler = LocalPool("localpool")
+    scheduler.max_cores = 2
+    scheduler.poll_interval = 0.05
+    job_ids = []
+    for i, (ntotalcores, exit_code) in enumerate([(1, 0), (1, 3), (2, 0)]):
+        jobpath = tmp_path / ("job%i" % i)
+        fname = write_script(scheduler, jobpath, ntotalcores, ["sleep 0.5\n", "exit %i\n" % exit_code])
+        job_ids.append(scheduler.submit(fname, str(jobpath)))
+
+    # the third job waits for two free cores
+    assert [scheduler.get_state(job_id) for job_id in job_ids] == [LocalPool.RUNNING, LocalPool.RUNNING,
+                                                                   LocalPool.QUEUED]
+    assert scheduler.get_queue_ids() == job_ids
+    assert scheduler.get_job_id_by_jobpath(str(tmp_path / "job2")) == job_ids[2]
+    assert scheduler.wait(timeout=10)
+    assert [scheduler.get_state(job_id) for job_id in job_ids] == [LocalPool.FINISHED, LocalPool.FAILED,
+                                                                   LocalPool.FINISHED]
+    assert scheduler.get_exit_code(job_ids[1]) == 3
+    assert scheduler.get_state("unknown") is None
+
+
+def test_localpool_status(tmp_path):
+    input_dict = DUMMY().EXAMPLE
+    input_dict["machine"] = "localpool"
+    calc = DummyEngine(input_dict)
+    calc.set_scheduler()
+    scheduler = calc.get_scheduler()
+    scheduler.max_cores = 1
+    scheduler.poll_interval = 0.05
+
+    jobpaths = [tmp_path / "Al" / "static__fcc__Al", tmp_path / "Al" / "static__bcc__Al"]
+    (tmp_path / "Al").mkdir()
+    for jobpath in jobpaths:
+        fname = write_script(scheduler, jobpath, 1, ["sleep 0.5\n"])
+        scheduler.submit(fname, str(jobpath))
+    assert scheduler.get_total_number_of_cores(open(str(jobpaths[0] / fname)).readlines()) == 1
+
+    statuses = [statusmanager.determine_status__job_id(calc, str(jobpath), [])[1] for jobpath in jobpaths]
+    assert statuses == [statusmanager.RUNNING, statusmanager.QUEUED]
+    assert scheduler.wait(timeout=10)
+
+
+def test_localpool_without_monitor():
+    # the jobs submitted to the pool are not dropped when the JobManager returns without monitoring
+    input_dict = DUMMY().EXAMPLE
+    input_dict.update({"species": "Cu", "machine": "localpool", "properties": "static", "collect": False})
+    jobmanager = JobManager(input_dict, run=False)
+    jobmanager.monitor_cycle()
+    jobmanager.input_dict["monitor"] = False
+    jobmanager.run()
+    assert os.path.exists(PROJECT_PATH() + "/DUMMY/Cu/static__fcc__Cu/end.dat")
@@ -0,0 +1,93 @@
+import json
+import os
+
+from ase.build import bulk
+
+from strucscan.core import planner
+from strucscan.engine.dummy import DummyEngine
+from strucscan.engine.vasp import Vasp
+from strucscan.resources.inputyaml import DUMMY
+
+
+def write_history(history_path, n_atoms, n_cores=(1, 4, 16)):
+    with open(history_path, "w") as f:
+        for natoms in n_atoms:
+            for ncores in n_cores:
+                # core-seconds grow linearly with the number of atoms and by 10 % per doubling of cores
+                walltime = 100. * natoms * ncores ** 0.137 / ncores
+                f.write(json.dumps({"jobname": "static__fcc__Al%i" % natoms, "natoms": natoms,
+                                    "nimages": 1, "ncores": ncores, "walltime": walltime}) + "\n")
+
+
+def test_record_job(tmp_path):
+    calc = DummyEngine(DUMMY().EXAMPLE)
+    calc.set_scheduler()
+    jobpath = str(tmp_path / "DUMMY" / "Al" / "static__fcc__Al4")
+    os.makedirs(jobpath)
+    assert planner.record_job(calc, jobpath) is None
+    for fname, mtime in [("start.dat", 1000), ("end.dat", 1600), ("static__fcc__Al4.sh", 1000)]:
+        with open(jobpath + "/" + fname, "w") as f:
+            f.write("\n")
+        os.utime(jobpath + "/" + fname, (mtime, mtime))
+
+    entry = planner.record_job(calc, jobpath)
+    assert entry == {"jobname": "static__fcc__Al4", "natoms": 4, "nimages": 1, "ncores": 1, "walltime": 600.}
+    history_path = planner.get_history_path(jobpath)
+    assert history_path == str(tmp_path / "DUMMY" / "DUMMY__runtimes.jsonl")
+    assert planner.read_history(history_path) == [entry]
+
+
+def test_plan_resources(tmp_path):
+    calc = DummyEngine(DUMMY().EXAMPLE)
+    calc.machine_configuration_dict["queues"] = {"serial": {"ncores": 1, "max walltime": 1},
+                                                 "parallel": {"ncores": 8, "max nodes": 4, "max walltime": 1}}
+    jobpath = str(tmp_path / "DUMMY" / "Al" / "static__fcc__Al")
+    history_path = planner.get_history_path(jobpath)
+    os.makedirs(os.path.dirname(history_path))
+    write_history(history_path, [1])
+    # not enough finished jobs
+    assert planner.plan_resources(calc, bulk("Al"), jobpath) is None
+
+    write_history(history_path, [1, 2, 4, 8])
+    model = planner.get_cost_model(history_path)
+    assert abs(model.predict_walltime({"natoms": 2}, 1) - 200.) < 10.
+
+    small = bulk("Al")
+    large = bulk("Al", cubic=True).repeat((4, 4, 4))
+    assert planner.plan_resources(calc, small, jobpath) == {"queuename": "serial", "ncores": 1, "nnodes": 1}
+    assert planner.plan_resources(calc, small, jobpath, objective="turnaround") == \
+           {"queuename": "parallel", "ncores": 8, "nnodes": 4}
+    # 256 atoms need more than one hour on a single node
+    assert planner.plan_resources(calc, large, jobpath) == {"queuename": "parallel", "ncores": 8, "nnodes": 2}
+    # walltime of 11 images exceeds all queues
+    assert planner.plan_resources(calc, [large] * 11, jobpath) is None
+
+
+def test_plan_resources_single_ncores(tmp_path):
+    # baseline jobs all run with the ncores of the input
+    calc = DummyEngine(DUMMY().EXAMPLE)
+    calc.machine_configuration_dict["queues"] = {"parallel": {"ncores": 12, "max nodes": 8}}
+    jobpath = str(tmp_path / "DUMMY" / "Al" / "static__fcc__Al")
+    history_path = planner.get_history_path(jobpath)
+    os.makedirs(os.path.dirname(history_path))
+    write_history(history_path, [1, 2, 4, 8], n_cores=[12])
+    model = planner.get_cost_model(history_path)
+    assert model.coefficients[-1] == 0.
+    # perfect scaling: more cores are faster
+    walltimes = [model.predict_walltime({"natoms": 16}, ncores) for ncores in [1, 12, 96]]
+    assert walltimes[0] > walltimes[1] > walltimes[2]
+    assert abs(walltimes[1] * 12 - walltimes[2] * 96) < 1e-6 * walltimes[1] * 12
+    assert planner.plan_resources(calc, bulk("Al"), jobpath, objective="turnaround") == \
+           {"queuename": "parallel", "ncores": 12, "nnodes": 8}
+
+    # all candidates need the same core-hours: the queue is left to the small-structure rule of the JobMaker
+    calc.machine_configuration_dict["queues"]["serial"] = {"ncores": 1}
+    assert planner.plan_resources(calc, bulk("Al"), jobpath) is None
+
+
+def test_vasp_cost_features():
+    kpoints = ["Automatic mesh\n", "0\n", "Gamma\n", " 10 10 10\n", " 0 0 0\n"]
+    incar = "PREC = Accurate\nENCUT           = 500\n"
+    assert Vasp.get_cost_features_from_lines(kpoints, incar) == {"nkpoints": 1000, "encut": 500.}
+    assert Vasp.get_cost_features_from_lines(["explicit\n", "2\n", "Reciprocal\n", "0 0 0 1\n"], "") == {"nkpoints": 2}
+    assert Vasp.get_cost_features_from_lines([], "") == {}
@@ -0,0 +1,54 @@
+import io
+import json
+
+from strucscan.core import statusmanager
+from strucscan.core.jobobject import JobObject
+from strucscan.core.reporter import StatusReporter
+
+
+def test_status_reporter(tmp_path):
+    project_path = str(tmp_path / "data")
+    job_list = [JobObject("Al", "static", jobpath=project_path + "/DUMMY/Al/static__fcc__Al",
+                          status_index=0, status=statusmanager.QUEUED, job_id="1"),
+                JobObject("Al", "atomic", jobpath=project_path + "/DUMMY/Al/atomic__fcc__Al",
+                          status_index=0, status=statusmanager.NOT_EXISTING),
+                JobObject("Cu", "static", jobpath=project_path + "/DUMMY/Cu/00/static__fcc__Cu",
+                          status_index=0, status=statusmanager.QUEUED, job_id="2")]
+    stream = io.StringIO()
+    reporter = StatusReporter(project_path, fname=str(tmp_path / "status.jsonl"), stream=stream)
+
+    events = reporter.update(job_list)
+    assert [(event["jobpath"], event["from"], event["to"]) for event in events] == \
+           [("DUMMY/Al/static__fcc__Al", None, statusmanager.QUEUED),
+            ("DUMMY/Al/atomic__fcc__Al", None, statusmanager.NOT_EXISTING),
+            ("DUMMY/Cu/00/static__fcc__Cu", None, statusmanager.QUEUED)]
+    # composition directory above shard directory
+    assert events[2]["composition"] == "Cu"
+    assert "3 new jobs" in stream.getvalue()
+
+    # unchanged jobs are not reported again
+    stream.truncate(0)
+    stream.seek(0)
+    assert reporter.update(job_list) == []
+    assert stream.getvalue() == ""
+
+    job_list[0].set_status_index_job_id(0, statusmanager.RUNNING, "1")
+    job_list[2].set_status_index_job_id(1, statusmanager.FINISHED, None)
+    events = reporter.update(job_list)
+    assert [(event["jobpath"], event["from"], event["to"], event["job_id"]) for event in events] == \
+           [("DUMMY/Al/static__fcc__Al", statusmanager.QUEUED, statusmanager.RUNNING, "1"),
+            ("DUMMY/Cu/00/static__fcc__Cu", statusmanager.QUEUED, statusmanager.FINISHED, None)]
+    assert reporter.get_counters() == {
+        "statuses": {statusmanager.RUNNING: 1, statusmanager.NOT_EXISTING: 1, statusmanager.FINISHED: 1},
+        "properties": {"static": {statusmanager.RUNNING: 1, statusmanager.FINISHED: 1},
+                       "atomic": {statusmanager.NOT_EXISTING: 1}},
+        "compositions": {"Al": {statusmanager.RUNNING: 1, statusmanager.NOT_EXISTING: 1},
+                         "Cu": {statusmanager.FINISHED: 1}}}
+    assert "DUMMY/Al/static__fcc__Al" in stream.getvalue()
+    assert "DUMMY/Al/atomic__fcc__Al" not in stream.getvalue()
+
+    with open(str(tmp_path / "status.jsonl")) as f:
+        records = [json.loads(line) for line in f]
+    assert [record["event"] for record in records] == ["transition"] * 3 + ["counters"] + ["transition"] * 2 + \
+           ["counters"]
+    assert records[-1]["statuses"] == reporter.get_counters()["statuses"]
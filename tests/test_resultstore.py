@@ -0,0 +1,66 @@
+import json
+import os
+
+import numpy as np
+
+from strucscan.core import resultstore
+
+
+def test_journal_and_compaction(tmp_path):
+    fname = str(tmp_path / "DUMMY__Al__output_dict.json")
+    resultstore.append_result(fname, "static__fcc__Al", {"energy": -3.7})
+    resultstore.append_result(fname, "static__bcc__Al", {"energy": -3.6})
+    # interrupted write of a third result
+    with open(resultstore.get_journal_path(fname), "a") as f:
+        f.write('{"jobname": "static__hcp__Al", "res')
+
+    assert not os.path.exists(fname)
+    assert sorted(resultstore.load_output_dict(fname)) == ["static__bcc__Al", "static__fcc__Al"]
+    assert resultstore.compact(fname, min_entries=10) == True      # no snapshot yet
+
+    assert not os.path.exists(resultstore.get_journal_path(fname))
+    with open(fname) as f:
+        assert json.load(f)["static__fcc__Al"]["energy"] == -3.7
+
+    resultstore.append_result(fname, "static__fcc__Al", {"energy": -3.8})
+    assert resultstore.compact(fname, min_entries=10) == False
+    assert resultstore.load_output_dict(fname)["static__fcc__Al"]["energy"] == -3.8
+    assert resultstore.read_output_dict(fname)["static__fcc__Al"]["energy"] == -3.7
+    assert resultstore.compact(fname) == True
+    assert resultstore.read_output_dict(fname)["static__fcc__Al"]["energy"] == -3.8
+
+
+def test_corrupt_snapshot(tmp_path):
+    fname = str(tmp_path / "DUMMY__Al__output_dict.json")
+    with open(fname, "w") as f:
+        f.write('{"static__fcc__Al": {"ener')
+    resultstore.append_result(fname, "static__bcc__Al", {"energy": -3.6})
+    assert list(resultstore.load_output_dict(fname)) == ["static__bcc__Al"]
+    assert os.path.exists(fname + ".corrupt")
+
+
+def test_decode_output_dict(tmp_path):
+    from ase.io.jsonio import encode as ase_encode
+
+    fname = str(tmp_path / "DUMMY__Al__output_dict.json")
+    forces = np.arange(12, dtype=float).reshape(4, 3)
+    with open(fname, "w") as f:
+        f.write(ase_encode({"static__fcc__Al": {"forces": forces, "n_atom": 4}}))
+    resultstore.append_result(fname, "static__bcc__Al", {"forces": forces[:2], "n_atom": np.int64(2)})
+    resultstore.compact(fname)
+
+    output_dict = resultstore.decode_output_dict(fname)
+    assert np.array_equal(output_dict["static__fcc__Al"]["forces"], forces)
+    assert output_dict["static__bcc__Al"]["forces"].shape == (2, 3)
+    assert np.array_equal(output_dict["static__bcc__Al"]["forces"], forces[:2])
+    assert output_dict["static__bcc__Al"]["n_atom"] == 2
+
+
+def test_get_collected_names(tmp_path):
+    fname = str(tmp_path / "DUMMY__Al__output_dict.json")
+    assert resultstore.get_collected_names(fname) == set()
+    resultstore.append_result(fname, "static__fcc__Al", {"energy": -3.7})
+    assert resultstore.get_collected_names(fname) == {"static__fcc__Al"}
+    resultstore.compact(fname)
+    resultstore.append_result(fname, "static__bcc__Al", {"energy": -3.6})
+    assert resultstore.get_collected_names(fname) == {"static__fcc__Al", "static__bcc__Al"}
@@ -0,0 +1,48 @@
+import os
+
+from strucscan.core.statusmanager import probe_jobpath
+from strucscan.engine.dummy import DummyEngine
+from strucscan.resources.inputyaml import DUMMY
+
+
+def test_probe_jobpath(tmp_path):
+    calc = DummyEngine(DUMMY().EXAMPLE)
+    jobpath = str(tmp_path / "static__fcc__Al")
+
+    state = probe_jobpath(jobpath, calc)
+    assert state.exists == False
+    assert len(state) == 0
+
+    os.makedirs(jobpath)
+    for fname, content in [("start.dat", "start\n"),
+                           ("structure.cfg", ""),
+                           ("log.out", "This is a dummy log file.\n"),
+                           ("end.dat", "stop\n")]:
+        with open(jobpath + "/" + fname, "w") as f:
+            f.write(content)
+
+    state = probe_jobpath(jobpath, calc)
+    assert state.exists == True
+    assert "end.dat" in state
+    assert sorted(state) == ["end.dat", "log.out", "start.dat", "structure.cfg"]
+    assert set(state.stats.keys()) == {"start.dat", "end.dat", "log.out"}
+    assert state.get_size("log.out") == len("This is a dummy log file.\n")
+    assert calc.has_resultfile(state) == True
+    assert calc.check_if_finished(state) == True
+
+
+def test_logfile_cache(tmp_path):
+    calc = DummyEngine(DUMMY().EXAMPLE)
+    jobpath = str(tmp_path / "static__fcc__Al")
+    os.makedirs(jobpath)
+    with open(jobpath + "/log.out", "w") as f:
+        f.write("running\n")
+    assert calc.logfile_contains(probe_jobpath(jobpath, calc), "log.out", "This is a dummy log file.") == False
+    assert calc.logfile_contains(probe_jobpath(jobpath, calc), "log.out", "running") == True
+
+    # only the latest version of each file is cached
+    with open(jobpath + "/log.out", "a") as f:
+        f.write("This is a dummy log file.\n")
+    assert calc.logfile_contains(probe_jobpath(jobpath, calc), "log.out", "This is a dummy log file.") == True
+    assert list(calc.logfile_cache) == [jobpath + "/log.out"]
+    assert calc.logfile_cache[jobpath + "/log.out"][2] == {"This is a dummy log file.": True}
@@ -0,0 +1,92 @@
+from ase import io
+from ase.build import bulk
+from ase.constraints import FixAtoms
+import numpy as np
+
+from strucscan import structio
+from strucscan.utils import parse_prototypefile, read_structure_from_file
+
+
+def read_text(fname):
+    with open(fname, "r") as f:
+        return f.read()
+
+
+def test_write_structures_identical_to_ase(tmp_path):
+    atoms = bulk("Al", "fcc", a=4.05) * (3, 2, 2)
+    atoms.symbols[[1, 5, 7]] = "Ni"
+    atoms.rattle(0.3, seed=1)
+    atoms.set_initial_magnetic_moments(np.linspace(-2., 2., len(atoms)))
+    images = []
+    for scale in np.linspace(0.95, 1.05, 11):
+        image = atoms.copy()
+        image.set_cell(atoms.cell * scale, scale_atoms=True)
+        images.append(image)
+    tetragonal = bulk("Fe", "bcc", a=2.8, orthorhombic=True)
+    tetragonal.set_cell(tetragonal.cell * [1., 1., 1.1], scale_atoms=True)
+    images.append(tetragonal)
+
+    for _format in ["vasp", "cfg"]:
+        fnames = [str(tmp_path / "{}-{:d}".format(_format, i)) for i in range(len(images))]
+        structio.write_structures(images, fnames, _format)
+        for i, image in enumerate(images):
+            io.write(str(tmp_path / "ase"), image, format=_format)
+            assert read_text(fnames[i]) == read_text(str(tmp_path / "ase"))
+
+    # constraints are written by ase.io.write
+    atoms.set_constraint(FixAtoms(indices=[0]))
+    assert structio.format_poscar(atoms) is None
+    structio.write_structure(atoms, str(tmp_path / "POSCAR"), "vasp")
+    assert "Selective dynamics" in read_text(str(tmp_path / "POSCAR"))
+
+
+def assert_same_atoms(atoms, reference):
+    assert atoms.get_chemical_symbols() == reference.get_chemical_symbols()
+    assert np.array_equal(atoms.cell.array, reference.cell.array)
+    assert np.array_equal(atoms.pbc, reference.pbc)
+    assert sorted(atoms.arrays) == sorted(reference.arrays)
+    for name in atoms.arrays:
+        assert np.array_equal(atoms.arrays[name], reference.arrays[name])
+
+
+def test_read_cfgs(tmp_path):
+    structio.clear_structure_cache()
+    atoms = bulk("Al", "fcc", a=4.05) * (3, 2, 2)
+    atoms.symbols[[1, 5]] = "Ni"
+    atoms.rattle(0.2, seed=2)
+    atoms.set_initial_magnetic_moments(np.arange(len(atoms)))
+    atoms.set_array("forces", np.ones((len(atoms), 3)))
+    fnames = []
+    for i, image in enumerate([atoms, bulk("Cu"), bulk("Fe", cubic=True)]):
+        fnames.append(str(tmp_path / "structure-{:d}.cfg".format(i)))
+        io.write(fnames[-1], image, format="cfg")
+
+    assert all([data is not None for data in structio.load_cfgs(fnames)])
+    assert len(structio.structure_cache) == 3
+    for fname in fnames:
+        assert_same_atoms(structio.read_cfg(fname), io.read(fname, format="cfg"))
+
+    # atoms objects returned from the cache are independent
+    first = structio.read_cfg(fnames[0])
+    first.positions[0] += 1.
+    assert_same_atoms(structio.read_cfg(fnames[0]), io.read(fnames[0], format="cfg"))
+
+    # changed files are read again
+    io.write(fnames[1], bulk("Cu") * (2, 1, 1), format="cfg")
+    assert len(structio.read_cfg(fnames[1])) == 2
+
+
+def test_parse_prototypefile(tmp_path):
+    fname = str(tmp_path / "B2.cfg")
+    with open(fname, "w") as f:
+        f.write("Number of particles = 2\nA = 1.0 Angstrom\n"
+                "H0(1,1) = 2.880000 A\nH0(1,2) = 0.000000 A\nH0(1,3) = 0.000000 A\n"
+                "H0(2,1) = 0.000000 A\nH0(2,2) = 2.880000 A\nH0(2,3) = 0.000000 A\n"
+                "H0(3,1) = 0.000000 A\nH0(3,2) = 0.000000 A\nH0(3,3) = 2.880000 A\n"
+                ".NO_VELOCITY.\nentry_count = 3\n"
+                "1.000000\neleA\n0.000000e+00 0.000000e+00 0.000000e+00\n"
+                "1.000000\neleB\n5.000000e-01 5.000000e-01 5.000000e-01\n")
+    cell, positions_dict = parse_prototypefile(fname)
+    assert cell == [[2.88, 0., 0.], [0., 2.88, 0.], [0., 0., 2.88]]
+    assert positions_dict == {"A": [[0., 0., 0.]], "B": [[0.5, 0.5, 0.5]]}
+    assert read_structure_from_file(fname, "Ni Al", "prototype").get_chemical_formula() == "AlNi"
@@ -0,0 +1,60 @@
+import os
+
+from strucscan import fakescheduler
+from strucscan.core import statusmanager, submission
+from strucscan.engine.dummy import DummyEngine
+from strucscan.resources.inputyaml import DUMMY
+
+
+def test_submission_record(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", os.environ["PATH"])
+    monkeypatch.setenv(fakescheduler.STATE_DIR_VARIABLE, str(tmp_path / "state"))
+    input_dict = DUMMY().EXAMPLE
+    input_dict["machine"] = "fakeslurm"
+    calc = DummyEngine(input_dict)
+    calc.set_scheduler()
+    scheduler = calc.get_scheduler()
+
+    jobpaths = [str(tmp_path / "Al" / "static__fcc__Al"), str(tmp_path / "Al" / "static__bcc__Al")]
+    job_ids = []
+    for jobpath in jobpaths:
+        os.makedirs(jobpath)
+        machine_script, fname = scheduler.configure_machine_script({"queuename": "serial", "ncores": 1, "nnodes": 1},
+                                                                   jobname="Al__static")
+        with open(jobpath + "/" + fname, "w") as f:
+            f.writelines(machine_script + ["sleep 10\n"])
+        job_ids.append(calc.submit_job(fname, jobpath))
+
+    record = submission.read_submission(jobpaths[0])
+    assert record["job_id"] == job_ids[0]
+    assert record["machine"] == "fakeslurm"
+    assert submission.get_submitted_job_id(jobpaths[0], "othermachine") is None
+
+    # recorded jobs are looked up by id in a single queue snapshot, without matching working directories
+    calls = []
+    get_job_id_by_jobpath = scheduler.get_job_id_by_jobpath
+    monkeypatch.setattr(scheduler, "get_job_id_by_jobpath", lambda jobpath: calls.append(jobpath) or
+                        get_job_id_by_jobpath(jobpath))
+    statuses = [statusmanager.determine_status__job_id(calc, jobpath, []) for jobpath in jobpaths]
+    assert [(status, job_id) for _, status, job_id in statuses] == [(statusmanager.QUEUED, job_ids[0]),
+                                                                   (statusmanager.QUEUED, job_ids[1])]
+    assert calls == []
+
+    # recorded jobs missing from the snapshot, e.g. if squeue failed, are looked up in the accounting
+    get_queue_snapshot = scheduler.get_queue_snapshot
+    monkeypatch.setattr(scheduler, "get_queue_snapshot", lambda: {})
+    scheduler.discard_queue_snapshot()
+    assert statusmanager.determine_status__job_id(calc, jobpaths[0], [])[1:] == (statusmanager.QUEUED, job_ids[0])
+
+    # a submission of another thread that discards the snapshot while it is refreshed
+    monkeypatch.setattr(scheduler, "get_queue_snapshot", lambda: scheduler.discard_queue_snapshot() or
+                        get_queue_snapshot())
+    assert job_ids[0] in scheduler.get_cached_queue_snapshot(max_age=0.)
+    monkeypatch.setattr(scheduler, "get_queue_snapshot", get_queue_snapshot)
+    scheduler.discard_queue_snapshot()
+
+    # orphaned job of an older run
+    os.remove(jobpaths[1] + "/" + submission.SUBMISSION_FNAME)
+    assert statusmanager.determine_status__job_id(calc, jobpaths[1], [])[1:] == (statusmanager.QUEUED, job_ids[1])
+    assert calls == [jobpaths[1]]
+    fakescheduler.FakeScheduler(str(tmp_path / "state")).cancel(job_ids)
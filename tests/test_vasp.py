@@ -0,0 +1,92 @@
+import gzip
+import os
+
+from ase.build import bulk
+
+from strucscan.core import archive, ledger
+from strucscan.core.statusmanager import probe_jobpath
+from strucscan.engine import vasp
+from strucscan.engine.vasp import Vasp
+from strucscan.error.errorhandler import VaspErrorManager
+from strucscan.resources.inputyaml import VASP
+
+
+def get_calc():
+    input_dict = VASP().EXAMPLE
+    input_dict["k points file"] = ""
+    return Vasp(input_dict)
+
+
+def test_restart_files(tmp_path):
+    calc = get_calc()
+    conditional_jobpath = str(tmp_path / "total__fcc__Al")
+    jobpath = str(tmp_path / "eos_total__fcc__Al")
+    for path in [conditional_jobpath, jobpath]:
+        (tmp_path / path).mkdir()
+    assert calc.get_restart_files("", jobpath) == ([], [])
+
+    with gzip.open(conditional_jobpath + "/CHGCAR.gz", "wb") as f:
+        f.write(b"charge density\n")
+    restart_files, restart_lines = calc.get_restart_files(conditional_jobpath, jobpath)
+    assert restart_files == ["CHGCAR"]
+    assert restart_lines == ["zcat {}/CHGCAR.gz > CHGCAR\n".format(conditional_jobpath)]
+
+    archive.archive_jobdir(conditional_jobpath)
+    restart_files, restart_lines = calc.get_restart_files(conditional_jobpath, jobpath)
+    assert (restart_files, restart_lines) == (["CHGCAR"], [])
+    with open(jobpath + "/CHGCAR", "rb") as f:
+        assert f.read() == b"charge density\n"
+
+
+def test_configure_incar_restart_files(monkeypatch):
+    calc = get_calc()
+    atoms = bulk("Al")
+
+    # CHGCAR is only kept with KEEP_CHGCAR in ~/.strucscan
+    incar = "".join(calc.configure_incar({}, atoms, 1, "NM", [0.], "atomic"))
+    assert "LCHARG" not in incar
+    monkeypatch.setattr(vasp, "KEEP_CHGCAR", lambda: True)
+    incar = "".join(calc.configure_incar({}, atoms, 1, "NM", [0.], "atomic"))
+    assert "LCHARG          = .TRUE." in incar
+
+    incar = "".join(calc.configure_incar({}, atoms, 1, "NM", [0.], "atomic", restart_files=["WAVECAR", "CHGCAR"]))
+    assert "ISTART" in incar and "ICHARG" not in incar and "LCHARG          = .TRUE." in incar
+    incar = "".join(calc.configure_incar({}, atoms, 1, "NM", [0.], "atomic", restart_files=["CHGCAR"]))
+    assert "ICHARG          = 1" in incar
+    incar = "".join(calc.configure_incar({}, atoms, 1, "NM", [0.], "dos", restart_files=["CHGCAR"]))
+    assert "ICHARG          = 11" in incar
+    incar = "".join(calc.configure_incar({"ICHARG": "11"}, atoms, 1, "NM", [0.], "dos"))
+    assert "ICHARG" not in incar
+
+
+def test_restart_failed_image(tmp_path, monkeypatch):
+    input_dict = VASP().EXAMPLE
+    input_dict["k points file"] = ""
+    input_dict["split images"] = True
+    calc = Vasp(input_dict)
+    calc.set_scheduler()
+    submitted = []
+    monkeypatch.setattr(calc, "submit_job", lambda fname, path: submitted.append(path) or "1")
+
+    jobpath = str(tmp_path / "VASP_5_4__NM_PBE" / "Al" / "eos_atomic__fcc__Al")
+    os.makedirs(jobpath)
+    machine_info = {"queuename": "serial", "ncores": 1, "nnodes": 1}
+    machinefile, machinefilename = calc.make_machinefile(machine_info, "Al__eos_atomic", 1, "eos_atomic", 2)
+    with open(jobpath + "/" + machinefilename, "w") as f:
+        f.writelines(machinefile)
+    calc.write_image_subjobs(machine_info, jobpath, "Al__eos_atomic", 1, "eos_atomic", 2)
+    ledger.write_ledger(jobpath, 2)
+    # image 0 has been finished, the sub-job of image 1 timed out
+    with open(jobpath + "/" + ledger.LEDGER_FNAME, "a") as f:
+        f.write("image: 0\n")
+    for fname in ["OUTCAR-0.gz", "image-1/vasp.out", "end.dat"]:
+        with open(jobpath + "/" + fname, "w") as f:
+            f.write("\n")
+
+    errormanager = VaspErrorManager(calc, jobpath, "0", state=probe_jobpath(jobpath, calc))
+    assert errormanager.return_status__job_id() == (0, "queued", "1")
+    assert submitted == [jobpath]
+    assert not os.path.exists(jobpath + "/end.dat")
+    with open(jobpath + "/" + machinefilename) as f:
+        script = f.read()
+    assert "POSCAR-1" in script and "POSCAR-0" not in script
@@ -0,0 +1,33 @@
+import os
+
+from ase.build import bulk
+
+from strucscan.core import resultstore, volumecache
+from strucscan.utils import get_initial_atvolume
+
+
+def test_volume_cache(tmp_path):
+    data_tree_path = str(tmp_path)
+    os.makedirs(data_tree_path + "/DUMMY")
+    fname = resultstore.get_output_dict_path(data_tree_path, "DUMMY", "Al", "__")
+    resultstore.append_result(fname, "total__fcc__Al", {"volume": 16.0, "n_atom": 1})
+    resultstore.append_result(fname, "static__fcc__Al", {"volume": 99.0, "n_atom": 1})
+    resultstore.append_result(fname, "eos_total__bcc__Al2", {"equilibrium_volume": 34.0})
+
+    cache = volumecache.get_volume_cache(data_tree_path, engine="DUMMY")
+    assert cache.get_atvolume(bulk("Al", "fcc", a=4.0), prototype="fcc") == 16.0
+    assert cache.get_atvolume(bulk("Al", "bcc", a=3.0, cubic=True), prototype="bcc") == 17.0
+    # unknown prototype: fitted atomic volume of Al lies between the learned volumes
+    assert 16.0 < cache.get_atvolume(bulk("Al", "sc", a=2.5), prototype="sc") < 17.0
+    assert volumecache.get_volume_cache(data_tree_path, engine="VASP").volumes == {}
+
+    # new results invalidate the cache
+    resultstore.append_result(fname, "eos_total__fcc__Al", {"equilibrium_volume": 16.5})
+    cache = volumecache.get_volume_cache(data_tree_path, engine="DUMMY")
+    assert cache.get_atvolume(bulk("Al", "fcc", a=4.0), prototype="fcc") == 16.5
+
+
+def test_get_initial_atvolume():
+    atoms = bulk("Al", "fcc", a=4.0)
+    assert get_initial_atvolume(atoms, "12.5") == 12.5
+    assert get_initial_atvolume(atoms, "off") == False